@@ -0,0 +1,202 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting."""
+    return max(1, len(text) // 4)
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """
+    Retriever that decides how many documents to return per query.
+
+    It fetches `fetch_k` scored candidates and keeps them until a cutoff:
+    - "score_gap": stop at the first drop between consecutive scores larger than
+      `max_gap`, or once a score falls below `min_score`
+    - "mmr": maximal marginal relevance selection of up to `max_k` documents
+    Either way at least `min_k` and at most `max_k` documents come back.
+    """
+
+    vectorstore: VectorStore
+    cutoff: str = "score_gap"
+    fetch_k: int = 50
+    min_k: int = 1
+    max_k: int = 20
+    max_gap: float = 0.05
+    min_score: float = 0.0
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self.cutoff == "mmr":
+            return self.vectorstore.max_marginal_relevance_search(
+                query, k=self.max_k, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult
+            )
+        return self._score_gap_cut(self.vectorstore.similarity_search_with_score(query, k=self.fetch_k))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+        if self.cutoff == "mmr":
+            return await self.vectorstore.amax_marginal_relevance_search(
+                query, k=self.max_k, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult
+            )
+        return self._score_gap_cut(await self.vectorstore.asimilarity_search_with_score(query, k=self.fetch_k))
+
+    def _score_gap_cut(self, scored: List[tuple]) -> List[Document]:
+        scored = sorted(scored, key=lambda pair: pair[1], reverse=True)
+        kept: List[Document] = []
+        previous: Optional[float] = None
+        for doc, score in scored:
+            if len(kept) >= self.max_k:
+                break
+            if len(kept) >= self.min_k and (
+                score < self.min_score or (previous is not None and previous - score > self.max_gap)
+            ):
+                break
+            kept.append(doc)
+            previous = score
+        return kept
+
+
+STUFF_PROMPT = PromptTemplate.from_template(
+    """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Helpful Answer:"""
+)
+
+MAP_PROMPT = PromptTemplate.from_template(
+    """Use the following portion of a long document to see if any of the text is relevant to answer the question.
+Return any relevant text verbatim. If nothing is relevant, return an empty answer.
+{context}
+Question: {question}
+Relevant text, if any:"""
+)
+
+REDUCE_PROMPT = PromptTemplate.from_template(
+    """Given the following extracted parts of a long document and a question, create a final answer.
+If you don't know the answer, just say that you don't know. Don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Final Answer:"""
+)
+
+
+class BudgetedRetrievalQA:
+    """
+    Question answering over a retriever with a cap on the context sent to the LLM.
+
+    When the retrieved documents fit in `token_budget` they are stuffed into one
+    prompt, as RetrievalQA's "stuff" chain does. Otherwise they are packed into
+    groups that each fit the budget, every group is mapped to the relevant
+    extracts concurrently, and the extracts are reduced into one answer
+    (collapsed again first if they are still over budget, and trimmed to the
+    budget if collapsing stops making progress).
+
+    The result has RetrievalQA's shape: {"query", "result", "source_documents"},
+    plus "strategy" ("stuff" or "map_reduce").
+
+    Args:
+        llm: Chat or completion model
+        retriever (BaseRetriever): Where context comes from
+        token_budget (int): Maximum context tokens per LLM call
+        count_tokens (callable): Token counter; `estimate_tokens` by default
+        max_concurrency (int): Map calls running at once
+    """
+
+    def __init__(
+        self,
+        llm: BaseLanguageModel,
+        retriever: BaseRetriever,
+        token_budget: int = 4000,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        max_concurrency: int = 4,
+    ):
+        self.retriever = retriever
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.max_concurrency = max_concurrency
+        self.stuff_chain = STUFF_PROMPT | llm | StrOutputParser()
+        self.map_chain = MAP_PROMPT | llm | StrOutputParser()
+        self.reduce_chain = REDUCE_PROMPT | llm | StrOutputParser()
+
+    def _pack(self, texts: List[str]) -> List[str]:
+        """Greedily pack texts into groups whose token count fits the budget."""
+        groups: List[List[str]] = [[]]
+        used = 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if groups[-1] and used + tokens > self.token_budget:
+                groups.append([])
+                used = 0
+            groups[-1].append(text)
+            used += tokens
+        return ["\n\n".join(group) for group in groups if group]
+
+    def _trim(self, texts: List[str]) -> List[str]:
+        """Keep the leading texts that fit the budget (always at least one)."""
+        kept, used = [], 0
+        for text in texts:
+            used += self.count_tokens(text)
+            if kept and used > self.token_budget:
+                break
+            kept.append(text)
+        return kept
+
+    def _fits(self, texts: List[str]) -> bool:
+        return sum(self.count_tokens(text) for text in texts) <= self.token_budget
+
+    def _result(self, question: str, docs: List[Document], answer: str, strategy: str) -> Dict[str, Any]:
+        return {"query": question, "result": answer, "source_documents": docs, "strategy": strategy}
+
+    def invoke(self, question: str) -> Dict[str, Any]:
+        docs = self.retriever.invoke(question)
+        texts = [doc.page_content for doc in docs]
+        if self._fits(texts):
+            answer = self.stuff_chain.invoke({"context": "\n\n".join(texts), "question": question})
+            return self._result(question, docs, answer, "stuff")
+
+        config = {"max_concurrency": self.max_concurrency}
+        previous_groups = None
+        while not self._fits(texts):
+            groups = self._pack(texts)
+            # stop collapsing once a round no longer reduces the number of groups
+            if previous_groups is not None and len(groups) >= previous_groups:
+                break
+            previous_groups = len(groups)
+            texts = self.map_chain.batch([{"context": group, "question": question} for group in groups], config=config)
+            texts = [text for text in texts if text.strip()]
+        answer = self.reduce_chain.invoke({"context": "\n\n".join(self._trim(texts)), "question": question})
+        return self._result(question, docs, answer, "map_reduce")
+
+    async def ainvoke(self, question: str) -> Dict[str, Any]:
+        docs = await self.retriever.ainvoke(question)
+        texts = [doc.page_content for doc in docs]
+        if self._fits(texts):
+            answer = await self.stuff_chain.ainvoke({"context": "\n\n".join(texts), "question": question})
+            return self._result(question, docs, answer, "stuff")
+
+        config = {"max_concurrency": self.max_concurrency}
+        previous_groups = None
+        while not self._fits(texts):
+            groups = self._pack(texts)
+            # stop collapsing once a round no longer reduces the number of groups
+            if previous_groups is not None and len(groups) >= previous_groups:
+                break
+            previous_groups = len(groups)
+            texts = await self.map_chain.abatch(
+                [{"context": group, "question": question} for group in groups], config=config
+            )
+            texts = [text for text in texts if text.strip()]
+        answer = await self.reduce_chain.ainvoke({"context": "\n\n".join(self._trim(texts)), "question": question})
+        return self._result(question, docs, answer, "map_reduce")
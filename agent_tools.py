@@ -0,0 +1,162 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
+from langchain.agents.output_parsers.react_single_input import FINAL_ANSWER_ACTION
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.tools import BaseTool, Tool
+
+from response_cache import TTLCache
+
+
+def normalize_tool_input(tool_input: Any) -> str:
+    """Collapse whitespace, drop surrounding quotes and lowercase, so trivial variants of a lookup share a key."""
+    text = tool_input if isinstance(tool_input, str) else str(tool_input)
+    return re.sub(r"\s+", " ", text).strip().strip("\"'").strip().lower()
+
+
+@dataclass
+class ToolStats:
+    """Calls and latency of one tool; `seconds` only counts calls that reached the tool."""
+    calls: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.errors += error
+
+    def report(self) -> Dict[str, Any]:
+        executed = self.calls - self.cache_hits
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "hit_rate": self.cache_hits / self.calls if self.calls else 0.0,
+            "errors": self.errors,
+            "mean_ms": self.seconds / executed * 1000 if executed else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class ToolCache:
+    """
+    Caches tool results for an agent, keyed by tool name and normalized input.
+
+    `wrap` returns stand-ins with the same names and descriptions (so the agent's
+    prompt is unchanged) that answer repeated lookups from a size-bounded TTL
+    cache and time every call that reaches the real tool. Failed calls are not
+    cached.
+
+    Args:
+        max_size (int): Results kept across all tools, least recently used evicted first
+        ttl (float): Seconds a result stays valid
+        uncached (list, optional): Names of tools that are timed but never cached
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, uncached: Optional[List[str]] = None):
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+        self.uncached = set(uncached or [])
+        self.tool_stats: Dict[str, ToolStats] = {}
+
+    def wrap(self, tools: List[BaseTool]) -> List[BaseTool]:
+        return [self._wrap(tool) for tool in tools]
+
+    def _wrap(self, tool: BaseTool) -> BaseTool:
+        stats = self.tool_stats.setdefault(tool.name, ToolStats())
+        cached = tool.name not in self.uncached
+
+        def run(tool_input: str) -> Any:
+            key = (tool.name, normalize_tool_input(tool_input))
+            stats.calls += 1
+            if cached:
+                hit = self.cache.get(key)
+                if hit is not None:
+                    stats.cache_hits += 1
+                    return hit
+            start = time.perf_counter()
+            try:
+                result = tool.invoke(tool_input)
+            except Exception:
+                stats.record(time.perf_counter() - start, error=True)
+                raise
+            stats.record(time.perf_counter() - start)
+            if cached:
+                self.cache.set(key, result)
+            return result
+
+        async def arun(tool_input: str) -> Any:
+            key = (tool.name, normalize_tool_input(tool_input))
+            stats.calls += 1
+            if cached:
+                hit = self.cache.get(key)
+                if hit is not None:
+                    stats.cache_hits += 1
+                    return hit
+            start = time.perf_counter()
+            try:
+                result = await tool.ainvoke(tool_input)
+            except Exception:
+                stats.record(time.perf_counter() - start, error=True)
+                raise
+            stats.record(time.perf_counter() - start)
+            if cached:
+                self.cache.set(key, result)
+            return result
+
+        return Tool(name=tool.name, description=tool.description, func=run, coroutine=arun)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.cache.stats(),
+            "tools": {name: stats.report() for name, stats in self.tool_stats.items()},
+        }
+
+
+PARALLEL_ACTIONS_INSTRUCTIONS = """
+When several actions do not depend on each other's results, list them one after another
+(each with its own Action and Action Input) before the Observation. They run at the same
+time and their Observations follow in the same order.
+"""
+
+_ACTION_PATTERN = re.compile(
+    r"Action\s*\d*\s*:[\s]*(.*?)[\s]*Action\s*\d*\s*Input\s*\d*\s*:[\s]*(.*?)(?=\n\s*Action\s*\d*\s*:|\Z)",
+    re.DOTALL,
+)
+
+
+class MultiActionReActParser(ReActSingleInputOutputParser):
+    """
+    ReAct output parser that accepts several Action / Action Input pairs in one step.
+
+    With more than one pair it returns a list of actions, which AgentExecutor's
+    async path runs concurrently (asyncio.gather); anything else is parsed as
+    the standard single-action parser does. The first action's log carries the
+    thought before it, the others only their own lines, so the scratchpad
+    reads as one thought followed by each action and its observation.
+
+    Args:
+        max_actions (int): Actions kept from one step; extra ones are dropped
+    """
+
+    max_actions: int = 4
+
+    def parse(self, text: str) -> Union[AgentAction, AgentFinish, List[AgentAction]]:
+        matches = list(_ACTION_PATTERN.finditer(text))
+        if len(matches) < 2 or FINAL_ANSWER_ACTION in text:
+            return super().parse(text)
+
+        actions = []
+        for i, match in enumerate(matches[: self.max_actions]):
+            tool_input = match.group(2).strip().strip('"')
+            log = text[: match.end()] if i == 0 else text[match.start() : match.end()]
+            actions.append(AgentAction(match.group(1).strip(), tool_input, log))
+        return actions
+
+    @property
+    def _type(self) -> str:
+        return "react-multi-action"
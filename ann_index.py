@@ -0,0 +1,210 @@
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from local_vector_store import FlatIndex
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """Nearest centroid (by cosine) for each row, computed in chunks to bound memory."""
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], chunk):
+        labels[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    k-means on unit vectors with cosine similarity (centroids are re-normalised each step).
+
+    Args:
+        vectors (np.ndarray): Unit-normalised training vectors, one per row
+        k (int): Number of centroids
+        iterations (int): Lloyd iterations
+        seed (int): Seed for the initial centroid sample
+
+    Returns:
+        np.ndarray: (k, dim) unit-normalised centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(vectors.shape[0], size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=k)
+        # re-seed empty clusters from random points so every list stays usable
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = vectors[rng.choice(vectors.shape[0], size=len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate cosine index with a spherical k-means coarse quantizer.
+
+    Vectors are grouped into `nlist` clusters; a query only scores the vectors in
+    its `nprobe` closest clusters. Raising `nprobe` trades speed for recall, and
+    `nprobe == nlist` is an exact search. Until `train_threshold` vectors have
+    been added the index searches exhaustively; it then trains on what it has.
+    Later inserts go straight into their nearest list, and the quantizer is
+    retrained once the index has grown by `retrain_growth` times.
+
+    Args:
+        nlist (int, optional): Number of clusters; defaults to about 4 * sqrt(n) at training time
+        nprobe (int): Clusters scanned per query
+        train_threshold (int): Vectors needed before the quantizer is trained
+        retrain_growth (float): Growth factor that triggers retraining
+        iterations (int): k-means iterations per training
+    """
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_threshold: int = 2048,
+        retrain_growth: float = 4.0,
+        iterations: int = 10,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.retrain_growth = retrain_growth
+        self.iterations = iterations
+        self._flat = FlatIndex()
+        self._centroids: Optional[np.ndarray] = None
+        self._labels = np.empty(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._flat)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._flat.vectors
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def _build_lists(self) -> None:
+        order = np.argsort(self._labels, kind="stable")
+        bounds = np.cumsum(np.bincount(self._labels, minlength=self._centroids.shape[0]))[:-1]
+        self._lists = np.split(order.astype(np.int64), bounds)
+
+    def train(self) -> None:
+        """(Re)train the coarse quantizer on the stored vectors and rebuild the lists."""
+        size = len(self._flat)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(size)))
+        nlist = min(nlist, size)
+        # k-means on a sample is enough for a coarse quantizer
+        sample_size = min(size, nlist * 64)
+        sample = self.vectors[np.random.default_rng(0).choice(size, size=sample_size, replace=False)]
+        self._centroids = spherical_kmeans(sample, nlist, self.iterations)
+        self._labels = _assign(self.vectors, self._centroids)
+        self._build_lists()
+        self._trained_size = size
+
+    def add(self, vectors: np.ndarray) -> None:
+        start = len(self._flat)
+        self._flat.add(vectors)
+        size = len(self._flat)
+        if not self.is_trained:
+            if size >= self.train_threshold:
+                self.train()
+            return
+        if size >= self._trained_size * self.retrain_growth:
+            self.train()
+            return
+
+        labels = _assign(vectors, self._centroids)
+        self._labels = np.concatenate([self._labels, labels])
+        positions = np.arange(start, size, dtype=np.int64)
+        for cluster in np.unique(labels):
+            self._lists[cluster] = np.concatenate([self._lists[cluster], positions[labels == cluster]])
+
+    def remove(self, positions: Sequence[int]) -> None:
+        self._flat.remove(positions)
+        if self.is_trained:
+            keep = np.ones(self._labels.shape[0], dtype=bool)
+            keep[list(positions)] = False
+            self._labels = self._labels[keep]
+            self._build_lists()
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k cosine search for a batch of unit-normalised queries.
+
+        Returns:
+            tuple: (scores, positions) shaped (len(queries), k'), rows sorted by
+                descending similarity; k' is at most k and the number of stored vectors
+        """
+        if not self.is_trained:
+            return self._flat.search(queries, k)
+
+        k = min(k, len(self._flat))
+        nprobe = min(self.nprobe, self._centroids.shape[0])
+        probes = np.argpartition(-(queries @ self._centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        all_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        all_positions = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        vectors = self.vectors
+        for row, (query, clusters) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self._lists[c] for c in clusters])
+            if candidates.size == 0:
+                continue
+            scores = vectors[candidates] @ query
+            top = min(k, candidates.size)
+            best = np.argpartition(-scores, top - 1)[:top] if top < candidates.size else np.arange(top)
+            best = best[np.argsort(-scores[best])]
+            all_scores[row, :top] = scores[best]
+            all_positions[row, :top] = candidates[best]
+
+        # drop the padding columns no query filled
+        filled = int((all_positions >= 0).sum(axis=1).max()) if k else 0
+        return all_scores[:, :filled], all_positions[:, :filled]
+
+    def save(self, path: str) -> None:
+        self._flat.save(path)
+        with open(os.path.join(path, "ivf.json"), "w") as file:
+            json.dump(
+                {
+                    "nlist": self.nlist,
+                    "nprobe": self.nprobe,
+                    "train_threshold": self.train_threshold,
+                    "retrain_growth": self.retrain_growth,
+                    "iterations": self.iterations,
+                    "trained_size": self._trained_size,
+                },
+                file,
+            )
+        lists_path = os.path.join(path, "ivf.npz")
+        if self.is_trained:
+            np.savez(lists_path, centroids=self._centroids, labels=self._labels)
+        elif os.path.exists(lists_path):
+            # left by an earlier trained save: loading it would bring back stale centroids
+            os.remove(lists_path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFIndex":
+        with open(os.path.join(path, "ivf.json"), "r") as file:
+            params = json.load(file)
+        trained_size = params.pop("trained_size")
+        index = cls(**params)
+        index._flat = FlatIndex.load(path, mmap=mmap)
+        lists_path = os.path.join(path, "ivf.npz")
+        if os.path.exists(lists_path):
+            with np.load(lists_path) as saved:
+                index._centroids = saved["centroids"]
+                index._labels = saved["labels"]
+            index._build_lists()
+            index._trained_size = trained_size
+        return index
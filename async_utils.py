@@ -0,0 +1,47 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Bounded pool for sync-only work (PDF parsing, Wikipedia downloads, sync retrievers).
+# Size it with SYNC_WORKERS; it caps how many blocking calls run at once per process.
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # asyncio shuts the default executor down with its loop, so recreate it when needed
+    global _executor
+    if _executor is None or _executor._shutdown:
+        _executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="sync-worker")
+    return _executor
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking callable on the bounded worker pool without blocking the event loop.
+
+    Args:
+        func (callable): The sync function to run
+        *args, **kwargs: Arguments passed to `func`
+
+    Returns:
+        The value returned by `func`
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def install_default_executor() -> None:
+    """
+    Make the bounded pool the running loop's default executor.
+
+    LangChain falls back to `loop.run_in_executor(None, ...)` when a component
+    only has a sync implementation (e.g. a vector store without async search),
+    so this keeps those calls inside the same bound. Call it from a startup hook.
+    """
+    asyncio.get_running_loop().set_default_executor(_get_executor())
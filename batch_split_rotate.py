@@ -1,46 +1,321 @@
 from PIL import Image
 import os
-import glob
+import sys
+import time
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
 
-def split_and_rotate_image(input_path, output_dir):
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff"}
+
+# name of the incremental-mode manifest, kept in the output folder
+MANIFEST_NAME = ".split_rotate_manifest.json"
+
+@dataclass
+class ImageResult:
+    """Outcome of processing one image."""
+    input_path: str
+    outputs: Optional[Tuple[str, str]] = None
+    seconds: float = 0.0
+    error: Optional[str] = None
+    skipped: bool = False
+    # size, mtime_ns and sha256 of the input (incremental mode only)
+    fingerprint: Optional[Dict] = None
+    # peak resident memory of the process while this image was processed (Linux only)
+    peak_rss_mb: Optional[float] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+@dataclass
+class BatchSummary:
+    """Totals and per-image results for one `process_folder` run."""
+    output_folder: str
+    workers: int = 1
+    elapsed: float = 0.0
+    results: List[ImageResult] = field(default_factory=list)
+
+    @property
+    def processed(self):
+        return sum(1 for result in self.results if result.ok and not result.skipped)
+
+    @property
+    def skipped(self):
+        return sum(1 for result in self.results if result.skipped)
+
+    @property
+    def failures(self):
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def images_per_second(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def max_peak_rss_mb(self):
+        """Largest per-image peak RSS of any worker; size worker pools as memory / this."""
+        peaks = [result.peak_rss_mb for result in self.results if result.peak_rss_mb is not None]
+        return max(peaks) if peaks else None
+
+    def report(self):
+        seconds = sorted(result.seconds for result in self.results) or [0.0]
+        report = (
+            f"{self.processed}/{len(self.results)} images processed "
+            f"({self.skipped} unchanged, {len(self.failures)} failed) "
+            f"in {self.elapsed:.2f}s with {self.workers} worker(s): "
+            f"{self.images_per_second:.1f} images/sec, "
+            f"median {seconds[len(seconds) // 2] * 1000:.1f} ms/image, "
+            f"slowest {seconds[-1] * 1000:.1f} ms"
+        )
+        if self.max_peak_rss_mb is not None:
+            report += f", peak RSS {self.max_peak_rss_mb:.0f} MB per worker"
+        return report
+
+@dataclass
+class OutputOptions:
+    """
+    How split halves are decoded and encoded.
+    
+    Args:
+        format (str, optional): Pillow format name for the outputs (e.g. "JPEG", "PNG", "WEBP").
+            If None, each output keeps its input's format
+        quality (int): Encoder quality for lossy formats
+        optimize (bool): Let the encoder spend extra time for smaller files
+        scale (float): Output size relative to the input; below 1 JPEG inputs are decoded
+            at reduced size with `draft`, which skips most of the decode work
+        low_memory (bool): Decode uncompressed inputs (TIFF, BMP, PPM) in bands of rows, so the
+            full bitmap is never held in memory. Compressed inputs (JPEG, PNG, LZW/group4 TIFF)
+            can only be decoded whole and take the default path
+    """
+    format: Optional[str] = None
+    quality: int = 75
+    optimize: bool = False
+    scale: float = 1.0
+    low_memory: bool = False
+
+# file extension written for each output format
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "BMP": ".bmp", "GIF": ".gif", "TIFF": ".tiff", "WEBP": ".webp"}
+
+def _save_options(image_format, options):
+    if image_format in ("JPEG", "WEBP"):
+        return {"quality": options.quality, "optimize": options.optimize}
+    if image_format == "PNG":
+        return {"optimize": options.optimize}
+    return {}
+
+def _rotated_halves(img):
+    # Split the image into left and right halves and rotate both (90 degrees clockwise for
+    # the first half, 90 degrees counterclockwise for the second half). transpose copies pixels
+    # without resampling; yielding one half at a time means only one rotated half is alive at once
+    width, height = img.size
+    mid_x = width // 2
+    yield img.crop((0, 0, mid_x, height)).transpose(Image.Transpose.ROTATE_270)
+    yield img.crop((mid_x, 0, width, height)).transpose(Image.Transpose.ROTATE_90)
+
+def _strip_tiles(img, rows=256):
+    """
+    Split an image's raw (uncompressed) decoder tiles into bands of at most `rows` rows.
+    
+    Uncompressed TIFF, BMP and PPM files store rows at fixed offsets, so any band
+    can be decoded on its own. Returns None if some tile is compressed, since those
+    can only be decoded whole.
+    """
+    strips = []
+    for tile in img.tile:
+        if tile.codec_name != "raw":
+            return None
+        x0, y0, x1, y1 = tile.extents
+        args = (tile.args, 0, 1) if isinstance(tile.args, str) else tuple(tile.args)
+        rawmode, stride, orientation = (args + (0, 1))[:3]
+        if not stride:
+            try:
+                stride = len(Image.new(img.mode, (x1 - x0, 1)).tobytes("raw", rawmode))
+            except ValueError:
+                return None
+        for top in range(y0, y1, rows):
+            bottom = min(top + rows, y1)
+            # bottom-up files (orientation -1, e.g. BMP) store the band's last row first
+            first_row = top - y0 if orientation > 0 else y1 - bottom
+            strips.append(
+                tile._replace(extents=(x0, top, x1, bottom), offset=tile.offset + first_row * stride, args=(rawmode, stride, orientation))
+            )
+    return strips
+
+def _rotated_halves_from_strips(img, tiles):
+    """
+    Same output as `_rotated_halves`, but decodes the input one strip at a time.
+    
+    Each half is assembled from the bands overlapping it, so the full decoded
+    bitmap never exists: peak memory is one rotated half plus one band, at the
+    cost of reading each full-width band once per half.
+    """
+    width, height = img.size
+    mid_x = width // 2
+    for x_start, x_end, rotation in ((0, mid_x, Image.Transpose.ROTATE_270), (mid_x, width, Image.Transpose.ROTATE_90)):
+        half_width = x_end - x_start
+        half = Image.new(img.mode, (height, half_width))
+        if img.mode in ("P", "PA"):
+            # the strips carry palette indices only; the colours live in the source's palette
+            half.putpalette(img.getpalette())
+        with open(img.filename, "rb") as file:
+            for tile in tiles:
+                x0, y0, x1, y1 = tile.extents
+                a, b = max(x0, x_start), min(x1, x_end)
+                if a >= b:
+                    continue
+                # decode just this band straight from its bytes in the file
+                rawmode, stride, orientation = tile.args
+                file.seek(tile.offset)
+                data = file.read(stride * (y1 - y0))
+                strip = Image.frombuffer(img.mode, (x1 - x0, y1 - y0), data, "raw", rawmode, stride, orientation)
+                piece = strip.crop((a - x0, 0, b - x0, y1 - y0)).transpose(rotation)
+                if rotation == Image.Transpose.ROTATE_270:
+                    # (x, y) in the left half lands at (height - 1 - y, x)
+                    half.paste(piece, (height - y1, a - x_start))
+                else:
+                    # (x, y) in the right half lands at (y, half_width - 1 - (x - mid_x))
+                    half.paste(piece, (y0, x_end - b))
+        yield half
+        # drop our reference before the next half is allocated
+        del half
+
+def _split_and_rotate(input_path, output_dir, options=None):
+    options = options or OutputOptions()
+    
+    # Load the image
+    img = Image.open(input_path)
+    input_format = img.format
+    input_compression = img.info.get("compression")
+    
+    output_format = (options.format or input_format or "JPEG").upper()
+    save_options = _save_options(output_format, options)
+    if output_format == "TIFF" and input_compression:
+        # keep the compression the input used, e.g. group4 for bilevel scans
+        save_options["compression"] = input_compression
+    
+    # Create output filenames
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    extension = FORMAT_EXTENSIONS.get(output_format, "." + output_format.lower())
+    left_output = os.path.join(output_dir, f"{base_name}_left_rotated{extension}")
+    right_output = os.path.join(output_dir, f"{base_name}_right_rotated{extension}")
+    
+    tiles = _strip_tiles(img) if options.low_memory and options.scale >= 1 else None
+    if tiles:
+        halves = _rotated_halves_from_strips(img, tiles)
+    else:
+        # JPEG can decode straight to 1/2, 1/4 or 1/8 size, so a downscaled output never pays for a full decode
+        if options.scale < 1:
+            target = (max(1, round(img.width * options.scale)), max(1, round(img.height * options.scale)))
+            if input_format == "JPEG":
+                img.draft(img.mode, target)
+            if img.size != target:
+                img = img.resize(target, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        halves = _rotated_halves(img)
+    
+    # Save the rotated images, one half at a time
+    # (a plain loop rather than zip, which would keep the previous half alive while the next is built)
+    for path in (left_output, right_output):
+        half = next(halves)
+        if output_format == "JPEG" and half.mode not in ("RGB", "L", "CMYK"):
+            # JPEG has no alpha or palette; flatten instead of failing on RGBA/P inputs
+            half = half.convert("RGB")
+        _atomic_save(half, path, output_format, save_options)
+        del half
+    img.close()
+    
+    return left_output, right_output
+
+def _atomic_save(image, path, image_format, save_options):
+    # write next to the target and rename, so an interrupted run never leaves a truncated output
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        image.save(tmp_path, image_format, **save_options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _unchanged(input_path, known):
+    """
+    Check an input against its manifest entry.
+    
+    Returns:
+        tuple: (unchanged, fingerprint). A matching size and mtime is trusted without
+            reading the file; otherwise the file is hashed, so a touched but identical
+            file is still skipped
+    """
+    stat = os.stat(input_path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    outputs_exist = bool(known) and all(os.path.exists(path) for path in known["outputs"])
+    if outputs_exist and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        fingerprint["sha256"] = known["sha256"]
+        return True, fingerprint
+    fingerprint["sha256"] = file_sha256(input_path)
+    return outputs_exist and known["size"] == stat.st_size and known["sha256"] == fingerprint["sha256"], fingerprint
+
+def _reset_peak_rss():
+    # writing 5 to clear_refs resets the process's VmHWM high-water mark (Linux 4.0+)
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _process_image(input_path, output_dir, options=None, incremental=False, known=None):
+    # Runs in the worker processes; errors are returned rather than raised so one bad file doesn't stop the batch
+    start = time.perf_counter()
+    fingerprint = None
+    try:
+        if incremental:
+            unchanged, fingerprint = _unchanged(input_path, known)
+            if unchanged:
+                return ImageResult(
+                    input_path, tuple(known["outputs"]), time.perf_counter() - start, skipped=True, fingerprint=fingerprint
+                )
+        _reset_peak_rss()
+        outputs = _split_and_rotate(input_path, output_dir, options)
+        return ImageResult(
+            input_path, outputs, time.perf_counter() - start, fingerprint=fingerprint, peak_rss_mb=_peak_rss_mb()
+        )
+    except Exception as e:
+        return ImageResult(input_path, None, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+
+def split_and_rotate_image(input_path, output_dir, options=None):
     """
     Split an image in the middle and rotate both halves.
     
     Args:
         input_path (str): Path to the input image
         output_dir (str): Directory to save output images
+        options (OutputOptions, optional): Output format, encoder settings and scale.
+            If None, outputs keep the input's format at full size
     
     Returns:
         tuple: Paths to the two output images
     """
     try:
-        # Load the image
-        img = Image.open(input_path)
-        
-        # Get image dimensions
-        width, height = img.size
-        
-        # Calculate middle point
-        mid_x = width // 2
-        
-        # Split the image into left and right halves
-        left_half = img.crop((0, 0, mid_x, height))
-        right_half = img.crop((mid_x, 0, width, height))
-        
-        # Rotate both halves (90 degrees clockwise for the first half, 
-        # 90 degrees counterclockwise for the second half)
-        left_half_rotated = left_half.rotate(-90, expand=True)
-        right_half_rotated = right_half.rotate(90, expand=True)
-        
-        # Create output filenames
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
-        left_output = os.path.join(output_dir, f"{base_name}_left_rotated.jpg")
-        right_output = os.path.join(output_dir, f"{base_name}_right_rotated.jpg")
-        
-        # Save the rotated images
-        left_half_rotated.save(left_output)
-        right_half_rotated.save(right_output)
-        
+        left_output, right_output = _split_and_rotate(input_path, output_dir, options)
         print(f"Processed: {os.path.basename(input_path)}")
         return left_output, right_output
     
@@ -48,50 +323,179 @@ def split_and_rotate_image(input_path, output_dir):
         print(f"Error processing {os.path.basename(input_path)}: {e}")
         return None
 
-def process_folder(input_folder, output_folder=None):
+def find_images(input_folder):
+    """
+    List the images in a folder with one directory scan.
+    
+    Extensions match case-insensitively, and a file reachable under two names
+    (e.g. through a symlink) is only listed once.
+    
+    Args:
+        input_folder (str): Folder to scan (not recursive)
+    
+    Returns:
+        list: Sorted image paths
+    """
+    image_files, seen = [], set()
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS or not entry.is_file():
+                continue
+            stat = entry.stat()
+            if (stat.st_dev, stat.st_ino) in seen:
+                continue
+            seen.add((stat.st_dev, stat.st_ino))
+            image_files.append(entry.path)
+    return sorted(image_files)
+
+def _manifest_options(options):
+    # low_memory changes how outputs are made, not what they contain
+    return {key: value for key, value in asdict(options).items() if key != "low_memory"}
+
+def _load_manifest(path, options):
+    try:
+        with open(path, "r") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    # outputs made with different options don't count as up to date
+    if manifest.get("options") != _manifest_options(options):
+        return {}
+    return manifest.get("files", {})
+
+def _save_manifest(path, options, files):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump({"options": _manifest_options(options), "files": files}, file)
+    os.replace(tmp_path, path)
+
+def _show_progress(done, total, failed):
+    sys.stderr.write(f"\r{done}/{total} images ({failed} failed)")
+    if done == total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+def process_folder(
+    input_folder, output_folder=None, workers=1, chunksize=None, progress=True, options=None, incremental=False
+):
     """
     Process all images in a folder.
     
+    With `workers` > 1 images are processed in a pool of worker processes, handed
+    out `chunksize` paths at a time (larger chunks cut inter-process overhead,
+    smaller ones balance uneven images better).
+    
+    In incremental mode a manifest in the output folder records each input's
+    size, mtime and SHA-256 with its outputs. Inputs that match their entry and
+    whose outputs still exist are skipped, so a rerun only processes new or
+    changed files. Changing `options` invalidates the manifest.
+    
     Args:
         input_folder (str): Path to the folder containing images
         output_folder (str, optional): Directory to save output images. If None, creates 'output' subfolder
+        workers (int, optional): Worker processes; None uses every CPU, 1 processes in this process
+        chunksize (int, optional): Paths per task sent to a worker. If None, picks about four chunks per worker
+        progress (bool): Show a progress counter on stderr
+        options (OutputOptions, optional): Output format, encoder settings and scale for every image
+        incremental (bool): Skip inputs that are unchanged since the last run
+    
+    Returns:
+        BatchSummary: Per-image timings and failures plus overall throughput
     """
     # Create output directory if it doesn't exist
     if output_folder is None:
         output_folder = os.path.join(input_folder, "output")
-    
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-        print(f"Created output directory: {output_folder}")
+    os.makedirs(output_folder, exist_ok=True)
     
     # Get all image files in the folder
-    image_extensions = ["*.jpg", "*.jpeg", "*.png", "*.bmp", "*.gif", "*.tiff"]
-    image_files = []
-    
-    for ext in image_extensions:
-        image_files.extend(glob.glob(os.path.join(input_folder, ext)))
-        image_files.extend(glob.glob(os.path.join(input_folder, ext.upper())))
+    image_files = find_images(input_folder)
     
+    workers = workers or os.cpu_count() or 1
+    summary = BatchSummary(output_folder=output_folder, workers=workers)
     if not image_files:
-        print(f"No image files found in {input_folder}")
-        return
+        return summary
     
-    print(f"Found {len(image_files)} images to process...")
+    options = options or OutputOptions()
+    manifest_path = os.path.join(output_folder, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path, options) if incremental else {}
+    known = [manifest.get(os.path.basename(path)) for path in image_files]
     
-    # Process each image
-    for img_path in image_files:
-        split_and_rotate_image(img_path, output_folder)
+    start = time.perf_counter()
+    if workers == 1:
+        results = (
+            _process_image(path, output_folder, options, incremental, entry) for path, entry in zip(image_files, known)
+        )
+        pool = None
+    else:
+        chunksize = chunksize or max(1, len(image_files) // (workers * 4))
+        pool = ProcessPoolExecutor(max_workers=workers)
+        count = len(image_files)
+        results = pool.map(
+            _process_image,
+            image_files,
+            [output_folder] * count,
+            [options] * count,
+            [incremental] * count,
+            known,
+            chunksize=chunksize,
+        )
+    
+    # entries for inputs that no longer exist are dropped
+    files = {}
+    failed = 0
+    try:
+        for result in results:
+            summary.results.append(result)
+            failed += not result.ok
+            if incremental and result.ok:
+                files[os.path.basename(result.input_path)] = {**result.fingerprint, "outputs": list(result.outputs)}
+                # checkpoint now and then so an interrupted run keeps its progress
+                if len(summary.results) % 256 == 0:
+                    _save_manifest(manifest_path, options, {**manifest, **files})
+            if progress:
+                _show_progress(len(summary.results), len(image_files), failed)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if incremental:
+            completed = len(summary.results) == len(image_files)
+            _save_manifest(manifest_path, options, files if completed else {**manifest, **files})
     
-    print(f"Processing complete. Results saved to {output_folder}")
+    summary.elapsed = time.perf_counter() - start
+    return summary
 
 # Example usage
 if __name__ == "__main__":
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Split images in the middle and rotate both halves.")
+    parser.add_argument("input_folder")
+    parser.add_argument("output_folder", nargs="?", help="defaults to an 'output' subfolder of input_folder")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunksize", type=int, default=None, help="images per task sent to a worker")
+    parser.add_argument("--format", default=None, help="output format, e.g. JPEG or PNG (default: keep the input's)")
+    parser.add_argument("--quality", type=int, default=75, help="quality for JPEG/WEBP output")
+    parser.add_argument("--optimize", action="store_true", help="smaller files at the cost of slower encoding")
+    parser.add_argument("--scale", type=float, default=1.0, help="output size relative to the input, e.g. 0.5")
+    parser.add_argument("--incremental", action="store_true", help="skip inputs unchanged since the last run")
+    parser.add_argument("--low-memory", action="store_true", help="decode uncompressed TIFF/BMP/PPM inputs in strips")
+    args = parser.parse_args()
     
-    if len(sys.argv) > 1:
-        input_folder = sys.argv[1]
-        output_folder = sys.argv[2] if len(sys.argv) > 2 else None
-        process_folder(input_folder, output_folder)
+    options = OutputOptions(
+        format=args.format, quality=args.quality, optimize=args.optimize, scale=args.scale, low_memory=args.low_memory
+    )
+    summary = process_folder(
+        args.input_folder,
+        args.output_folder,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        options=options,
+        incremental=args.incremental,
+    )
+    if not summary.results:
+        print(f"No image files found in {args.input_folder}")
     else:
-        print("Usage: python script.py input_folder [output_folder]")
-        print("       If output_folder is not specified, images will be saved to an 'output' subfolder")
\ No newline at end of file
+        print(summary.report())
+        for failure in summary.failures:
+            print(f"Error processing {os.path.basename(failure.input_path)}: {failure.error}")
+        print(f"Results saved to {summary.output_folder}")
@@ -0,0 +1,70 @@
+"""
+Recall@k and queries/sec of the IVF index against exact search.
+
+Vectors are synthetic 768-dim embeddings (the dimension of models/embedding-001)
+drawn around random topic centres, so they cluster the way real text embeddings do.
+
+Usage:
+    python -m benchmarks.ann_recall [vectors] [queries] [k]
+"""
+import sys
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex
+from local_vector_store import FlatIndex, _normalize
+
+DIMENSIONS = 768
+
+
+def synthetic(count, topics, rng):
+    centres = rng.standard_normal((topics, DIMENSIONS)).astype(np.float32)
+    labels = rng.integers(0, topics, size=count)
+    return _normalize(centres[labels] + 1.5 * rng.standard_normal((count, DIMENSIONS)).astype(np.float32))
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    _, positions = index.search(queries, k)
+    return positions, len(queries) / (time.perf_counter() - start)
+
+
+def recall(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    rng = np.random.default_rng(42)
+    vectors = synthetic(count, topics=200, rng=rng)
+    queries = _normalize(vectors[rng.choice(count, query_count)] + 0.3 * rng.standard_normal((query_count, DIMENSIONS)) / np.sqrt(DIMENSIONS))
+
+    exact = FlatIndex()
+    exact.add(vectors)
+    # single queries, as the retriever issues them, and one batched call
+    start = time.perf_counter()
+    for query in queries:
+        exact.search(query[None, :], k)
+    single_qps = query_count / (time.perf_counter() - start)
+    truth, batch_qps = timed_search(exact, queries, k)
+    print(f"{count} vectors x {DIMENSIONS} dims, {query_count} queries, k={k}")
+    print(f"{'exact':<22} recall@{k}=1.000  {single_qps:9.1f} QPS (one at a time), {batch_qps:9.1f} QPS (batched)")
+
+    ivf = IVFIndex()
+    start = time.perf_counter()
+    # insert in chunks to exercise training and incremental inserts
+    for chunk in np.array_split(vectors, 10):
+        ivf.add(chunk)
+    print(f"ivf build: {time.perf_counter() - start:.2f}s, nlist={len(ivf._lists)}")
+
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        ivf.nprobe = nprobe
+        found, qps = timed_search(ivf, queries, k)
+        print(f"{'ivf nprobe=' + str(nprobe):<22} recall@{k}={recall(found, truth):.3f}  {qps:9.1f} QPS")
+
+
+if __name__ == "__main__":
+    main()
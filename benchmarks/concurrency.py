@@ -0,0 +1,58 @@
+"""
+Measure /translate/ throughput as the number of in-flight requests grows.
+
+The app runs in-process behind httpx's ASGI transport with a stub LLM that
+sleeps for a fixed latency. The "blocking" route calls the sync `invoke`
+from an async endpoint, as the endpoints did before; "async" is the real
+/translate/ route, which awaits `ainvoke`.
+
+Usage:
+    python -m benchmarks.concurrency [llm_latency_seconds]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+
+import main
+from benchmarks.fakes import StubChatModel
+
+PAYLOAD = {
+    "input_language": "English",
+    "output_language": "Spanish",
+    "text_input": "Hello, how are you?",
+}
+
+
+@main.app.post("/translate-blocking/")
+async def translate_blocking(request: main.TranslationRequest):
+    ai_msg = main.registry.get("translate").invoke(request.model_dump())
+    return main.TranslationResponse(translated_text=ai_msg.content)
+
+
+async def measure(client, path, in_flight, rounds=4):
+    total = in_flight * rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        responses = await asyncio.gather(*[client.post(path, json=PAYLOAD) for _ in range(in_flight)])
+        assert all(r.status_code == 200 for r in responses)
+    return total / (time.perf_counter() - start)
+
+
+async def run(latency):
+    main.registry._llm_factory = lambda model, temperature: StubChatModel(latency=latency)
+    await main.startup_event()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"stub LLM latency {latency * 1000:.0f} ms")
+        print(f"{'in-flight':>9} {'blocking req/s':>15} {'async req/s':>12}")
+        for in_flight in (1, 2, 4, 8, 16, 32, 64):
+            blocking = await measure(client, "/translate-blocking/", in_flight)
+            concurrent = await measure(client, "/translate/", in_flight)
+            print(f"{in_flight:>9} {blocking:>15.1f} {concurrent:>12.1f}")
+    await main.shutdown_event()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(float(sys.argv[1]) if len(sys.argv) > 1 else 0.05))
@@ -0,0 +1,160 @@
+"""Local stand-ins for Gemini used by the benchmark scripts."""
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model that answers after a fixed delay without any network access.
+
+    The reply echoes the last message so callers can check they got the
+    answer for their own request.
+    """
+
+    latency: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        text = f"echo: {messages[-1].content}" if messages else "echo:"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        # spread the latency over the words so the first token arrives early
+        words = self._reply(messages).generations[0].message.content.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic embedder that sleeps `latency` seconds per call.
+
+    Vectors are derived from a hash of the text, so equal texts embed equally
+    and different texts are close to orthogonal.
+    """
+
+    def __init__(self, size: int = 768, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.size).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class InMemoryCollection:
+    """
+    Dict-backed stand-in for the few pymongo collection methods the pipelines use.
+
+    Filters support plain equality and `$in`; that is all the ingestion code issues.
+    """
+
+    def __init__(self):
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        self.bulk_writes = 0
+
+    def _matches(self, doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+        for key, condition in query.items():
+            if isinstance(condition, dict) and "$in" in condition:
+                if doc.get(key) not in condition["$in"]:
+                    return False
+            elif doc.get(key) != condition:
+                return False
+        return True
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        for doc in list(self.docs.values()):
+            if self._matches(doc, query or {}):
+                if projection:
+                    yield {key: doc[key] for key in ("_id", *projection) if key in doc}
+                else:
+                    yield dict(doc)
+
+    def count_documents(self, query: Dict[str, Any]) -> int:
+        return sum(1 for _ in self.find(query))
+
+    def delete_many(self, query: Dict[str, Any]) -> None:
+        for doc in list(self.find(query)):
+            del self.docs[doc["_id"]]
+
+    def bulk_write(self, operations: List[Any], ordered: bool = True) -> None:
+        self.bulk_writes += 1
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                doc = dict(operation._doc)
+                if doc["_id"] in self.docs:
+                    raise ValueError(f"duplicate key {doc['_id']}")
+                self.docs[doc["_id"]] = doc
+            elif isinstance(operation, ReplaceOne):
+                self.docs[operation._filter["_id"]] = dict(operation._doc)
+            elif isinstance(operation, (DeleteOne, DeleteMany)):
+                self.delete_many(operation._filter)
+            else:
+                raise TypeError(f"unsupported operation {operation!r}")
@@ -0,0 +1,95 @@
+"""
+Ingestion throughput against an in-memory, mongo-style collection and a stub embedder.
+
+Compares the old single add_documents-style call (one embedding call, one
+write) with the batched pipeline at several concurrency levels, then shows
+a crashed run resuming from its checkpoint and an incremental re-index after
+one chunk changed.
+
+Usage:
+    python -m benchmarks.ingestion [documents] [embedding_latency_seconds]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from langchain_core.documents import Document
+from pymongo import InsertOne
+
+from benchmarks.fakes import InMemoryCollection, StubEmbeddings
+from ingestion import IngestionPipeline
+
+
+class FlakyEmbeddings(StubEmbeddings):
+    """Fails on the n-th call to simulate a crash halfway through."""
+
+    def __init__(self, fail_on_call: int, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_on_call = fail_on_call
+
+    async def aembed_documents(self, texts):
+        if self.calls + 1 == self.fail_on_call:
+            self.calls += 1
+            raise RuntimeError("simulated crash")
+        return await super().aembed_documents(texts)
+
+
+def make_docs(count):
+    return [Document(page_content=f"Fact {i}: elephants can remember {i} things.", metadata={"line": i}) for i in range(count)]
+
+
+def single_call(collection, embeddings, docs):
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+    collection.bulk_write([InsertOne({"_id": i, "text": d.page_content, "embedding": v, **d.metadata})
+                           for i, (d, v) in enumerate(zip(docs, vectors))])
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    docs = make_docs(count)
+
+    # one embedding request per batch of 100 texts, as the Gemini embedder does internally
+    elapsed = single_call(InMemoryCollection(), StubEmbeddings(latency=latency * count / 100), docs)
+    print(f"single call        : {count / elapsed:8.1f} docs/sec")
+
+    for concurrency in (1, 4, 16):
+        collection = InMemoryCollection()
+        pipeline = IngestionPipeline(collection, StubEmbeddings(latency=latency), batch_size=100, max_concurrency=concurrency)
+        stats = pipeline.ingest(docs)
+        assert collection.count_documents({}) == count
+        print(f"batched x{concurrency:<2}        : {stats.docs_per_second:8.1f} docs/sec, "
+              f"{stats.embedding_calls_per_second:6.1f} embedding calls/sec")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = os.path.join(tmp, "checkpoint.json")
+        collection = InMemoryCollection()
+        flaky = IngestionPipeline(collection, FlakyEmbeddings(fail_on_call=10, latency=latency),
+                                  batch_size=100, max_concurrency=1, checkpoint_path=checkpoint)
+        try:
+            flaky.ingest(docs, clear_collection=True)
+        except RuntimeError:
+            print(f"crashed run        : {collection.count_documents({})} documents written before the crash")
+        resumed = IngestionPipeline(collection, StubEmbeddings(latency=latency), batch_size=100,
+                                    max_concurrency=4, checkpoint_path=checkpoint)
+        stats = resumed.ingest(docs, clear_collection=True)
+        print(f"resumed run        : {stats.report()}")
+        assert collection.count_documents({}) == count
+
+    collection = InMemoryCollection()
+    embeddings = StubEmbeddings(latency=latency)
+    pipeline = IngestionPipeline(collection, embeddings, batch_size=100, max_concurrency=4)
+    pipeline.reindex(docs)
+    edited = docs[:-1] + [Document(page_content="Fact: elephants changed their mind.", metadata={"line": count - 1})]
+    print(f"re-index dry run   : {pipeline.reindex(edited, dry_run=True).report()}")
+    calls_before = embeddings.calls
+    report = pipeline.reindex(edited)
+    print(f"re-index           : {embeddings.calls - calls_before} embedding calls, {report.ingestion.report()}")
+    assert collection.count_documents({}) == count
+
+
+if __name__ == "__main__":
+    main()
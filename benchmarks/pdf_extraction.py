@@ -0,0 +1,88 @@
+"""
+Pages/sec of PDF text extraction: the old per-page `text +=` loop against
+PdfExtractor sequentially, with 1, 2, 4 ... worker processes, and from cache.
+
+Documents are diabetes.pdf and synthetic multi-hundred-page PDFs made by
+repeating its pages, so the text is realistic.
+
+Usage:
+    python -m benchmarks.pdf_extraction [pages ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from pypdf import PdfReader, PdfWriter
+
+from pdf_extraction import PdfExtractor
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "diabetes.pdf")
+
+
+def legacy_read(path):
+    # the read_pdf_file implementation both services used to carry
+    text = ""
+    for page in PdfReader(path).pages:
+        text += page.extract_text()
+    return text
+
+
+def synthetic_pdf(pages, folder):
+    source = PdfReader(SOURCE)
+    writer = PdfWriter()
+    for number in range(pages):
+        writer.add_page(source.pages[number % len(source.pages)])
+    path = os.path.join(folder, f"synthetic_{pages}.pdf")
+    with open(path, "wb") as file:
+        writer.write(file)
+    return path
+
+
+def timed(func, path):
+    start = time.perf_counter()
+    text = func(path)
+    return time.perf_counter() - start, text
+
+
+def worker_counts():
+    counts, workers = [], 2
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts + ([os.cpu_count()] if (os.cpu_count() or 1) > 1 else [])
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [200, 500]
+    with tempfile.TemporaryDirectory() as folder:
+        documents = [SOURCE] + [synthetic_pdf(pages, folder) for pages in sizes]
+        print(f"{os.cpu_count()} CPUs")
+        print(f"{'document':>20} {'pages':>6} {'method':>12} {'seconds':>8} {'pages/sec':>10}")
+        for path in documents:
+            pages = len(PdfReader(path).pages)
+            baseline_seconds, baseline = timed(legacy_read, path)
+            rows = [("legacy +=", baseline_seconds)]
+
+            sequential = PdfExtractor(workers=1, cache_size=1)
+            seconds, text = timed(sequential.extract, path)
+            assert text == baseline
+            rows.append(("sequential", seconds))
+            # a second call is answered from the cache
+            rows.append(("cached", timed(sequential.extract, path)[0]))
+
+            for workers in worker_counts():
+                extractor = PdfExtractor(workers=workers, parallel_threshold=1, cache_size=1)
+                # start the worker processes outside the timing
+                extractor.extract(SOURCE)
+                seconds, text = timed(extractor.extract, path)
+                assert text == baseline
+                rows.append((f"{workers} workers", seconds))
+                extractor.close()
+
+            for method, seconds in rows:
+                print(f"{os.path.basename(path):>20} {pages:>6} {method:>12} {seconds:>8.3f} {pages / seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Simulated Gemini quota: many concurrent clients with and without the adaptive limiter.
+
+The fake server enforces a requests-per-second and tokens-per-second quota
+over a sliding one-second window (the per-minute quota, scaled down so the run
+is short) and raises a 429 ResourceExhausted error past it. Its latency also
+grows with the number of calls in flight, like a congested backend.
+
+The fake chat model retries 429s inside one call, as langchain_google_genai's
+clients do (`max_retries` attempts, tenacity's exponential backoff, scaled by
+1/16), so callbacks see only the outcome of the last attempt. Arms:
+
+    client retries   no limiter, the client's own retries
+    limiter+client   RateLimitCallback, but the client still retries unseen
+    limited          single_attempt client, retry_throttled around it, RateLimitCallback
+
+Usage:
+    python -m benchmarks.rate_limit [clients] [requests_per_client] [quota_rps]
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+from typing import Any, List, Optional
+
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from benchmarks.fakes import percentile
+from rate_limiter import AdaptiveRateLimiter, RateLimitCallback, retry_throttled, single_attempt
+
+
+class QuotaServer:
+    """Sliding-window request/token quota plus a congestion-dependent latency."""
+
+    def __init__(self, rps: float, tps: float, base_latency: float = 0.1, congestion: int = 8):
+        self.rps, self.tps = rps, tps
+        self.base_latency, self.congestion = base_latency, congestion
+        self.window: deque = deque()
+        self.in_flight = 0
+        self.rejected = 0
+        self.served = 0
+
+    async def call(self, tokens: int) -> None:
+        now = time.monotonic()
+        while self.window and now - self.window[0][0] > 1.0:
+            self.window.popleft()
+        if len(self.window) + 1 > self.rps or sum(t for _, t in self.window) + tokens > self.tps:
+            self.rejected += 1
+            await asyncio.sleep(0.02)
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        self.window.append((now, tokens))
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.base_latency * (1 + self.in_flight / self.congestion))
+        finally:
+            self.in_flight -= 1
+        self.served += 1
+
+
+class QuotaChatModel(BaseChatModel):
+    server: Any
+    tokens: int = 300
+    max_retries: int = 6
+
+    @property
+    def _llm_type(self) -> str:
+        return "quota-stub"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError("async only")
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self.server.call(self.tokens)
+                break
+            except ResourceExhausted:
+                if attempt >= self.max_retries:
+                    raise
+                # the client's wait_exponential(multiplier=2, min=1, max=60), scaled by 1/16
+                await asyncio.sleep(min(max(2 * 2 ** (attempt - 1), 1), 60) / 16)
+        message = AIMessage(
+            content="ok",
+            usage_metadata={"input_tokens": self.tokens - 50, "output_tokens": 50, "total_tokens": self.tokens},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+async def run(label, clients, per_client, rps, limited, client_retries):
+    server = QuotaServer(rps=rps, tps=rps * 300)
+    callbacks = []
+    limiter = None
+    if limited:
+        # the limiter is configured with the published quota, a little under the real one
+        limiter = AdaptiveRateLimiter(requests_per_minute=rps * 60 * 0.95, tokens_per_minute=rps * 300 * 60 * 0.95,
+                                      max_concurrency=32, target_latency=0.4, burst_seconds=1, cooldown=0.5)
+        callbacks = [RateLimitCallback(limiter, output_tokens=50)]
+    model = QuotaChatModel(server=server, callbacks=callbacks)
+    if not client_retries:
+        model = retry_throttled(single_attempt(model))
+    latencies, failures = [], 0
+
+    async def client():
+        nonlocal failures
+        for _ in range(per_client):
+            start = time.perf_counter()
+            try:
+                await model.ainvoke("question")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<15} {elapsed:7.2f}s {server.served / elapsed:8.1f} req/s  429s={server.rejected:<5} "
+        f"failed={failures:<4} p50={percentile(latencies, 50):6.2f}s p95={percentile(latencies, 95):6.2f}s"
+        + (f"  admitted={limiter.calls} final limit={limiter.limit:.1f}" if limiter else "")
+    )
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rps = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(f"{clients} clients x {per_client} requests, quota {rps:.0f} req/s")
+    asyncio.run(run("client retries", clients, per_client, rps, limited=False, client_retries=True))
+    asyncio.run(run("limiter+client", clients, per_client, rps, limited=True, client_retries=True))
+    asyncio.run(run("limited", clients, per_client, rps, limited=True, client_retries=False))
+
+
+if __name__ == "__main__":
+    main()
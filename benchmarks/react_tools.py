@@ -0,0 +1,91 @@
+"""
+Agent latency with and without the tool cache and parallel actions, on stub tools.
+
+Stub arxiv, pubmed and wikipedia tools sleep like network lookups; a scripted
+model plays the agent. Each question needs the same three lookups, either one
+per step (sequential ReAct) or all three in the first step (parallel mode).
+Questions repeat, so the cache answers every lookup after the first round.
+
+Usage:
+    python -m benchmarks.react_tools [rounds] [tool_latency_seconds]
+"""
+import asyncio
+import json
+import sys
+import time
+
+from langchain.agents import AgentExecutor, create_react_agent
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.prompts import PromptTemplate
+from langchain_core.tools import Tool
+
+from agent_tools import MultiActionReActParser, ToolCache
+
+PROMPT = PromptTemplate.from_template(
+    "Tools:\n{tools}\nNames: {tool_names}\nQuestion: {input}\nThought: {agent_scratchpad}"
+)
+
+QUESTIONS = ["attention", "protein folding", "graph networks"]
+TOOL_NAMES = ["arxiv", "pubmed", "wikipedia"]
+
+
+def stub_tools(latency):
+    def make(name):
+        def lookup(query):
+            time.sleep(latency)
+            return f"{name} result for {query}"
+
+        async def alookup(query):
+            await asyncio.sleep(latency)
+            return f"{name} result for {query}"
+
+        return Tool(name=name, description=f"Looks {name} up", func=lookup, coroutine=alookup)
+
+    return [make(name) for name in TOOL_NAMES]
+
+
+def script(question, parallel):
+    # the model's replies for one question
+    actions = [f"Action: {name}\nAction Input: {question}" for name in TOOL_NAMES]
+    if parallel:
+        steps = ["I need all three sources.\n" + "\n".join(actions)]
+    else:
+        steps = [f"I should check {name}.\n{action}" for name, action in zip(TOOL_NAMES, actions)]
+    return steps + [f"I now know the final answer\nFinal Answer: summary of {question}"]
+
+
+async def run(label, latency, rounds, cached, parallel):
+    tool_cache = ToolCache()
+    tools = stub_tools(latency)
+    tools = tool_cache.wrap(tools) if cached else tools
+    elapsed = []
+    for _ in range(rounds):
+        for question in QUESTIONS:
+            llm = FakeListLLM(responses=script(question, parallel))
+            agent = create_react_agent(
+                llm, tools, PROMPT, output_parser=MultiActionReActParser() if parallel else None
+            )
+            executor = AgentExecutor(agent=agent, tools=tools, max_iterations=5)
+            start = time.perf_counter()
+            result = await executor.ainvoke({"input": question})
+            elapsed.append(time.perf_counter() - start)
+            assert result["output"] == f"summary of {question}"
+    first = sum(elapsed[: len(QUESTIONS)]) / len(QUESTIONS)
+    later = sum(elapsed[len(QUESTIONS):]) / max(1, len(elapsed) - len(QUESTIONS))
+    print(f"{label:<20} first round {first * 1000:7.1f} ms/question   later rounds {later * 1000:7.1f} ms/question")
+    return tool_cache
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    print(f"{len(QUESTIONS)} questions x {rounds} rounds, {latency * 1000:.0f} ms per tool call")
+    asyncio.run(run("sequential", latency, rounds, cached=False, parallel=False))
+    asyncio.run(run("parallel", latency, rounds, cached=False, parallel=True))
+    asyncio.run(run("sequential+cache", latency, rounds, cached=True, parallel=False))
+    tool_cache = asyncio.run(run("parallel+cache", latency, rounds, cached=True, parallel=True))
+    print(json.dumps(tool_cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
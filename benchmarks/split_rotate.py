@@ -0,0 +1,60 @@
+"""
+Images/sec of batch_split_rotate.process_folder as the worker count grows.
+
+Generates a folder of noisy JPEG "scan pages" (noise keeps the encoder honest;
+flat images compress unrealistically fast) and processes it with 1, 2, 4, ...
+workers up to the CPU count.
+
+Usage:
+    python -m benchmarks.split_rotate [images] [width] [height]
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from batch_split_rotate import process_folder
+
+
+def generate_images(folder, count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    # one noise tile reused with a per-image shift keeps generation fast
+    tile = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    for i in range(count):
+        pixels = np.roll(tile, shift=i * 7, axis=1)
+        Image.fromarray(pixels).save(os.path.join(folder, f"page_{i:05d}.jpg"), quality=90)
+
+
+def worker_counts():
+    counts, workers = [], 1
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 2480
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 1754
+
+    with tempfile.TemporaryDirectory() as folder:
+        generate_images(folder, count, width, height)
+        print(f"{count} images of {width}x{height}, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'images/sec':>11} {'speedup':>8} {'median ms':>10}")
+        baseline = None
+        for workers in worker_counts():
+            summary = process_folder(folder, os.path.join(folder, f"out_{workers}"), workers=workers, progress=False)
+            assert not summary.failures, summary.failures[0].error
+            baseline = baseline or summary.images_per_second
+            median = sorted(result.seconds for result in summary.results)[len(summary.results) // 2]
+            print(
+                f"{workers:>7} {summary.images_per_second:>11.1f} "
+                f"{summary.images_per_second / baseline:>7.2f}x {median * 1000:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
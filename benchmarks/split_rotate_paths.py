@@ -0,0 +1,104 @@
+"""
+Per-image time and peak memory of the split_and_rotate_image code paths.
+
+Paths compared on a generated scan-sized page:
+- "rotate": the original Image.rotate(±90, expand=True) and a default JPEG save
+- "transpose": transpose(ROTATE_90/270), output kept in the input's format
+- "transpose+optimize": as above with optimize=True
+- "draft 1/2": JPEG draft decoding straight to half size
+- "png kept": PNG input written back as PNG (previously re-encoded as JPEG)
+- "tiff" / "tiff low-memory": uncompressed TIFF decoded whole, or in bands of rows
+
+Each path runs in a fresh process so its peak RSS (ru_maxrss, minus the
+process's baseline after imports) is not hidden by an earlier, larger path.
+
+Usage:
+    python -m benchmarks.split_rotate_paths [repeats] [width] [height]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from batch_split_rotate import OutputOptions, _split_and_rotate
+
+
+def rotate_and_save(input_path, output_dir):
+    # the implementation before the transpose fast path, kept here as the baseline
+    img = Image.open(input_path)
+    width, height = img.size
+    left_half = img.crop((0, 0, width // 2, height)).rotate(-90, expand=True)
+    right_half = img.crop((width // 2, 0, width, height)).rotate(90, expand=True)
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    left_half.save(os.path.join(output_dir, f"{base_name}_left_rotated.jpg"))
+    right_half.save(os.path.join(output_dir, f"{base_name}_right_rotated.jpg"))
+
+
+PATHS = {
+    "rotate": ("jpg", None),
+    "transpose": ("jpg", OutputOptions()),
+    "transpose+optimize": ("jpg", OutputOptions(optimize=True)),
+    "draft 1/2": ("jpg", OutputOptions(scale=0.5)),
+    "png kept": ("png", OutputOptions()),
+    "tiff": ("tiff", OutputOptions()),
+    "tiff low-memory": ("tiff", OutputOptions(low_memory=True)),
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_path(name, input_path, output_dir, repeats):
+    _, options = PATHS[name]
+    baseline = peak_rss_mb()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        if options is None:
+            rotate_and_save(input_path, output_dir)
+        else:
+            _split_and_rotate(input_path, output_dir, options)
+        times.append(time.perf_counter() - start)
+    output_bytes = sum(
+        os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir)
+    )
+    return sorted(times)[len(times) // 2], peak_rss_mb() - baseline, output_bytes
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 4960
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 3508
+
+    with tempfile.TemporaryDirectory() as folder:
+        # smooth gradients plus noise: compresses like a photographed page, not like pure noise
+        rng = np.random.default_rng(0)
+        y, x = np.mgrid[0:height, 0:width]
+        pixels = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) % 256)], axis=-1).astype(np.int16)
+        pixels = np.clip(pixels + rng.integers(-20, 21, size=pixels.shape), 0, 255).astype(np.uint8)
+        page = Image.fromarray(pixels)
+        page.save(os.path.join(folder, "page.jpg"), quality=90)
+        page.save(os.path.join(folder, "page.png"))
+        page.save(os.path.join(folder, "page.tiff"))
+
+        print(f"{width}x{height} page, median of {repeats} runs")
+        print(f"{'path':>19} {'ms/image':>9} {'peak MB':>8} {'output KB':>10}")
+        for name, (extension, _) in PATHS.items():
+            output_dir = os.path.join(folder, name.replace(" ", "_").replace("/", "_"))
+            os.makedirs(output_dir)
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                seconds, peak, output_bytes = pool.submit(
+                    run_path, name, os.path.join(folder, f"page.{extension}"), output_dir, repeats
+                ).result()
+            print(f"{name:>19} {seconds * 1000:>9.1f} {peak:>8.1f} {output_bytes / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
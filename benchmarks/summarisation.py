@@ -0,0 +1,80 @@
+"""
+Latency of /summarize's strategies as documents grow from 10 to 400 pages.
+
+The model is a local stub whose latency grows with the prompt (a fixed
+overhead plus a per-token cost, as with a real model's prefill) and which
+answers with a short bullet list, so map-reduce collapses the way it would
+against Gemini. Pages are diabetes.pdf's text repeated.
+
+Usage:
+    python -m benchmarks.summarisation [concurrency] [ms_per_1k_tokens]
+"""
+import asyncio
+import sys
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from adaptive_retrieval import estimate_tokens
+from document_summary import DocumentSummarizer
+from pdf_extraction import PdfExtractor
+
+PAGE_COUNTS = [10, 50, 100, 200, 400]
+
+
+class SummaryStub(BaseChatModel):
+    """Answers with a few bullets after `overhead + per_token * prompt tokens` seconds."""
+
+    overhead: float = 0.3
+    per_token: float = 0.00002
+
+    @property
+    def _llm_type(self) -> str:
+        return "summary-stub"
+
+    def _latency(self, prompt: str) -> float:
+        return self.overhead + self.per_token * estimate_tokens(prompt)
+
+    def _result(self, prompt: str) -> ChatResult:
+        text = "\n".join(f"- point {i} of a {len(prompt)}-character prompt" for i in range(8))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = "".join(str(message.content) for message in messages)
+        time.sleep(self._latency(prompt))
+        return self._result(prompt)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = "".join(str(message.content) for message in messages)
+        await asyncio.sleep(self._latency(prompt))
+        return self._result(prompt)
+
+
+async def measure(summarizer, text, strategy):
+    start = time.perf_counter()
+    result = await summarizer.ainvoke(text, strategy)
+    return time.perf_counter() - start, result
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    per_token = (float(sys.argv[2]) if len(sys.argv) > 2 else 0.02) / 1000
+    extractor = PdfExtractor(workers=1)
+    pages = list(extractor.iter_pages("diabetes.pdf"))
+    model = SummaryStub(per_token=per_token)
+    summarizer = DocumentSummarizer(model, max_concurrency=concurrency)
+
+    print(f"max_concurrency={concurrency}, {per_token * 1e6:.0f} ms per 1k prompt tokens")
+    print(f"{'pages':>6} {'tokens':>8} {'strategy':>11} {'chunks':>7} {'seconds':>8}")
+    for count in PAGE_COUNTS:
+        text = "".join(pages[i % len(pages)] for i in range(count))
+        for strategy in ("stuff", "auto"):
+            seconds, result = asyncio.run(measure(summarizer, text, strategy))
+            print(f"{count:>6} {estimate_tokens(text):>8} {result['strategy']:>11} {result['chunks']:>7} {seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
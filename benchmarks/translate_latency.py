@@ -0,0 +1,78 @@
+"""
+Compare /translate/ latency with per-request chain setup against the shared registry.
+
+The "before" path reproduces the original call_gemini: load .env, build a
+ChatGoogleGenerativeAI client, the prompt and the chain on every call. Both
+paths answer with a stubbed local LLM so only the setup cost differs.
+
+Usage:
+    python -m benchmarks.translate_latency [requests] [llm_latency_seconds]
+"""
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from benchmarks.fakes import StubChatModel, percentile
+from chain_registry import ChainRegistry
+from main import TRANSLATION_MODEL, TRANSLATION_TEMPERATURE, build_translation_chain
+
+PAYLOAD = {
+    "input_language": "English",
+    "output_language": "Spanish",
+    "text_input": "Hello, how are you?",
+}
+
+
+def translate_per_request(stub: StubChatModel) -> str:
+    load_dotenv()
+    # the real client is still constructed, as in the original code, but not called
+    ChatGoogleGenerativeAI(
+        model=TRANSLATION_MODEL,
+        api_key=os.getenv("GEMINI_API_KEY") or "benchmark",
+        temperature=TRANSLATION_TEMPERATURE,
+    )
+    prompt = ChatPromptTemplate.from_messages([
+        (
+            "system",
+            "You are a helpful assistant that translates {input_language} to {output_language}. Translate the use sentence.",
+        ),
+        (
+            "human",
+            "{text_input}",
+        ),
+    ])
+    chain = prompt | stub
+    return chain.invoke(PAYLOAD).content
+
+
+def run(label, call, requests):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    print(
+        f"{label:<14} p50={percentile(samples, 50) * 1000:8.2f} ms  "
+        f"p99={percentile(samples, 99) * 1000:8.2f} ms"
+    )
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    stub = StubChatModel(latency=latency)
+
+    registry = ChainRegistry(llm_factory=lambda model, temperature: stub)
+    registry.register("translate", build_translation_chain, TRANSLATION_MODEL, TRANSLATION_TEMPERATURE)
+
+    print(f"{requests} requests, stub LLM latency {latency * 1000:.0f} ms")
+    run("per-request", lambda: translate_per_request(stub), requests)
+    run("registry", lambda: registry.get("translate").invoke(PAYLOAD).content, requests)
+
+
+if __name__ == "__main__":
+    main()
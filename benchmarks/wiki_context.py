@@ -0,0 +1,73 @@
+"""
+Wikipedia context latency and prompt size, with a local stand-in for the loader.
+
+The stand-in sleeps like a Wikipedia download and returns diabetes.pdf's text
+as the page. A cold pass downloads each topic; a warm pass is served from the
+in-memory index; a restarted process (new WikiContext, same cache directory)
+reads the pages back from disk. Prompt tokens for the whole page are compared
+with the BM25-trimmed context for a few questions.
+
+Usage:
+    python -m benchmarks.wiki_context [download_latency_seconds] [max_context_tokens]
+"""
+import asyncio
+import json
+import sys
+import tempfile
+import time
+
+from adaptive_retrieval import estimate_tokens
+from pdf_extraction import PdfExtractor
+from wiki_context import WikiContext, WikiPageCache
+
+TOPICS = ["Diabetes", "Insulin", "Blood sugar"]
+QUESTIONS = [
+    "What are the symptoms of diabetes?",
+    "How is type 2 diabetes treated?",
+    "What complications affect the eyes and kidneys?",
+]
+
+
+def stand_in_loader(text, latency):
+    def load_page(topic):
+        time.sleep(latency)
+        return f"{topic}\n\n{text}"
+
+    return load_page
+
+
+async def timed_pass(label, wiki_context):
+    start = time.perf_counter()
+    # every topic asked twice at once: the second request waits for the first download
+    await asyncio.gather(*(
+        wiki_context.context(topic, question) for topic in TOPICS for question in QUESTIONS[:2]
+    ))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} {elapsed * 1000:8.1f} ms for {len(TOPICS) * 2} requests")
+
+
+async def run(text, latency, max_tokens, cache_dir):
+    load_page = stand_in_loader(text, latency)
+    wiki_context = WikiContext(load_page, WikiPageCache(cache_dir), max_tokens=max_tokens)
+    await timed_pass("cold", wiki_context)
+    await timed_pass("warm", wiki_context)
+    restarted = WikiContext(load_page, WikiPageCache(cache_dir), max_tokens=max_tokens)
+    await timed_pass("restart (disk)", restarted)
+
+    print(f"\nfull page: {estimate_tokens(text)} tokens")
+    for question in QUESTIONS:
+        context = await restarted.context(TOPICS[0], question)
+        print(f"{estimate_tokens(context):6d} tokens  {question}")
+    print(json.dumps({"first": wiki_context.stats(), "restarted": restarted.stats()}, indent=2))
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+    max_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 1500
+    text = "\n\n".join(PdfExtractor().iter_pages("diabetes.pdf"))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        asyncio.run(run(text, latency, max_tokens, cache_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import inspect
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from rate_limiter import gemini_rate_limit, single_attempt
+
+# Load environment variables once, when the registry module is imported
+load_dotenv()
+
+LLMKey = Tuple[str, float]
+ChainBuilder = Callable[[BaseChatModel], Runnable]
+
+
+def gemini_chat_factory(model: str, temperature: float) -> BaseChatModel:
+    """
+    Default factory used by the registry to create Gemini chat clients.
+
+    Args:
+        model (str): Gemini model name, e.g. "gemini-1.5-flash"
+        temperature (float): Sampling temperature
+
+    Returns:
+        BaseChatModel: A configured ChatGoogleGenerativeAI client
+    """
+    return single_attempt(ChatGoogleGenerativeAI(
+        model=model,
+        api_key=os.getenv("GEMINI_API_KEY"),
+        temperature=temperature,
+        # share the process-wide Gemini quota; retry in the chain with retry_throttled
+        callbacks=[gemini_rate_limit],
+    ))
+
+
+class ChainRegistry:
+    """
+    Process-wide registry of LLM clients and the chains compiled on top of them.
+
+    Clients are keyed by (model, temperature) so every chain that asks for the
+    same configuration shares one client. Chains are registered by name with a
+    builder function and compiled once, the first time they are requested or
+    when the registry is warmed up at application startup.
+    """
+
+    def __init__(self, llm_factory: Optional[Callable[[str, float], BaseChatModel]] = None):
+        self._llm_factory = llm_factory or gemini_chat_factory
+        self._llms: Dict[LLMKey, BaseChatModel] = {}
+        self._builders: Dict[str, Tuple[ChainBuilder, LLMKey]] = {}
+        self._chains: Dict[str, Runnable] = {}
+
+    def get_llm(self, model: str, temperature: float) -> BaseChatModel:
+        """Return the shared client for a model/temperature pair, creating it on first use."""
+        key = (model, float(temperature))
+        if key not in self._llms:
+            self._llms[key] = self._llm_factory(model, float(temperature))
+        return self._llms[key]
+
+    def register(self, name: str, builder: ChainBuilder, model: str, temperature: float) -> None:
+        """
+        Register a chain builder under a name.
+
+        Args:
+            name (str): Name used to look the chain up later
+            builder (callable): Function that receives the LLM client and returns a runnable chain
+            model (str): Model name the chain runs on
+            temperature (float): Sampling temperature for the chain's client
+        """
+        self._builders[name] = (builder, (model, float(temperature)))
+        self._chains.pop(name, None)
+
+    def get(self, name: str) -> Runnable:
+        """Return the compiled chain registered under `name`."""
+        if name not in self._chains:
+            if name not in self._builders:
+                raise KeyError(f"No chain registered under '{name}'")
+            builder, (model, temperature) = self._builders[name]
+            self._chains[name] = builder(self.get_llm(model, temperature))
+        return self._chains[name]
+
+    async def warm_up(self, inputs: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """
+        Build every registered chain and open the clients' async transports.
+
+        Args:
+            inputs (dict, optional): Per-chain sample inputs. Chains listed here are
+                invoked once so the first real request does not pay for connection setup.
+        """
+        for name in self._builders:
+            self.get(name)
+
+        # ChatGoogleGenerativeAI creates its async client lazily inside a running loop
+        for llm in self._llms.values():
+            getattr(llm, "async_client", None)
+
+        for name, sample in (inputs or {}).items():
+            await self.get(name).ainvoke(sample)
+
+    async def aclose(self) -> None:
+        """Close the underlying client transports and forget every compiled chain."""
+        for llm in self._llms.values():
+            for attr in ("client", "async_client_running"):
+                transport = getattr(getattr(llm, attr, None), "transport", None)
+                close = getattr(transport, "close", None)
+                if close is None:
+                    continue
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+        self._chains.clear()
+        self._llms.clear()
@@ -3,15 +3,18 @@ import pandas as pd
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
 from dotenv import load_dotenv
+from rate_limiter import gemini_rate_limit, retry_throttled, single_attempt
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=GEMINI_API_KEY )
+# callbacks: share the process-wide Gemini quota; single_attempt: every request, retries
+# included, is admitted by it; the agent retries a throttled step with retry_throttled
+llm = single_attempt(ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=GEMINI_API_KEY, callbacks=[gemini_rate_limit]))
 
 df = pd.read_csv("students.csv")
 
 agent = create_pandas_dataframe_agent(
-    llm = llm,
+    llm = retry_throttled(llm),
     df = df,
     verbose=True,
     max_iterations=5,
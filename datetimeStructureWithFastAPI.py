@@ -5,15 +5,18 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.output_parsers.datetime import DatetimeOutputParser
 from datetime import datetime
+from rate_limiter import gemini_rate_limit, retry_throttled, single_attempt
 
 app = FastAPI()
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
+llm = single_attempt(ChatGoogleGenerativeAI(
     model="gemini-1.5-flash",
-    api_key=os.getenv("GEMINI_API_KEY")
-)
+    api_key=os.getenv("GEMINI_API_KEY"),
+    # share the process-wide Gemini quota; retries go through it too (see retry_throttled)
+    callbacks=[gemini_rate_limit],
+))
 
 output_parser = DatetimeOutputParser()
 
@@ -30,7 +33,7 @@ chat_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-chain = chat_prompt | llm | output_parser
+chain = chat_prompt | retry_throttled(llm) | output_parser
 
 
 @app.get("/ask")
@@ -44,7 +47,7 @@ async def ask_question(question: str = Query(..., title="User Question")):
     Returns:
         str: The language model's response, formatted as a datetime string.
     """
-    ai_msg = chain.invoke(
+    ai_msg = await chain.ainvoke(
         {
             "request": question,
             "format_instructions": output_parser.get_format_instructions()
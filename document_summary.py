@@ -0,0 +1,184 @@
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.language_models import LanguageModelLike
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from adaptive_retrieval import estimate_tokens
+
+STRATEGIES = ("auto", "stuff", "map_reduce", "refine")
+
+MAP_PROMPT = PromptTemplate.from_template(
+    """
+Write a concise summary of the following part of a longer document, delimited by triple backquotes
+Return your response in bullet points which covers the key points of the text
+'''{text}'''
+BULLET POINT SUMMARY:
+"""
+)
+
+REDUCE_PROMPT = PromptTemplate.from_template(
+    """
+The following bullet points summarise consecutive parts of one document, delimited by triple backquotes
+Merge them into a single concise bullet point summary of the whole document, dropping repetition
+'''{text}'''
+BULLET POINT SUMMARY:
+"""
+)
+
+REFINE_PROMPT = PromptTemplate.from_template(
+    """
+Here is a bullet point summary of the beginning of a document:
+{existing_summary}
+
+Refine it with the next part of the document, delimited by triple backquotes. Add the key points
+it introduces and keep the summary concise. If it adds nothing important, return the summary unchanged.
+'''{text}'''
+BULLET POINT SUMMARY:
+"""
+)
+
+
+class DocumentSummarizer:
+    """
+    Bullet-point summaries of documents of any length.
+
+    The text is measured with a token counter and summarised with one of:
+    - "stuff": the whole text in one prompt, when it fits `token_budget`
+    - "map_reduce": the text is split into chunks of about `chunk_tokens` that are
+      summarised concurrently (at most `max_concurrency` calls at once); the
+      chunk summaries are merged, collapsing them again while they are over
+      budget. Each round takes about ceil(chunks / max_concurrency) model calls
+      end to end, so latency stays flat until the chunks outnumber
+      `max_concurrency` and then grows with the page count.
+    - "refine": chunks are read in order, each one refining the summary so far.
+      Sequential, so it is only picked automatically for a few chunks.
+    "auto" chooses stuff when the text fits, refine up to `refine_max_chunks`
+    chunks and map_reduce beyond that.
+
+    The result is {"summary", "strategy", "chunks"}.
+
+    Args:
+        llm: Chat or completion model, or a runnable wrapping one (e.g. `retry_throttled`)
+        prompt (PromptTemplate): Prompt for the "stuff" strategy, with a {text} variable
+        token_budget (int): Maximum document tokens per LLM call
+        chunk_tokens (int): Target size of each chunk, in tokens
+        chunk_overlap (int): Tokens shared by neighbouring chunks
+        count_tokens (callable): Token counter; `estimate_tokens` by default
+        max_concurrency (int): Map calls running at once
+        refine_max_chunks (int): Largest chunk count "auto" summarises with refine
+    """
+
+    def __init__(
+        self,
+        llm: LanguageModelLike,
+        prompt: PromptTemplate = MAP_PROMPT,
+        token_budget: int = 8000,
+        chunk_tokens: int = 3000,
+        chunk_overlap: int = 100,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        max_concurrency: int = 32,
+        refine_max_chunks: int = 2,
+    ):
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.max_concurrency = max_concurrency
+        self.refine_max_chunks = refine_max_chunks
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens, chunk_overlap=chunk_overlap, length_function=count_tokens
+        )
+        self.stuff_chain = prompt | llm | StrOutputParser()
+        self.map_chain = MAP_PROMPT | llm | StrOutputParser()
+        self.reduce_chain = REDUCE_PROMPT | llm | StrOutputParser()
+        self.refine_chain = REFINE_PROMPT | llm | StrOutputParser()
+
+    def plan(self, text: str, strategy: str = "auto") -> tuple:
+        """
+        Pick the strategy for `text` and split it into the chunks that strategy reads.
+
+        Returns:
+            tuple: (strategy, chunks)
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}; expected one of {', '.join(STRATEGIES)}")
+        if strategy == "stuff" or (strategy == "auto" and self.count_tokens(text) <= self.token_budget):
+            return "stuff", [text]
+        chunks = self.splitter.split_text(text) or [text]
+        if strategy == "auto":
+            strategy = "refine" if len(chunks) <= self.refine_max_chunks else "map_reduce"
+        return strategy, chunks
+
+    def _pack(self, texts: List[str]) -> List[str]:
+        """Greedily pack summaries into groups whose token count fits the budget."""
+        groups: List[List[str]] = [[]]
+        used = 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if groups[-1] and used + tokens > self.token_budget:
+                groups.append([])
+                used = 0
+            groups[-1].append(text)
+            used += tokens
+        return ["\n\n".join(group) for group in groups if group]
+
+    async def _collapse(self, chunks: List[str]) -> str:
+        """Map every chunk, then merge the summaries until one group fits the budget."""
+        config = {"max_concurrency": self.max_concurrency}
+        texts = await self.map_chain.abatch([{"text": chunk} for chunk in chunks], config=config)
+        groups = self._pack(texts)
+        while len(groups) > 1:
+            texts = await self.reduce_chain.abatch([{"text": group} for group in groups], config=config)
+            next_groups = self._pack(texts)
+            # stop collapsing once a round no longer reduces the number of groups
+            if len(next_groups) >= len(groups):
+                groups = ["\n\n".join(next_groups)]
+                break
+            groups = next_groups
+        return groups[0]
+
+    async def _refine(self, chunks: List[str]) -> Optional[str]:
+        """Refine the summary over every chunk but the last; returns None for a single chunk."""
+        summary = None
+        for chunk in chunks[:-1]:
+            if summary is None:
+                summary = await self.map_chain.ainvoke({"text": chunk})
+            else:
+                summary = await self.refine_chain.ainvoke({"existing_summary": summary, "text": chunk})
+        return summary
+
+    async def ainvoke(self, text: str, strategy: str = "auto") -> Dict[str, Any]:
+        strategy, chunks = self.plan(text, strategy)
+        if strategy == "stuff":
+            summary = await self.stuff_chain.ainvoke({"text": text})
+        elif strategy == "map_reduce":
+            summary = await self.reduce_chain.ainvoke({"text": await self._collapse(chunks)})
+        else:
+            summary = await self._refine(chunks)
+            if summary is None:
+                summary = await self.map_chain.ainvoke({"text": chunks[-1]})
+            else:
+                summary = await self.refine_chain.ainvoke({"existing_summary": summary, "text": chunks[-1]})
+        return {"summary": summary, "strategy": strategy, "chunks": len(chunks)}
+
+    async def astream(self, text: str, strategy: str = "auto") -> AsyncIterator[str]:
+        """
+        Like `ainvoke`, but streams the final call's tokens.
+
+        The map and refine steps before it run to completion first, so the first
+        token arrives once the last merge (or refinement) starts.
+        """
+        strategy, chunks = self.plan(text, strategy)
+        if strategy == "stuff":
+            final = self.stuff_chain.astream({"text": text})
+        elif strategy == "map_reduce":
+            final = self.reduce_chain.astream({"text": await self._collapse(chunks)})
+        else:
+            summary = await self._refine(chunks)
+            if summary is None:
+                final = self.map_chain.astream({"text": chunks[-1]})
+            else:
+                final = self.refine_chain.astream({"existing_summary": summary, "text": chunks[-1]})
+        async for token in final:
+            if token:
+                yield token
@@ -0,0 +1,300 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locking
+    fcntl = None
+
+# bytes of sha256(key) stored next to each row to check it still holds that key's vector
+TAG_BYTES = 16
+
+
+class EmbeddingCache:
+    """
+    Disk-backed LRU store of embedding vectors.
+
+    Vectors live in a memory-mapped float32 matrix (`vectors.f32`) and a side
+    index (`index.json`) maps each key to its row in LRU order. Evicted rows are
+    reused, and the matrix doubles in size until `max_entries` rows exist.
+    The index is rewritten every `save_every` new vectors and at interpreter exit.
+
+    Each row also carries a tag derived from its key (`tags.bin`), checked on
+    every read, so an index saved before a row was reused (after a crash, or by
+    another process sharing the directory) yields a miss, never another text's
+    vector. Row and index writes hold an exclusive lock on `lock` and reads a
+    shared one, where the platform has `fcntl`.
+
+    Args:
+        path (str): Directory holding the matrix and index; created if missing
+        max_entries (int): Maximum vectors kept before the least recently used are evicted
+        save_every (int): Number of writes between index saves
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, save_every: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._rows: "OrderedDict[str, int]" = OrderedDict()
+        self._free_rows: List[int] = []
+        self._matrix: Optional[np.memmap] = None
+        self._tags: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+        with self._file_lock(shared=True):
+            self._load()
+        atexit.register(self.flush)
+
+    @property
+    def _matrix_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "index.json")
+
+    @property
+    def _tags_path(self) -> str:
+        return os.path.join(self.path, "tags.bin")
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, "lock"), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _tag(key: str) -> np.ndarray:
+        return np.frombuffer(hashlib.sha256(key.encode("utf-8")).digest()[:TAG_BYTES], dtype=np.uint8)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._index_path) or not os.path.exists(self._tags_path):
+            # no index, or one written before rows were tagged: rows can't be trusted, start empty
+            return
+        with open(self._index_path, "r") as file:
+            index = json.load(file)
+        self._dim = index["dim"]
+        self._rows = OrderedDict((key, row) for key, row in index["entries"])
+        self._free_rows = index.get("free_rows", [])
+        self._map(index["capacity"], "r+")
+
+    def _map(self, capacity: int, mode: str) -> None:
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode=mode, shape=(capacity, self._dim))
+        self._tags = np.memmap(self._tags_path, dtype=np.uint8, mode=mode, shape=(capacity, TAG_BYTES))
+
+    def _capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _grow(self, dim: int) -> None:
+        old_capacity = self._capacity()
+        capacity = min(self.max_entries, max(1024, old_capacity * 2))
+        if self._matrix is None:
+            self._dim = dim
+            self._map(capacity, "w+")
+        else:
+            # extend the backing files in place and map them again at the new size; never
+            # shrink them, another process sharing the directory may already use more rows
+            self._matrix.flush()
+            self._tags.flush()
+            self._matrix = self._tags = None
+            for path, row_bytes in ((self._matrix_path, self._dim * 4), (self._tags_path, TAG_BYTES)):
+                with open(path, "r+b") as file:
+                    if os.fstat(file.fileno()).st_size < capacity * row_bytes:
+                        file.truncate(capacity * row_bytes)
+            self._map(capacity, "r+")
+        # rows are popped from the end, so hand out low rows first
+        self._free_rows.extend(range(capacity - 1, old_capacity - 1, -1))
+
+    def _allocate_row(self, dim: int) -> int:
+        if not self._free_rows and self._capacity() < self.max_entries:
+            self._grow(dim)
+        if self._free_rows:
+            return self._free_rows.pop()
+        # full: reuse the least recently used row
+        _, row = self._rows.popitem(last=False)
+        self.evictions += 1
+        return row
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up several keys at once; missing keys come back as None."""
+        with self._lock, self._file_lock(shared=True):
+            found: List[Optional[np.ndarray]] = []
+            for key in keys:
+                row = self._rows.get(key)
+                if row is not None and not np.array_equal(self._tags[row], self._tag(key)):
+                    # the row was reused for another key since this mapping was saved
+                    del self._rows[key]
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self._rows.move_to_end(key)
+                    self.hits += 1
+                    found.append(np.array(self._matrix[row]))
+            return found
+
+    def put_many(self, items: List[Tuple[str, List[float]]]) -> None:
+        """Store several (key, vector) pairs."""
+        with self._lock, self._file_lock():
+            for key, vector in items:
+                array = np.asarray(vector, dtype=np.float32)
+                if self._dim is not None and array.shape[0] != self._dim:
+                    raise ValueError(f"Expected {self._dim}-dim vectors, got {array.shape[0]}")
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._allocate_row(array.shape[0])
+                # untag the row before overwriting it, so it never holds a vector under the wrong tag
+                self._tags[row] = 0
+                self._matrix[row] = array
+                self._tags[row] = self._tag(key)
+                self._rows[key] = row
+                self._rows.move_to_end(key)
+            self._unsaved += len(items)
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def flush(self) -> None:
+        """Write the matrix and index to disk."""
+        with self._lock, self._file_lock():
+            self._save()
+
+    def _save(self) -> None:
+        if self._matrix is None:
+            return
+        self._matrix.flush()
+        self._tags.flush()
+        tmp_path = f"{self._index_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as file:
+            json.dump(
+                {
+                    "dim": self._dim,
+                    "capacity": self._capacity(),
+                    "entries": list(self._rows.items()),
+                    "free_rows": self._free_rows,
+                },
+                file,
+            )
+        os.replace(tmp_path, self._index_path)
+        self._unsaved = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._rows),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an EmbeddingCache.
+
+    Keys are a hash of the model name, the kind of embedding (query or document,
+    since Gemini embeds them with different task types) and the text.
+
+    Args:
+        embeddings (Embeddings): The embedding model to wrap
+        model_name (str): Model name, part of every cache key
+        cache (EmbeddingCache): Where vectors are stored
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _split(self, kind: str, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+        found = self.cache.get_many([self._key(kind, text) for text in texts])
+        # embed each distinct missing text once
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, found) if vector is None))
+        return found, missing
+
+    def _merge(
+        self,
+        kind: str,
+        texts: List[str],
+        found: List[Optional[np.ndarray]],
+        missing: List[str],
+        vectors: List[List[float]],
+    ) -> List[List[float]]:
+        self.cache.put_many([(self._key(kind, text), vector) for text, vector in zip(missing, vectors)])
+        fresh = dict(zip(missing, vectors))
+        return [
+            list(map(float, vector)) if vector is not None else list(fresh[text])
+            for text, vector in zip(texts, found)
+        ]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        found, missing = self._split("document", texts)
+        vectors = self.embeddings.embed_documents(missing) if missing else []
+        return self._merge("document", texts, found, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        found, missing = self._split("query", [text])
+        vectors = [self.embeddings.embed_query(text)] if missing else []
+        return self._merge("query", [text], found, missing, vectors)[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        found, missing = self._split("document", texts)
+        vectors = await self.embeddings.aembed_documents(missing) if missing else []
+        return self._merge("document", texts, found, missing, vectors)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        found, missing = self._split("query", [text])
+        vectors = [await self.embeddings.aembed_query(text)] if missing else []
+        return self._merge("query", [text], found, missing, vectors)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+
+
+def maybe_cached(embeddings: Embeddings, model_name: str) -> Embeddings:
+    """
+    Wrap `embeddings` in a disk cache when EMBEDDING_CACHE_DIR is set.
+
+    Scripts opt in by passing their embeddings through this function; without the
+    environment variable they get the original object back unchanged.
+    EMBEDDING_CACHE_MAX_ENTRIES bounds the number of cached vectors per model.
+    """
+    cache_dir = os.getenv("EMBEDDING_CACHE_DIR")
+    if not cache_dir:
+        return embeddings
+    path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+    if path not in _caches:
+        _caches[path] = EmbeddingCache(path, max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")))
+    return CachedEmbeddings(embeddings, model_name, _caches[path])
@@ -3,6 +3,31 @@ import requests
 import base64
 from PIL import Image
 import io
+import json
+
+def stream_tokens(response):
+    """
+    Yield the text tokens of a Server-Sent Events response from the API.
+
+    Args:
+        response (requests.Response): Response opened with stream=True
+
+    Raises:
+        RuntimeError: If the server reports an error part-way through the stream
+    """
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+            if event == "error":
+                raise RuntimeError(data["detail"])
+            if event == "end":
+                return
+            yield data["token"]
+        elif not line:
+            event = None
 
 def main():
     st.set_page_config(
@@ -51,37 +76,28 @@ def main():
 
             # Add analyze button
             if st.button("Analyze Image", type="primary"):
-                with st.spinner("Analyzing image..."):
-                    try:
-                        # Prepare the file for API request
-                        files = {
-                            'file': (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)
-                        }
-                        
-                        # Make API request
-                        response = requests.post(
-                            'http://localhost:8000/analyze-image',
-                            files=files
-                        )
+                try:
+                    # Prepare the file for API request
+                    files = {
+                        'file': (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)
+                    }
+                    
+                    # Make a streaming API request so the analysis renders as it is generated
+                    response = requests.post(
+                        'http://localhost:8000/analyze-image/stream',
+                        files=files,
+                        stream=True
+                    )
+                    
+                    if response.status_code == 200:
+                        with col2:
+                            st.markdown("### Analysis Results")
+                            st.write_stream(stream_tokens(response))
+                    else:
+                        st.error(f"Error: {response.json()['detail']}")
                         
-                        if response.status_code == 200:
-                            analysis_result = response.json()['analysis']
-                            
-                            with col2:
-                                st.markdown("### Analysis Results")
-                                st.markdown(
-                                    f"""
-                                    <div class="analysis-box">
-                                        {analysis_result}
-                                    </div>
-                                    """, 
-                                    unsafe_allow_html=True
-                                )
-                        else:
-                            st.error(f"Error: {response.json()['detail']}")
-                            
-                    except Exception as e:
-                        st.error(f"An error occurred: {str(e)}")
+                except Exception as e:
+                    st.error(f"An error occurred: {str(e)}")
 
     # Add information about the app
     st.markdown("---")
@@ -89,7 +105,7 @@ def main():
     ### How to use:
     1. Upload a food image using the file uploader
     2. Click the 'Analyze Image' button
-    3. Wait for the analysis results
+    3. Watch the analysis results appear as they are generated
     
     ### Features:
     - Supports JPG and PNG images
@@ -1,8 +1,7 @@
 import { ref, computed } from "vue";
-import axios from "axios";
 import type {
   TranslationRequest,
-  TranslationResponse,
+  TranslationStreamEvent,
 } from "@/types/translation";
 
 export function useTranslation() {
@@ -35,6 +34,33 @@ export function useTranslation() {
     );
   });
 
+  // Reads Server-Sent Events from a fetch response and calls onData with each event's JSON payload
+  const readEventStream = async (
+    response: Response,
+    onData: (data: TranslationStreamEvent) => void
+  ) => {
+    const reader = response.body!.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+
+      const events = buffer.split("\n\n");
+      buffer = events.pop() ?? "";
+      for (const event of events) {
+        const lines = event.split("\n");
+        const name = lines.find((line) => line.startsWith("event: "))?.slice(7);
+        const data = lines.find((line) => line.startsWith("data: "))?.slice(6);
+        if (!data) continue;
+        if (name === "error") throw new Error(JSON.parse(data).detail);
+        if (name === "end") return;
+        onData(JSON.parse(data));
+      }
+    }
+  };
+
   const translate = async () => {
     if (!canTranslate.value) return;
 
@@ -43,16 +69,23 @@ export function useTranslation() {
     translatedText.value = "";
 
     try {
-      const response = await axios.post<TranslationResponse>(
-        "http://localhost:8000/translate/",
-        {
+      // stream tokens so the translation starts appearing before generation finishes
+      const response = await fetch("http://localhost:8000/translate/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
           input_language: inputLanguage.value,
           output_language: outputLanguage.value,
           text_input: inputText.value,
-        } as TranslationRequest
-      );
+        } as TranslationRequest),
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`Translation failed with status ${response.status}`);
+      }
 
-      translatedText.value = response.data.translated_text;
+      await readEventStream(response, (data) => {
+        translatedText.value += data.token;
+      });
     } catch (e) {
       error.value =
         e instanceof Error ? e.message : "An error occurred during translation";
@@ -7,3 +7,7 @@ export interface TranslationRequest {
 export interface TranslationResponse {
   translated_text: string;
 }
+
+export interface TranslationStreamEvent {
+  token: string;
+}
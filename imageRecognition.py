@@ -1,18 +1,31 @@
 import os, base64
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
 from typing import Dict
+from streaming import message_text, sse_response
+from async_utils import run_sync
+from image_preprocessing import PreparedImage, prepare_image
+from rate_limiter import gemini_rate_limit, retry_throttled, single_attempt
+from response_cache import TTLCache
+from uploads import MULTIPART_OVERHEAD, UploadLimitMiddleware, upload_buffer
 
 load_dotenv()
-llm = ChatGoogleGenerativeAI(
+llm = single_attempt(ChatGoogleGenerativeAI(
     model="gemini-1.5-flash",
-    api_key=os.getenv("GEMINI_API_KEY")
-)
+    api_key=os.getenv("GEMINI_API_KEY"),
+    # share the process-wide Gemini quota; retries go through it too (see retry_throttled)
+    callbacks=[gemini_rate_limit],
+))
+
+MAX_IMAGE_BYTES = 5_000_000
 
 app = FastAPI()
+# refuse oversized uploads while they arrive instead of after they are buffered
+# (added before CORS so its 413 responses still carry CORS headers)
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_IMAGE_BYTES + MULTIPART_OVERHEAD)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,37 +34,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Uploads are downscaled to this longest side before they are sent to the model
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+# Analyses keyed on a digest of the prepared image, so re-uploads of the same photo skip the model
+analysis_cache = TTLCache(
+    max_size=int(os.getenv("IMAGE_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("IMAGE_CACHE_TTL", "86400")),
+)
+
 def encode_image(image_content: bytes) -> str:
     return base64.b64encode(image_content).decode()
 
-@app.post("/analyze-image")
-async def analyze_image(file: UploadFile = File(...)) -> Dict[str, str]:
+async def prepare_upload(file: UploadFile) -> PreparedImage:
+    try:
+        # decode straight from the spooled upload; decoding and resizing are CPU-bound, so keep them off the event loop
+        with upload_buffer(file) as buffer:
+            return await run_sync(prepare_image, buffer, IMAGE_MAX_SIDE, IMAGE_JPEG_QUALITY)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+
+def build_analysis_chain(image: PreparedImage):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a nutrition expert capable of analyzing food images and providing detailed nutritional advice."),
+        ("human", [
+            """Analyze the image and provide a detailed nutritional analysis of the food in the image.""",
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{image.mime_type};base64,{encode_image(image.data)}",
+                    "detail": "high",
+                },
+            },
+        ]),
+    ])
+    return prompt | retry_throttled(llm)
+
+def validate_upload(file: UploadFile) -> None:
     if file.content_type not in ["image/jpeg", "image/png"]:
         raise HTTPException(400, detail="Invalid file type. Only JPEG and PNG are allowed.")
     
-    if file.size > 5_000_000:
+    if file.size > MAX_IMAGE_BYTES:
         raise HTTPException(400, detail="File too large. Maximum size is 5MB.")
+
+@app.post("/analyze-image")
+async def analyze_image(file: UploadFile = File(...)) -> Dict[str, str]:
+    validate_upload(file)
+    image = await prepare_upload(file)
+    
+    key = image.cache_key
+    cached = analysis_cache.get(key) if key is not None else None
+    if cached is not None:
+        return {"analysis": cached}
     
     try:
-        contents = await file.read()
-        image = encode_image(contents)
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a nutrition expert capable of analyzing food images and providing detailed nutritional advice."),
-            ("human", [
-                """Analyze the image and provide a detailed nutritional analysis of the food in the image.""",
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{image}",
-                        "detail": "high",
-                    },
-                },
-            ]),
-        ])
-        
-        chain = prompt | llm
-        res = await chain.ainvoke({"image": image})
+        chain = build_analysis_chain(image)
+        res = await chain.ainvoke({})
+        if key is not None:
+            analysis_cache.set(key, res.content)
         return {"analysis": res.content}
     except Exception as e:
-        raise HTTPException(500, detail=f"An error occurred while processing the image, {e}")
\ No newline at end of file
+        raise HTTPException(500, detail=f"An error occurred while processing the image, {e}")
+
+async def stream_analysis(image: PreparedImage):
+    # a cached analysis is sent as a single chunk
+    key = image.cache_key
+    cached = analysis_cache.get(key) if key is not None else None
+    if cached is not None:
+        yield cached
+        return
+    
+    parts = []
+    async for text in message_text(build_analysis_chain(image).astream({})):
+        parts.append(text)
+        yield text
+    # only complete analyses are cached; a disconnect closes this generator before here
+    if key is not None:
+        analysis_cache.set(key, "".join(parts))
+
+@app.post("/analyze-image/stream")
+async def analyze_image_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Stream the analysis as Server-Sent Events, one `data: {"token": ...}` event per chunk.
+    """
+    validate_upload(file)
+    image = await prepare_upload(file)
+    return sse_response(request, stream_analysis(image))
+
+# Expose cache hit/miss counters
+@app.get("/cache/stats")
+async def cache_stats():
+    return analysis_cache.stats()
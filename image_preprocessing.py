@@ -0,0 +1,123 @@
+import hashlib
+import io
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
+
+from PIL import Image, ImageOps
+
+# MIME type sent to the model for each format we may emit
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+
+ORIENTATION_TAG = 0x0112
+
+
+@dataclass
+class PreparedImage:
+    """An upload after preprocessing, ready to send to the model."""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_size: int
+    # 64-bit difference hash as 16 hex digits; near-identical photos share it, but so
+    # do different images with the same layout, so it is not enough to identify one
+    phash: str
+
+    @property
+    def digest(self) -> str:
+        """sha256 of the bytes sent to the model."""
+        return hashlib.sha256(self.data).hexdigest()
+
+    @property
+    def cache_key(self) -> Optional[str]:
+        """
+        Key for caching the model's answer, or None when the image should not be cached.
+
+        Identical uploads prepare to identical bytes, so the digest of what the model
+        actually sees is the key. Images whose difference hash is all zeros or all
+        ones (flat colour, noise) carry no usable structure and are never cached.
+        """
+        if self.phash.strip("0") == "" or self.phash.strip("f") == "":
+            return None
+        return self.digest
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> str:
+    """
+    Difference hash: compares neighbouring pixels of a tiny greyscale thumbnail.
+
+    It survives re-encoding, resizing and small brightness changes, so the same
+    photo uploaded twice (or re-saved by a phone) hashes the same.
+
+    Args:
+        image (Image.Image): Decoded image
+        hash_size (int): Hash is hash_size * hash_size bits
+
+    Returns:
+        str: The hash as a hex string
+    """
+    pixels = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR).tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def prepare_image(source: Union[bytes, BinaryIO], max_side: int = 1024, quality: int = 85) -> PreparedImage:
+    """
+    Decode an upload once, downscale it, hash it and encode it for the model.
+
+    Images larger than `max_side` on their longest side are shrunk (JPEGs are
+    decoded at reduced size with `draft`, which skips most of the decode work),
+    turned upright if their EXIF says so, and re-encoded: JPEG for opaque
+    images, PNG when there is transparency. JPEGs and PNGs that already fit
+    keep their original bytes, so nothing is lost to a second encode.
+
+    Args:
+        source (bytes or file): The uploaded file, as bytes or a seekable binary file (e.g. from `upload_buffer`)
+        max_side (int): Longest side, in pixels, of the image sent to the model
+        quality (int): JPEG quality when re-encoding
+
+    Returns:
+        PreparedImage: Encoded bytes, their MIME type, size and perceptual hash
+
+    Raises:
+        ValueError: If the bytes are not a readable image
+    """
+    file = io.BytesIO(source) if isinstance(source, bytes) else source
+    file.seek(0, io.SEEK_END)
+    file_size = file.tell()
+    file.seek(0)
+    try:
+        image = Image.open(file)
+        source_format = image.format
+        original_size = image.size
+        # phone photos store their rotation in EXIF; it is applied below so the model sees the dish upright
+        rotated = image.getexif().get(ORIENTATION_TAG, 1) != 1
+        image.draft(image.mode, (max_side, max_side))
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Could not read the image: {e}") from e
+
+    if max(original_size) <= max_side and not rotated and source_format in ("JPEG", "PNG"):
+        # already small enough and in a format the model takes: send it untouched
+        phash = dhash(image)
+        file.seek(0)
+        return PreparedImage(file.read(), MIME_TYPES[source_format], *original_size, file_size, phash)
+
+    if rotated:
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    phash = dhash(image)
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    buffer = io.BytesIO()
+    if has_alpha:
+        image.save(buffer, "PNG", optimize=True)
+        output_format = "PNG"
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=quality, optimize=True)
+        output_format = "JPEG"
+    return PreparedImage(buffer.getvalue(), MIME_TYPES[output_format], *image.size, file_size, phash)
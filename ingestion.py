@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from bson import ObjectId
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from pymongo import InsertOne, ReplaceOne
+
+from async_utils import run_sync
+
+
+@dataclass
+class IngestionStats:
+    documents: int = 0
+    batches: int = 0
+    skipped_batches: int = 0
+    embedding_calls: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def embedding_calls_per_second(self) -> float:
+        return self.embedding_calls / self.elapsed if self.elapsed else 0.0
+
+    def report(self) -> str:
+        return (
+            f"{self.documents} documents in {self.batches} batches "
+            f"({self.skipped_batches} resumed from checkpoint) in {self.elapsed:.2f}s: "
+            f"{self.docs_per_second:.1f} docs/sec, "
+            f"{self.embedding_calls_per_second:.1f} embedding calls/sec"
+        )
+
+
+class _RateLimiter:
+    """Spaces out call start times so no more than `per_minute` calls begin in any minute."""
+
+    def __init__(self, per_minute: Optional[float]):
+        self._interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self._interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def content_hash(doc: Document) -> str:
+    """SHA-256 of a chunk's text and metadata; equal chunks hash equally."""
+    digest = hashlib.sha256(doc.page_content.encode("utf-8"))
+    digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def deduplicate(docs: Sequence[Document]) -> List[Document]:
+    """Drop repeated chunks, keeping the first occurrence of each content hash."""
+    seen: Set[str] = set()
+    unique = []
+    for doc in docs:
+        doc_hash = content_hash(doc)
+        if doc_hash not in seen:
+            seen.add(doc_hash)
+            unique.append(doc)
+    return unique
+
+
+@dataclass
+class ReindexReport:
+    to_embed: int = 0
+    to_delete: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    embedding_calls: int = 0
+    dry_run: bool = False
+    ingestion: Optional[IngestionStats] = None
+
+    def report(self) -> str:
+        verb = "would" if self.dry_run else "did"
+        lines = [
+            f"{self.unchanged} chunks unchanged, {self.duplicates} duplicates skipped; "
+            f"{verb} embed {self.to_embed} chunks in {self.embedding_calls} embedding calls "
+            f"and delete {self.to_delete} stale chunks"
+        ]
+        if self.ingestion is not None:
+            lines.append(self.ingestion.report())
+        return "\n".join(lines)
+
+
+def documents_fingerprint(docs: Sequence[Document]) -> str:
+    """Hash of every document's content and metadata, used to match a checkpoint to its input."""
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IngestionPipeline:
+    """
+    Embed documents in batches and bulk-write them to a MongoDB collection.
+
+    Batches are embedded concurrently under a rate limit and written with
+    one bulk write each. Document ids are derived from the input, and any run
+    that did not start by clearing the collection writes with upserts, so a
+    batch that was half-written before a crash is replaced on the next run. Finished batches are recorded in a JSON
+    checkpoint; rerunning with the same documents skips them.
+
+    Documents are stored in the layout MongoDBAtlasVectorSearch reads:
+    the text, the embedding and the metadata fields at the top level, plus a
+    content hash. The id is derived from that hash, so identical chunks are
+    stored once and `reindex` can tell which chunks are already indexed.
+
+    Args:
+        collection: pymongo (or mongomock) collection to write to
+        embeddings (Embeddings): Embedding model used for each batch
+        batch_size (int): Documents per embedding call and per bulk write
+        max_concurrency (int): Maximum batches being embedded at once
+        requests_per_minute (float, optional): Cap on embedding calls started per minute
+        checkpoint_path (str, optional): Where to record finished batches; no resume if None
+        text_key (str): Field holding the document text
+        embedding_key (str): Field holding the embedding vector
+        hash_key (str): Field holding the chunk's content hash
+    """
+
+    def __init__(
+        self,
+        collection,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        checkpoint_path: Optional[str] = None,
+        text_key: str = "text",
+        embedding_key: str = "embedding",
+        hash_key: str = "content_hash",
+    ):
+        self.collection = collection
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.checkpoint_path = checkpoint_path
+        self.text_key = text_key
+        self.embedding_key = embedding_key
+        self.hash_key = hash_key
+
+    def _load_checkpoint(self, fingerprint: str) -> Set[int]:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path, "r") as file:
+            checkpoint = json.load(file)
+        if checkpoint.get("fingerprint") != fingerprint or checkpoint.get("batch_size") != self.batch_size:
+            return set()
+        return set(checkpoint.get("completed", []))
+
+    def _save_checkpoint(self, fingerprint: str, completed: Set[int]) -> None:
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"fingerprint": fingerprint, "batch_size": self.batch_size, "completed": sorted(completed)}, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _build_record(self, doc: Document, vector: List[float]) -> Dict[str, Any]:
+        # ids derived from content make a re-run of a half-written batch overwrite rather than duplicate
+        doc_hash = content_hash(doc)
+        return {
+            "_id": ObjectId(doc_hash[:24]),
+            self.text_key: doc.page_content,
+            self.embedding_key: vector,
+            self.hash_key: doc_hash,
+            **doc.metadata,
+        }
+
+    async def aingest(self, docs: Sequence[Document], clear_collection: bool = False) -> IngestionStats:
+        """
+        Embed and write `docs`, resuming from the checkpoint when it matches.
+
+        Args:
+            docs (list): Documents to ingest
+            clear_collection (bool): Delete existing documents first, but only when
+                starting fresh; a resumed run keeps what the previous run wrote
+
+        Returns:
+            IngestionStats: Counts and throughput for this run
+        """
+        docs = deduplicate(docs)
+        fingerprint = documents_fingerprint(docs)
+        completed = self._load_checkpoint(fingerprint)
+        batches = [docs[start:start + self.batch_size] for start in range(0, len(docs), self.batch_size)]
+
+        stats = IngestionStats(batches=len(batches), skipped_batches=len(completed))
+        started = time.perf_counter()
+
+        # after clearing, plain inserts are safe; otherwise upsert so partial batches are replaced
+        fresh_start = clear_collection and not completed
+        if fresh_start:
+            await run_sync(self.collection.delete_many, {})
+
+        limiter = _RateLimiter(self.requests_per_minute)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        checkpoint_lock = asyncio.Lock()
+
+        async def process(index: int, batch: List[Document]) -> None:
+            async with semaphore:
+                await limiter.wait()
+                vectors = await self.embeddings.aembed_documents([doc.page_content for doc in batch])
+                stats.embedding_calls += 1
+                records = [self._build_record(doc, vector) for doc, vector in zip(batch, vectors)]
+                if fresh_start:
+                    operations = [InsertOne(record) for record in records]
+                else:
+                    operations = [ReplaceOne({"_id": record["_id"]}, record, upsert=True) for record in records]
+                await run_sync(self.collection.bulk_write, operations, ordered=False)
+                stats.documents += len(batch)
+            async with checkpoint_lock:
+                completed.add(index)
+                self._save_checkpoint(fingerprint, completed)
+
+        await asyncio.gather(*[process(i, batch) for i, batch in enumerate(batches) if i not in completed])
+
+        # a finished run leaves no checkpoint, so the next run starts fresh
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        stats.elapsed = time.perf_counter() - started
+        return stats
+
+    def ingest(self, docs: Sequence[Document], clear_collection: bool = False) -> IngestionStats:
+        """Synchronous wrapper around `aingest` for scripts."""
+        return asyncio.run(self.aingest(docs, clear_collection=clear_collection))
+
+    async def areindex(self, docs: Sequence[Document], dry_run: bool = False) -> ReindexReport:
+        """
+        Bring the collection in line with `docs`, embedding only what changed.
+
+        Chunks whose content hash is already stored are left alone, new or edited
+        chunks are embedded and written, and stored chunks that no longer appear in
+        `docs` are deleted once the new ones are in place.
+
+        Args:
+            docs (list): The full, current set of chunks
+            dry_run (bool): Only report what a re-index would do, without embedding or writing
+
+        Returns:
+            ReindexReport: Counts of unchanged, new and stale chunks, and the embedding calls needed
+        """
+        unique = deduplicate(docs)
+        records = await run_sync(lambda: list(self.collection.find({}, {self.hash_key: 1})))
+        stored = {record.get(self.hash_key) for record in records}
+        wanted = {content_hash(doc) for doc in unique}
+
+        to_embed = [doc for doc in unique if content_hash(doc) not in stored]
+        # records written before hashes were stored have no hash and are always stale
+        stale_ids = [record["_id"] for record in records if record.get(self.hash_key) not in wanted]
+
+        report = ReindexReport(
+            to_embed=len(to_embed),
+            to_delete=len(stale_ids),
+            unchanged=len(unique) - len(to_embed),
+            duplicates=len(docs) - len(unique),
+            embedding_calls=-(-len(to_embed) // self.batch_size),
+            dry_run=dry_run,
+        )
+        if dry_run:
+            return report
+
+        if to_embed:
+            report.ingestion = await self.aingest(to_embed)
+        if stale_ids:
+            await run_sync(self.collection.delete_many, {"_id": {"$in": stale_ids}})
+        return report
+
+    def reindex(self, docs: Sequence[Document], dry_run: bool = False) -> ReindexReport:
+        """Synchronous wrapper around `areindex` for scripts."""
+        return asyncio.run(self.areindex(docs, dry_run=dry_run))
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from async_utils import run_sync
+
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+
+
+class QueueFull(Exception):
+    """Raised by `JobQueue.submit` when `max_queued` jobs are already waiting."""
+
+
+@dataclass
+class Job:
+    """One unit of work. Times are wall-clock (time.time) so they survive restarts."""
+    id: str
+    payload: Any
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def report(self) -> Dict[str, Any]:
+        report = {"task_id": self.id, "status": self.status, "result": self.result, "error": self.error}
+        if self.started_at is not None:
+            report["queued_seconds"] = self.started_at - self.created_at
+        if self.finished_at is not None and self.started_at is not None:
+            report["run_seconds"] = self.finished_at - self.started_at
+        return report
+
+
+class JobStore:
+    """
+    SQLite persistence for jobs, so queued work survives a restart.
+
+    Calls are blocking; JobQueue makes them through `run_sync`. One connection
+    is shared behind a lock, with WAL so polling reads don't wait on writes.
+
+    Args:
+        path (str): Database file, created if missing
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, payload TEXT, status TEXT, result TEXT, error TEXT, "
+                "created_at REAL, started_at REAL, finished_at REAL)"
+            )
+
+    def save(self, job: Job) -> None:
+        row = (
+            job.id, json.dumps(job.payload), job.status, json.dumps(job.result), job.error,
+            job.created_at, job.started_at, job.finished_at,
+        )
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def delete(self, job_ids: List[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def load(self) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at").fetchall()
+        return [
+            Job(id, json.loads(payload), status, json.loads(result), error, created_at, started_at, finished_at)
+            for id, payload, status, result, error, created_at, started_at, finished_at in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class JobMetrics:
+    """Counters plus recent queue-wait and run times (the last `window` jobs)."""
+    submitted: int = 0
+    rejected: int = 0
+    completed: int = 0
+    failed: int = 0
+    window: int = 1000
+
+    def __post_init__(self):
+        self.started_monotonic = time.monotonic()
+        self.queue_waits: Deque[float] = deque(maxlen=self.window)
+        self.run_times: Deque[float] = deque(maxlen=self.window)
+        # monotonic finish times, for throughput over the last minute
+        self.finishes: Deque[float] = deque(maxlen=self.window)
+
+    @staticmethod
+    def _percentile(samples: Deque[float], pct: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def report(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        finished = self.completed + self.failed
+        last_minute = sum(1 for finished_at in self.finishes if now - finished_at <= 60)
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "jobs_per_second": finished / max(now - self.started_monotonic, 1e-9),
+            "jobs_per_second_last_minute": last_minute / 60,
+            "queue_wait_p50_seconds": self._percentile(self.queue_waits, 50),
+            "queue_wait_p95_seconds": self._percentile(self.queue_waits, 95),
+            "run_p50_seconds": self._percentile(self.run_times, 50),
+            "run_p95_seconds": self._percentile(self.run_times, 95),
+        }
+
+
+class JobQueue:
+    """
+    Bounded background job runner for slow requests (e.g. agent questions).
+
+    `submit` admits a job only while fewer than `max_queued` are waiting and
+    returns at once; `workers` tasks run the handler, so at most that many jobs
+    are in progress. Finished jobs can be polled with `get` until `result_ttl`
+    seconds after they finish, then they are dropped.
+
+    With `db_path` every state change is written to SQLite and `start` reloads
+    the table: queued jobs, and jobs that were running when the process
+    stopped, are queued again; finished ones can still be polled.
+
+    Args:
+        handler (callable): Async function called with a job's payload; its return value is the result
+        workers (int): Jobs run at once
+        max_queued (int): Jobs allowed to wait; further submissions raise QueueFull
+        result_ttl (float): Seconds a finished job is kept for polling
+        db_path (str, optional): SQLite file for persistence; in-memory only when omitted
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int = 4,
+        max_queued: int = 100,
+        result_ttl: float = 3600,
+        db_path: Optional[str] = None,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.db_path = db_path
+        self.metrics = JobMetrics()
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._store: Optional[JobStore] = None
+        # submissions admitted but not yet on the queue (still being written to the store)
+        self._reserved = 0
+
+    async def start(self) -> None:
+        """Open the store, requeue persisted work and start the workers. Call from a startup hook."""
+        self._queue = asyncio.Queue()
+        if self.db_path:
+            self._store = await run_sync(JobStore, self.db_path)
+            for job in await run_sync(self._store.load):
+                if job.status in (QUEUED, RUNNING):
+                    # a job that was running when the process stopped starts over
+                    job.status, job.started_at = QUEUED, None
+                    self._queue.put_nowait(job.id)
+                self._jobs[job.id] = job
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._expire_loop()))
+
+    async def stop(self) -> None:
+        """Stop the workers; with persistence, unfinished jobs resume on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == RUNNING)
+
+    async def _save(self, job: Job) -> None:
+        if self._store is not None:
+            await run_sync(self._store.save, job)
+
+    async def submit(self, payload: Any) -> Job:
+        """
+        Queue a job.
+
+        Args:
+            payload: Passed to the handler; must be JSON-serialisable when persisting
+
+        Returns:
+            Job: The queued job; poll it with `get(job.id)`
+
+        Raises:
+            QueueFull: If `max_queued` jobs are already waiting
+        """
+        # check and reserve before the first await, so concurrent submissions can't all pass
+        if self.queued + self._reserved >= self.max_queued:
+            self.metrics.rejected += 1
+            raise QueueFull(f"{self.queued + self._reserved} jobs already queued")
+        self._reserved += 1
+        try:
+            job = Job(id=uuid.uuid4().hex, payload=payload, created_at=time.time())
+            await self._save(job)
+            self._jobs[job.id] = job
+            self._queue.put_nowait(job.id)
+        finally:
+            self._reserved -= 1
+        self.metrics.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and self._expired(job, time.time()):
+            return None
+        return job
+
+    def _expired(self, job: Job, now: float) -> bool:
+        return job.finished_at is not None and now - job.finished_at > self.result_ttl
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._jobs.get(await self._queue.get())
+            if job is None or job.status != QUEUED:
+                continue
+            job.status, job.started_at = RUNNING, time.time()
+            self.metrics.queue_waits.append(job.started_at - job.created_at)
+            try:
+                await self._save(job)
+                job.result = await self.handler(job.payload)
+                job.status = COMPLETED
+            except asyncio.CancelledError:
+                # shutting down: leave the job as running so a restart picks it up again
+                raise
+            except Exception as e:
+                job.result, job.error, job.status = None, str(e), FAILED
+            job.finished_at = time.time()
+            await self._save_finished(job)
+            if job.status == COMPLETED:
+                self.metrics.completed += 1
+            else:
+                self.metrics.failed += 1
+            self.metrics.run_times.append(job.finished_at - job.started_at)
+            self.metrics.finishes.append(time.monotonic())
+
+    async def _save_finished(self, job: Job) -> None:
+        # a store error must not kill the worker or leave the job running forever
+        try:
+            await self._save(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # e.g. a result that is not JSON-serialisable, or the database is locked
+            job.result, job.error, job.status = None, f"Could not store the result: {e}", FAILED
+            try:
+                await self._save(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # still failed in memory, so pollers see it; a restart reruns the job
+                pass
+
+    async def _expire_loop(self, interval: float = 60) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            expired = [job_id for job_id, job in self._jobs.items() if self._expired(job, now)]
+            for job_id in expired:
+                del self._jobs[job_id]
+            if expired and self._store is not None:
+                await run_sync(self._store.delete, expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics.report(),
+            "queued": self.queued,
+            "running": self.running,
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "kept_jobs": len(self._jobs),
+        }
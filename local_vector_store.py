@@ -0,0 +1,378 @@
+import json
+import os
+import uuid
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+
+def _normalize(vectors: Any) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class FlatIndex:
+    """
+    Exact cosine index over a contiguous, unit-normalised float32 matrix.
+
+    Rows are appended into a buffer that doubles in size, so adding documents
+    one batch at a time does not copy the whole matrix on every call.
+    """
+
+    kind = "flat"
+
+    def __init__(self, vectors: Optional[np.ndarray] = None):
+        self._buffer = vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
+        self._size = 0 if vectors is None else vectors.shape[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    def add(self, vectors: np.ndarray) -> None:
+        count, dim = vectors.shape
+        # a memory-mapped matrix loaded from disk is read-only, so the first add copies it
+        if self._size + count > self._buffer.shape[0] or isinstance(self._buffer, np.memmap):
+            capacity = max(self._size + count, 2 * self._buffer.shape[0], 64)
+            buffer = np.empty((capacity, dim), dtype=np.float32)
+            if self._size:
+                buffer[:self._size] = self.vectors
+            self._buffer = buffer
+        self._buffer[self._size:self._size + count] = vectors
+        self._size += count
+
+    def remove(self, positions: Sequence[int]) -> None:
+        keep = np.ones(self._size, dtype=bool)
+        keep[list(positions)] = False
+        self._buffer = np.ascontiguousarray(self.vectors[keep])
+        self._size = self._buffer.shape[0]
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k cosine search for a batch of unit-normalised queries.
+
+        Returns:
+            tuple: (scores, positions), both shaped (len(queries), min(k, len(self))),
+                each row sorted by descending similarity
+        """
+        k = min(k, self._size)
+        if k == 0:
+            empty = np.empty((queries.shape[0], 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+        scores = queries @ self.vectors.T
+        if k < self._size:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(self._size), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+    def save(self, path: str) -> None:
+        # `self.vectors` may be memory-mapped from this very file: write a new file and
+        # swap it in, so the mapping keeps reading the old one
+        tmp_path = os.path.join(path, "vectors.npy.tmp")
+        with open(tmp_path, "wb") as file:
+            np.save(file, self.vectors)
+        os.replace(tmp_path, os.path.join(path, "vectors.npy"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FlatIndex":
+        return cls(np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None))
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store, an offline stand-in for MongoDBAtlasVectorSearch.
+
+    It exposes the usual LangChain surface (`add_documents`, `similarity_search`,
+    `as_retriever`, MMR), keeps the vectors in memory (or memory-mapped from
+    disk) and needs no network beyond the embedding calls. Scores follow Atlas's
+    cosine scoring, (1 + cosine) / 2, so `score_threshold` values carry over.
+
+    Args:
+        embedding (Embeddings): Model used to embed documents and queries
+        index (optional): Search index; defaults to the one selected by `default_index`
+    """
+
+    def __init__(self, embedding: Embeddings, index: Optional[Any] = None):
+        self._embedding = embedding
+        self.index = index if index is not None else default_index()
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def _append(self, texts: List[str], vectors: List[List[float]], metadatas, ids) -> List[str]:
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if texts:
+            self.index.add(_normalize(vectors))
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        return self._append(texts, self._embedding.embed_documents(texts) if texts else [], metadatas, ids)
+
+    async def aadd_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        vectors = await self._embedding.aembed_documents(texts) if texts else []
+        return self._append(texts, vectors, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        doomed = set(ids)
+        positions = [i for i, doc_id in enumerate(self._ids) if doc_id in doomed]
+        if positions:
+            self.index.remove(positions)
+            removed = set(positions)
+            keep = [i for i in range(len(self._ids)) if i not in removed]
+            self._ids = [self._ids[i] for i in keep]
+            self._texts = [self._texts[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+        return bool(positions)
+
+    def _document(self, position: int) -> Document:
+        return Document(id=self._ids[position], page_content=self._texts[position], metadata=dict(self._metadatas[position]))
+
+    def search_by_vectors(self, vectors: List[List[float]], k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """
+        Batched top-k search, one result list per query vector.
+
+        Args:
+            vectors (list): Query embeddings
+            k (int): Results per query
+
+        Returns:
+            list: For each query, (document, score) pairs sorted by descending score
+        """
+        scores, positions = self.index.search(_normalize(vectors), k)
+        return [
+            # approximate indexes pad short rows with position -1
+            [(self._document(int(p)), (1.0 + float(s)) / 2.0) for s, p in zip(row_scores, row_positions) if p >= 0]
+            for row_scores, row_positions in zip(scores, positions)
+        ]
+
+    def _filter(self, results: List[Tuple[Document, float]], kwargs: dict) -> List[Tuple[Document, float]]:
+        threshold = kwargs.get("score_threshold")
+        if threshold is not None:
+            results = [(doc, score) for doc, score in results if score >= threshold]
+        return results
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self._filter(self.search_by_vectors([embedding], k)[0], kwargs)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, **kwargs)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = await self._embedding.aembed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def _similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score(query, k, **kwargs)
+
+    async def _asimilarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return await self.asimilarity_search_with_score(query, k, **kwargs)
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        query = _normalize(embedding)
+        _, positions = self.index.search(query, fetch_k)
+        candidates = [int(p) for p in positions[0] if p >= 0]
+        if not candidates:
+            return []
+        chosen = maximal_marginal_relevance(
+            query[0], self.index.vectors[candidates], lambda_mult=lambda_mult, k=k
+        )
+        return [self._document(candidates[i]) for i in chosen]
+
+    def max_marginal_relevance_search(
+        self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any
+    ) -> List[Document]:
+        embedding = self._embedding.embed_query(query)
+        return self.max_marginal_relevance_search_by_vector(embedding, k, fetch_k, lambda_mult, **kwargs)
+
+    async def amax_marginal_relevance_search(
+        self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any
+    ) -> List[Document]:
+        embedding = await self._embedding.aembed_query(query)
+        return self.max_marginal_relevance_search_by_vector(embedding, k, fetch_k, lambda_mult, **kwargs)
+
+    def save(self, path: str) -> None:
+        """Write the vectors (vectors.npy) and documents (docs.json) to a directory."""
+        os.makedirs(path, exist_ok=True)
+        self.index.save(path)
+        tmp_path = os.path.join(path, "docs.json.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(
+                {"index": self.index.kind, "ids": self._ids, "texts": self._texts, "metadatas": self._metadatas},
+                file,
+                default=str,
+            )
+        os.replace(tmp_path, os.path.join(path, "docs.json"))
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings, mmap: bool = True) -> "LocalVectorStore":
+        """
+        Load a store written by `save`.
+
+        Args:
+            path (str): Directory passed to `save`
+            embedding (Embeddings): Model used for queries and new documents
+            mmap (bool): Memory-map the vectors instead of reading them into memory
+        """
+        with open(os.path.join(path, "docs.json"), "r") as file:
+            saved = json.load(file)
+        store = cls(embedding, index=_index_type(saved.get("index", "flat")).load(path, mmap=mmap))
+        # recall/speed can be retuned at load time without rebuilding the index
+        if hasattr(store.index, "nprobe") and os.getenv("IVF_NPROBE"):
+            store.index.nprobe = int(os.getenv("IVF_NPROBE"))
+        store._ids = saved["ids"]
+        store._texts = saved["texts"]
+        store._metadatas = saved["metadatas"]
+        return store
+
+    @classmethod
+    def load_or_create(cls, path: str, embedding: Embeddings) -> "LocalVectorStore":
+        """Load the store at `path` if one was saved there, otherwise return an empty store."""
+        if os.path.exists(os.path.join(path, "docs.json")):
+            return cls.load(path, embedding)
+        return cls(embedding)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding, index=kwargs.get("index"))
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+def _index_type(kind: str):
+    """Index class for a saved `kind`; the approximate index is imported only when used."""
+    if kind == "ivf":
+        from ann_index import IVFIndex
+
+        return IVFIndex
+    return FlatIndex
+
+
+def default_index():
+    """
+    Index for new stores, chosen by LOCAL_VECTOR_INDEX.
+
+    "flat" (the default) is an exact scan. "ivf" is the approximate IVF index,
+    tuned with IVF_NLIST (clusters) and IVF_NPROBE (clusters scanned per query).
+    """
+    if os.getenv("LOCAL_VECTOR_INDEX", "flat").lower() == "ivf":
+        from ann_index import IVFIndex
+
+        nlist = os.getenv("IVF_NLIST")
+        return IVFIndex(nlist=int(nlist) if nlist else None, nprobe=int(os.getenv("IVF_NPROBE", "8")))
+    return FlatIndex()
+
+
+def local_store_path(collection_name: str) -> str:
+    """Directory of the local store standing in for a MongoDB collection."""
+    return os.path.join(os.getenv("LOCAL_VECTOR_STORE_DIR", "vector_stores"), collection_name)
+
+
+def use_local_store() -> bool:
+    """True when VECTOR_STORE_BACKEND=local selects the offline store over Atlas."""
+    return os.getenv("VECTOR_STORE_BACKEND", "atlas").lower() == "local"
+
+
+# Build a local store from a text or PDF file, e.g. so vectorStore_v5 can run offline:
+#   python local_vector_store.py diabetes.pdf test_collection_pdf
+if __name__ == "__main__":
+    import sys
+
+    from dotenv import load_dotenv
+    from langchain.text_splitter import CharacterTextSplitter
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+    from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+
+    from embedding_cache import maybe_cached
+
+    if len(sys.argv) < 3:
+        print("Usage: python local_vector_store.py source_file collection_name")
+        sys.exit(1)
+
+    load_dotenv()
+    source, collection_name = sys.argv[1], sys.argv[2]
+    embeddings = maybe_cached(
+        GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=os.getenv("GEMINI_API_KEY")),
+        "models/embedding-001",
+    )
+    loader = PyPDFLoader(source) if source.lower().endswith(".pdf") else TextLoader(source)
+    docs = loader.load_and_split(text_splitter=CharacterTextSplitter(separator="\n", chunk_size=1000, chunk_overlap=0))
+
+    store = LocalVectorStore.from_documents(docs, embeddings)
+    store.save(local_store_path(collection_name))
+    print(f"Saved {len(store)} documents to {local_store_path(collection_name)}")
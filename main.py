@@ -1,10 +1,12 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
-from dotenv import load_dotenv
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from fastapi.middleware.cors import CORSMiddleware
+from chain_registry import ChainRegistry
+from rate_limiter import retry_throttled
+from async_utils import install_default_executor
+from single_flight import SingleFlight, request_key
+from streaming import message_text, sse_response
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -29,34 +31,53 @@ class TranslationRequest(BaseModel):
 class TranslationResponse(BaseModel):
     translated_text: str
 
-def call_gemini(input_language: str, output_language: str, text_input: str) -> str:
+TRANSLATION_MODEL = "gemini-1.5-flash"
+TRANSLATION_TEMPERATURE = 0.8
+
+# create prompt once; the chain built on it is shared by every request
+translation_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "You are a helpful assistant that translates {input_language} to {output_language}. Translate the use sentence.",
+    ),
+    (
+        "human",
+        "{text_input}",
+    ),
+])
+
+def build_translation_chain(llm):
+    return translation_prompt | retry_throttled(llm)
+
+# Shared LLM clients and compiled chains, keyed by model and temperature
+registry = ChainRegistry()
+registry.register("translate", build_translation_chain, TRANSLATION_MODEL, TRANSLATION_TEMPERATURE)
+
+# identical translations requested at the same time share one Gemini call
+translate_flight = SingleFlight()
+
+@app.on_event("startup")
+async def startup_event():
+    install_default_executor()
+    await registry.warm_up()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await registry.aclose()
+
+async def call_gemini(input_language: str, output_language: str, text_input: str) -> str:
     try:
-        # load llm
-        load_dotenv()
-        GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=GEMINI_API_KEY, temperature=0.8)
-
-        # create prompt
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                "You are a helpful assistant that translates {input_language} to {output_language}. Translate the use sentence.",
-            ),
-            (
-                "human",
-                "{text_input}",
-            ),
-        ])
-
-        # create chain
-        chain = prompt | llm
-
-        # invoke chain
-        ai_msg = chain.invoke({
+        # reuse the chain compiled at startup
+        chain = registry.get("translate")
+        inputs = {
             'input_language': input_language,
             'output_language': output_language,
             'text_input': text_input,
-        })
+        }
+
+        # invoke chain without blocking the event loop, joining an identical call already in flight
+        key = request_key("translate", TRANSLATION_MODEL, TRANSLATION_TEMPERATURE, inputs)
+        ai_msg = await translate_flight.do(key, lambda: chain.ainvoke(inputs))
 
         # return llm output
         return ai_msg.content
@@ -67,7 +88,7 @@ def call_gemini(input_language: str, output_language: str, text_input: str) -> s
 @app.post("/translate/", response_model=TranslationResponse)
 async def translate_text(request: TranslationRequest):
     try:
-        translated_text = call_gemini(
+        translated_text = await call_gemini(
             request.input_language,
             request.output_language,
             request.text_input
@@ -76,6 +97,22 @@ async def translate_text(request: TranslationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/translate/stream")
+async def translate_text_stream(request: Request, translation: TranslationRequest):
+    """
+    Stream the translation as Server-Sent Events, one `data: {"token": ...}` event per chunk.
+    """
+    chunks = registry.get("translate").astream({
+        'input_language': translation.input_language,
+        'output_language': translation.output_language,
+        'text_input': translation.text_input,
+    })
+    return sse_response(request, message_text(chunks))
+
+@app.get("/single-flight/stats")
+async def single_flight_stats():
+    return translate_flight.stats()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Translation API"}
\ No newline at end of file
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+from pypdf import PdfReader
+
+from async_utils import run_sync
+from response_cache import TTLCache
+
+PdfSource = Union[str, bytes, BinaryIO]
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    # Runs in the worker processes: each opens the file itself, so only the path is pickled
+    reader = PdfReader(path)
+    return [reader.pages[number].extract_text() or "" for number in range(start, stop)]
+
+
+def _extract_document(data: bytes, max_pages: Optional[int]) -> List[str]:
+    # Runs in the worker processes: a whole (small) document per task
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        page_count = len(reader.pages) if max_pages is None else min(len(reader.pages), max_pages)
+        return [reader.pages[number].extract_text() or "" for number in range(page_count)]
+    except Exception as e:
+        # re-raised as ValueError so the message survives pickling back to the parent
+        raise ValueError(f"Error reading PDF: {e}") from None
+
+
+def file_hash(source: PdfSource) -> str:
+    """SHA-256 of a PDF given as a path, bytes or a seekable binary file."""
+    digest = hashlib.sha256()
+    if isinstance(source, bytes):
+        digest.update(source)
+        return digest.hexdigest()
+    file = open(source, "rb") if isinstance(source, str) else source
+    try:
+        file.seek(0)
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    finally:
+        if isinstance(source, str):
+            file.close()
+        else:
+            file.seek(0)
+    return digest.hexdigest()
+
+
+class PdfExtractor:
+    """
+    Text extraction from PDFs, shared by the services that read uploads.
+
+    Documents with at least `parallel_threshold` pages are split into runs of
+    `pages_per_task` pages and extracted in a process pool (pypdf is pure Python,
+    so threads would not run in parallel); smaller ones are extracted in the
+    calling thread, where starting workers would cost more than it saves. Page
+    texts are joined once at the end, and results are cached by file hash.
+
+    Args:
+        workers (int, optional): Worker processes; defaults to the CPU count
+        pages_per_task (int): Pages per task sent to a worker
+        parallel_threshold (int): Smallest page count extracted in the pool
+        max_pages (int, optional): Only the first `max_pages` pages are read
+        cache_size (int): Documents whose page texts are kept
+        cache_ttl (float): Seconds a cached document is kept
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        pages_per_task: int = 8,
+        parallel_threshold: int = 32,
+        max_pages: Optional[int] = None,
+        cache_size: int = 64,
+        cache_ttl: float = 3600,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.parallel_threshold = parallel_threshold
+        self.max_pages = max_pages
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # `extract` runs on several run_sync threads at once: the cache's LRU order and the
+        # lazily created pool are only touched under this lock
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn rather than fork: the pool is started from a server that already runs threads
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _drop_pool(self) -> None:
+        # a crashed worker poisons the whole pool; start a fresh one next time
+        with self._lock:
+            self._pool = None
+
+    def _cached(self, key: tuple) -> Optional[List[str]]:
+        with self._lock:
+            return self.cache.get(key)
+
+    def _store(self, key: tuple, pages: List[str]) -> None:
+        with self._lock:
+            self.cache.set(key, pages)
+
+    def iter_pages(self, source: PdfSource) -> Iterator[str]:
+        """
+        Yield the text of each page in order, as soon as it is available.
+
+        Args:
+            source: Path, bytes or seekable binary file (e.g. from `upload_buffer`)
+
+        Raises:
+            ValueError: If the PDF cannot be read
+        """
+        key = (file_hash(source), self.max_pages)
+        cached = self._cached(key)
+        if cached is not None:
+            yield from cached
+            return
+
+        pages: List[str] = []
+        try:
+            for text in self._extract(source):
+                pages.append(text)
+                yield text
+        except BrokenProcessPool as e:
+            self._drop_pool()
+            raise ValueError(f"Error reading PDF: {e}") from e
+        except Exception as e:
+            raise ValueError(f"Error reading PDF: {e}") from e
+        # only complete documents are cached; a consumer that stops early leaves nothing behind
+        self._store(key, pages)
+
+    def _extract(self, source: PdfSource) -> Iterator[str]:
+        file = io.BytesIO(source) if isinstance(source, bytes) else source
+        reader = PdfReader(file)
+        page_count = len(reader.pages)
+        if self.max_pages is not None:
+            page_count = min(page_count, self.max_pages)
+
+        if page_count < self.parallel_threshold or self.workers == 1:
+            for number in range(page_count):
+                yield reader.pages[number].extract_text() or ""
+            return
+
+        # workers need something they can open by name
+        path, tmp_path = (source, None) if isinstance(source, str) else (None, self._spill(file))
+        try:
+            starts = range(0, page_count, self.pages_per_task)
+            stops = [min(start + self.pages_per_task, page_count) for start in starts]
+            for texts in self._get_pool().map(_extract_range, [path or tmp_path] * len(stops), starts, stops):
+                yield from texts
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _spill(file: BinaryIO) -> str:
+        file.seek(0)
+        with tempfile.NamedTemporaryFile("wb", suffix=".pdf", delete=False) as tmp:
+            shutil.copyfileobj(file, tmp, 1 << 20)
+        file.seek(0)
+        return tmp.name
+
+    def extract(self, source: PdfSource) -> str:
+        """
+        Text of the whole document (up to `max_pages`), pages joined in order.
+
+        Args:
+            source: Path, bytes or seekable binary file (e.g. from `upload_buffer`)
+
+        Returns:
+            str: The extracted text
+
+        Raises:
+            ValueError: If the PDF cannot be read
+        """
+        return "".join(self.iter_pages(source))
+
+    async def aextract(self, source: PdfSource) -> str:
+        """`extract` on the bounded sync pool, so the event loop stays free."""
+        return await run_sync(self.extract, source)
+
+    async def aextract_in_worker(self, data: bytes) -> str:
+        """
+        Extract a whole document in one worker process.
+
+        For batches of small documents (e.g. resumes): each is too short to be
+        worth splitting into page runs, but many of them extracted at once keep
+        every worker busy, where `aextract` would run them on threads that share
+        one GIL. Results share the cache with `extract`.
+
+        Args:
+            data (bytes): The PDF file
+
+        Raises:
+            ValueError: If the PDF cannot be read
+        """
+        key = (file_hash(data), self.max_pages)
+        cached = self._cached(key)
+        if cached is not None:
+            return "".join(cached)
+        if self.workers == 1:
+            return await self.aextract(data)
+
+        loop = asyncio.get_running_loop()
+        try:
+            pages = await loop.run_in_executor(self._get_pool(), _extract_document, data, self.max_pages)
+        except BrokenProcessPool as e:
+            self._drop_pool()
+            raise ValueError(f"Error reading PDF: {e}") from e
+        self._store(key, pages)
+        return "".join(pages)
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+def extractor_from_env() -> PdfExtractor:
+    """PdfExtractor configured with PDF_WORKERS, PDF_MAX_PAGES and PDF_CACHE_SIZE."""
+    max_pages = os.getenv("PDF_MAX_PAGES")
+    workers = os.getenv("PDF_WORKERS")
+    return PdfExtractor(
+        workers=int(workers) if workers else None,
+        max_pages=int(max_pages) if max_pages else None,
+        cache_size=int(os.getenv("PDF_CACHE_SIZE", "64")),
+    )
@@ -0,0 +1,451 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from dotenv import load_dotenv
+from google.api_core.exceptions import TooManyRequests
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.retry import RunnableRetry
+
+from adaptive_retrieval import estimate_tokens
+
+# GoogleGenerativeAIEmbeddings sends embed_documents in batches of this many texts
+EMBEDDING_BATCH_SIZE = 100
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for the errors Gemini (and most HTTP clients) raise on HTTP 429 / quota exhaustion."""
+    # google.api_core's ResourceExhausted is a TooManyRequests
+    if isinstance(error, TooManyRequests):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError")
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide admission control for model calls: requests/min, tokens/min and concurrency.
+
+    Two token buckets refill continuously at `requests_per_minute` and
+    `tokens_per_minute` and hold up to `burst_seconds` worth of each; a call
+    takes one request and its estimated tokens, and once it finishes the
+    estimate is corrected with the tokens actually used. Calls beyond the
+    current concurrency limit wait for one to finish.
+
+    The concurrency limit adapts AIMD-style: every call that completes within
+    `target_latency` raises it by about one per round of calls (+1/limit), a
+    429 halves it, and a call slower than `target_latency` trims it by 10%.
+    Decreases are at most one per `cooldown` seconds, so one wave of 429s
+    counts once. A 429 also empties the request bucket, pausing new calls
+    until it refills.
+
+    Args:
+        requests_per_minute (float): Request quota
+        tokens_per_minute (float): Token quota (prompt + output)
+        max_concurrency (int): Upper bound for the adaptive limit
+        min_concurrency (int): Lower bound for the adaptive limit
+        target_latency (float, optional): Seconds above which a call counts as a congestion signal
+        burst_seconds (float): Seconds of quota the buckets can hold
+        cooldown (float): Minimum seconds between two decreases
+        check_every (float): Sleep between admission checks while waiting for a free slot
+        clock (callable, optional): Time source, mainly for tests
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 1000,
+        tokens_per_minute: float = 4_000_000,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        target_latency: Optional[float] = None,
+        burst_seconds: float = 5,
+        cooldown: float = 2,
+        check_every: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.request_rate = requests_per_minute / 60
+        self.token_rate = tokens_per_minute / 60
+        self.request_capacity = max(1.0, self.request_rate * burst_seconds)
+        self.token_capacity = max(1.0, self.token_rate * burst_seconds)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.check_every = check_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._refilled_at = clock()
+        self._decreased_at = float("-inf")
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.slow = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._requests = min(self.request_capacity, self._requests + elapsed * self.request_rate)
+        self._tokens = min(self.token_capacity, self._tokens + elapsed * self.token_rate)
+
+    def _try_acquire(self, tokens: int, requests: int) -> float:
+        """Admit the call and return 0, or return how long to wait before trying again."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if self.in_flight >= int(self.limit):
+                return self.check_every
+            # a call larger than the bucket would never fit; let it through once the bucket is full
+            requests = min(requests, self.request_capacity)
+            tokens = min(tokens, self.token_capacity)
+            wait = max(
+                (requests - self._requests) / self.request_rate,
+                (tokens - self._tokens) / self.token_rate,
+            )
+            if wait > 0:
+                return wait
+            self._requests -= requests
+            self._tokens -= tokens
+            self.in_flight += 1
+            self.calls += 1
+            return 0.0
+
+    def acquire(self, tokens: int = 0, requests: int = 1) -> None:
+        """Block until the call is admitted."""
+        start = self._clock()
+        while (wait := self._try_acquire(tokens, requests)) > 0:
+            time.sleep(wait)
+        self.wait_seconds += self._clock() - start
+
+    async def aacquire(self, tokens: int = 0, requests: int = 1) -> None:
+        """Wait, without blocking the event loop, until the call is admitted."""
+        start = self._clock()
+        while (wait := self._try_acquire(tokens, requests)) > 0:
+            await asyncio.sleep(wait)
+        self.wait_seconds += self._clock() - start
+
+    def release(
+        self,
+        tokens: int = 0,
+        used_tokens: Optional[int] = None,
+        latency: Optional[float] = None,
+        throttled: bool = False,
+    ) -> None:
+        """
+        Finish an admitted call and feed its outcome back into the limits.
+
+        Args:
+            tokens (int): Tokens reserved when the call was admitted
+            used_tokens (int, optional): Tokens the call actually used, when the response reports them
+            latency (float, optional): Seconds the call took
+            throttled (bool): Whether it failed with a 429
+        """
+        with self._lock:
+            now = self._clock()
+            self.in_flight = max(0, self.in_flight - 1)
+            if used_tokens is not None:
+                self._tokens = min(self.token_capacity, self._tokens + tokens - used_tokens)
+            slow = self.target_latency is not None and latency is not None and latency > self.target_latency
+            if throttled or slow:
+                self.throttled += throttled
+                self.slow += slow
+                if throttled:
+                    self._requests = min(self._requests, 0.0)
+                if now - self._decreased_at >= self.cooldown:
+                    factor = 0.5 if throttled else 0.9
+                    self.limit = max(float(self.min_concurrency), self.limit * factor)
+                    self._decreased_at = now
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+    @contextmanager
+    def limit_call(self, tokens: int = 0, requests: int = 1) -> Iterator[None]:
+        """Acquire around a blocking call; a 429 raised inside counts as a throttle signal."""
+        self.acquire(tokens, requests)
+        start, throttled = self._clock(), False
+        try:
+            yield
+        except Exception as e:
+            throttled = is_rate_limit_error(e)
+            raise
+        finally:
+            self.release(tokens, latency=self._clock() - start, throttled=throttled)
+
+    @asynccontextmanager
+    async def alimit_call(self, tokens: int = 0, requests: int = 1) -> AsyncIterator[None]:
+        """Async version of `limit_call`."""
+        await self.aacquire(tokens, requests)
+        start, throttled = self._clock(), False
+        try:
+            yield
+        except Exception as e:
+            throttled = is_rate_limit_error(e)
+            raise
+        finally:
+            self.release(tokens, latency=self._clock() - start, throttled=throttled)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(self._clock())
+            return {
+                "concurrency_limit": self.limit,
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "slow": self.slow,
+                "wait_seconds": self.wait_seconds,
+                "requests_available": self._requests,
+                "tokens_available": self._tokens,
+            }
+
+
+def _used_tokens(response: LLMResult) -> Optional[int]:
+    """Total tokens reported by a model response, if it reports any."""
+    used = 0
+    for generations in response.generations:
+        for generation in generations:
+            # chat models report usage on the message, GoogleGenerativeAI in generation_info
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            usage = usage or (generation.generation_info or {}).get("usage_metadata")
+            if usage:
+                used += usage.get("total_tokens", 0)
+    if used:
+        return used
+    usage = (response.llm_output or {}).get("usage_metadata") or (response.llm_output or {}).get("token_usage")
+    if isinstance(usage, dict):
+        return usage.get("total_tokens") or usage.get("total_token_count")
+    return None
+
+
+class RateLimitCallback(AsyncCallbackHandler):
+    """
+    Callback that puts every call of a model through an AdaptiveRateLimiter.
+
+    Pass it in the model's `callbacks`: the start event waits for admission
+    (LangChain awaits start handlers before sending the request), and the end
+    or error event releases the slot with the tokens used, the latency and
+    whether it was a 429. This works for chat models and completion LLMs alike,
+    streaming or not. Prompt tokens are estimated from the text, plus
+    `output_tokens` for the answer, until the response reports real usage.
+
+    Args:
+        limiter (AdaptiveRateLimiter): The shared limiter
+        output_tokens (int): Tokens reserved for each answer
+        run_timeout (float): Seconds after which a call that never reported back is released
+    """
+
+    run_inline = True
+
+    def __init__(self, limiter: AdaptiveRateLimiter, output_tokens: int = 512, run_timeout: float = 600):
+        self.limiter = limiter
+        self.output_tokens = output_tokens
+        self.run_timeout = run_timeout
+        self._runs: Dict[UUID, Tuple[int, float]] = {}
+
+    async def _start(self, run_id: UUID, text: str) -> None:
+        now = time.monotonic()
+        for stale_id, (tokens, started_at) in list(self._runs.items()):
+            if now - started_at > self.run_timeout:
+                # its end event was lost; don't let it hold a slot forever
+                del self._runs[stale_id]
+                self.limiter.release(tokens)
+        tokens = estimate_tokens(text) + self.output_tokens
+        await self.limiter.aacquire(tokens)
+        self._runs[run_id] = (tokens, time.monotonic())
+
+    async def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        await self._start(run_id, "".join(str(message.content) for batch in messages for message in batch))
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        await self._start(run_id, "".join(prompts))
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            tokens, started_at = run
+            self.limiter.release(tokens, _used_tokens(response), time.monotonic() - started_at)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            tokens, started_at = run
+            self.limiter.release(tokens, latency=time.monotonic() - started_at, throttled=is_rate_limit_error(error))
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that admits every request through an AdaptiveRateLimiter.
+
+    Wrap the raw model and put any cache (e.g. `maybe_cached`) outside this
+    wrapper, so cache hits don't use quota.
+
+    Args:
+        embeddings (Embeddings): The embedding model to wrap
+        limiter (AdaptiveRateLimiter): The shared limiter
+    """
+
+    def __init__(self, embeddings: Embeddings, limiter: AdaptiveRateLimiter):
+        self.embeddings = embeddings
+        self.limiter = limiter
+
+    @staticmethod
+    def _cost(texts: List[str]) -> Tuple[int, int]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        return tokens, max(1, math.ceil(len(texts) / EMBEDDING_BATCH_SIZE))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.limiter.limit_call(*self._cost(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.limiter.limit_call(*self._cost([text])):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        async with self.limiter.alimit_call(*self._cost(texts)):
+            return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async with self.limiter.alimit_call(*self._cost([text])):
+            return await self.embeddings.aembed_query(text)
+
+
+def single_attempt(model: BaseLanguageModel) -> BaseLanguageModel:
+    """
+    Turn off a Gemini client's own retries, so every request it sends is one limiter call.
+
+    The clients retry 429s internally (up to `max_retries` attempts with their
+    own backoff) inside a single callback window: the limiter would only hear
+    of the 429 after every attempt failed, and the extra attempts would never
+    be charged to the request bucket. Retry with `retry_throttled` instead.
+    GoogleGenerativeAI wraps a chat client that doesn't inherit its settings,
+    so that one is changed too. Models without a `max_retries` setting are
+    returned unchanged.
+
+    Returns:
+        The same model, for use at construction
+    """
+    for client in (model, getattr(model, "client", None)):
+        if isinstance(client, BaseLanguageModel) and hasattr(client, "max_retries"):
+            client.max_retries = 1
+    return model
+
+
+class _ThrottleRetry(RunnableRetry):
+    """
+    RunnableRetry that also retries streams, as long as nothing was streamed yet.
+
+    Agents (AgentExecutor) and streaming endpoints call their model through
+    stream/transform, which RunnableRetry passes through unretried. A 429
+    arrives before the first chunk, so restarting the stream then is safe;
+    an error after output has been sent is raised as is.
+    """
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        for attempt in range(1, self.max_attempt_number + 1):
+            chunks = self.bound.stream(input, config, **kwargs)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                return
+            except self.retry_exception_types:
+                if attempt == self.max_attempt_number:
+                    raise
+                continue
+            yield first
+            yield from chunks
+            return
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        for attempt in range(1, self.max_attempt_number + 1):
+            chunks = self.bound.astream(input, config, **kwargs)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                return
+            except self.retry_exception_types:
+                if attempt == self.max_attempt_number:
+                    raise
+                continue
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            return
+
+    def transform(self, input: Iterator[Any], config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        # a retry needs the whole input again, so gather it first (as Runnable.transform does)
+        final = None
+        for chunk in input:
+            final = chunk if final is None else final + chunk
+        yield from self.stream(final, config, **kwargs)
+
+    async def atransform(
+        self, input: AsyncIterator[Any], config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        final = None
+        async for chunk in input:
+            final = chunk if final is None else final + chunk
+        async for chunk in self.astream(final, config, **kwargs):
+            yield chunk
+
+
+def retry_throttled(runnable: Runnable, attempts: Optional[int] = None) -> Runnable:
+    """
+    Retry `runnable` on 429s, each attempt admitted by the limiter again.
+
+    There is no sleep between attempts: a 429 empties the limiter's request
+    bucket and halves its concurrency, so the next attempt waits for admission
+    instead. Streams are retried until their first chunk, which covers agents
+    (AgentExecutor streams its model) and streaming endpoints.
+
+    Args:
+        runnable (Runnable): Usually a `single_attempt` model, in the middle of a chain
+        attempts (int, optional): Attempts in total; GEMINI_ATTEMPTS (default 6) when omitted
+    """
+    return _ThrottleRetry(
+        bound=runnable,
+        kwargs={},
+        config={},
+        retry_exception_types=(TooManyRequests,),
+        wait_exponential_jitter=False,
+        max_attempt_number=attempts or int(os.getenv("GEMINI_ATTEMPTS", "6")),
+    )
+
+
+def limiter_from_env() -> AdaptiveRateLimiter:
+    """AdaptiveRateLimiter configured with GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_CONCURRENCY and GEMINI_TARGET_LATENCY."""
+    target_latency = os.getenv("GEMINI_TARGET_LATENCY")
+    return AdaptiveRateLimiter(
+        requests_per_minute=float(os.getenv("GEMINI_RPM", "1000")),
+        tokens_per_minute=float(os.getenv("GEMINI_TPM", "4000000")),
+        max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "32")),
+        target_latency=float(target_latency) if target_latency else None,
+    )
+
+
+# One limiter per process, shared by every Gemini client that opts in; the quota
+# may be configured in .env, which is loaded here since this is imported early
+load_dotenv()
+gemini_limiter = limiter_from_env()
+gemini_rate_limit = RateLimitCallback(gemini_limiter)
+
+
+def rate_limited_embeddings(embeddings: Embeddings) -> Embeddings:
+    """Put `embeddings` behind the process-wide Gemini limiter."""
+    return RateLimitedEmbeddings(embeddings, gemini_limiter)
@@ -1,14 +1,17 @@
 import os
-from typing import Dict
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_random_exponential
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.agent_toolkits.load_tools import load_tools
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
+from agent_tools import PARALLEL_ACTIONS_INSTRUCTIONS, MultiActionReActParser, ToolCache
+from async_utils import install_default_executor
+from job_queue import JobQueue, QueueFull
+from rate_limiter import gemini_rate_limit, retry_throttled, single_attempt
 
 # Load environment variables
 load_dotenv()
@@ -27,8 +30,21 @@ app.add_middleware(
 
 # Initialize LLM and tools
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0, api_key=GEMINI_API_KEY)
-tools = load_tools(["llm-math", "arxiv", "pubmed", "wikipedia"], llm=llm)
+# callbacks: share the process-wide Gemini quota; single_attempt: every request, retries
+# included, is admitted by it; the agent retries a throttled step with retry_throttled
+# rather than execute_with_retry restarting the whole run
+llm = single_attempt(ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0, api_key=GEMINI_API_KEY, callbacks=[gemini_rate_limit]))
+
+# Repeated lookups (same tool, same normalized input) are answered from a TTL cache
+tool_cache = ToolCache(
+    max_size=int(os.getenv("TOOL_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("TOOL_CACHE_TTL", "3600")),
+)
+tools = tool_cache.wrap(load_tools(["llm-math", "arxiv", "pubmed", "wikipedia"], llm=llm))
+
+# With AGENT_PARALLEL_TOOLS=true the agent may propose several independent actions
+# in one step, and the executor runs them concurrently
+PARALLEL_TOOLS = os.getenv("AGENT_PARALLEL_TOOLS", "false").lower() in ("1", "true", "yes")
 
 # Create prompt template
 prompt = PromptTemplate.from_template(
@@ -46,7 +62,7 @@ Observation: the result of the action
 ... (this Thought/Action/Action Input/Observation can repeat N times)
 Thought: I now know the final answer
 Final Answer: the final answer to the original input question
-
+""" + (PARALLEL_ACTIONS_INSTRUCTIONS if PARALLEL_TOOLS else "") + """
 Begin!
 
 Question: {input}
@@ -55,7 +71,12 @@ Thought: {agent_scratchpad}
 )
 
 # Create agent and executor
-agent = create_react_agent(llm=llm, tools=tools, prompt=prompt)
+agent = create_react_agent(
+    llm=retry_throttled(llm),
+    tools=tools,
+    prompt=prompt,
+    output_parser=MultiActionReActParser() if PARALLEL_TOOLS else None,
+)
 agent_executor = AgentExecutor(
     agent=agent,
     tools=tools,
@@ -63,14 +84,15 @@ agent_executor = AgentExecutor(
     max_iterations=5
 )
 
-# Define retry logic
+# Define retry logic: pacing against the Gemini quota is the rate limiter's job, so retries
+# only need jitter to keep clients that failed together from retrying together
 @retry(
     stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10),
+    wait=wait_random_exponential(multiplier=1, min=1, max=10),
     retry_error_callback=lambda retry_state: print(f"\nFailed after performing {retry_state.attempt_number} attempts")
 )
-def execute_with_retry(question: str) -> str:
-    response = agent_executor.invoke({"input": question})
+async def execute_with_retry(question: str) -> str:
+    response = await agent_executor.ainvoke({"input": question})
     return response['output']
 
 # Define request and response models
@@ -80,8 +102,32 @@ class QuestionRequest(BaseModel):
 class AnswerResponse(BaseModel):
     answer: str
 
-# Store for ongoing tasks
-tasks_store: Dict[str, Dict] = {}
+async def answer_job(question: str) -> str:
+    answer = await execute_with_retry(question)
+    # execute_with_retry returns None once its retries are exhausted
+    if answer is None:
+        raise RuntimeError("The agent could not answer after 3 attempts")
+    return answer
+
+# Background questions: JOB_WORKERS run at once, up to JOB_MAX_QUEUED wait, results are kept
+# JOB_RESULT_TTL seconds; set JOB_DB_PATH to keep queued questions across restarts
+job_queue = JobQueue(
+    answer_job,
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "100")),
+    result_ttl=float(os.getenv("JOB_RESULT_TTL", "3600")),
+    db_path=os.getenv("JOB_DB_PATH"),
+)
+
+# Sync-only tools (arxiv, pubmed, wikipedia) run on the bounded pool
+@app.on_event("startup")
+async def startup_event():
+    install_default_executor()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_queue.stop()
 
 # API endpoints
 @app.post("/ask", response_model=AnswerResponse)
@@ -90,44 +136,53 @@ async def ask_question(question_request: QuestionRequest):
     Process a question and return the answer
     """
     try:
-        result = execute_with_retry(question_request.question)
+        result = await execute_with_retry(question_request.question)
         return AnswerResponse(answer=result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
-# @app.post("/ask-async/{task_id}")
-# async def ask_question_async(task_id: str, question_request: QuestionRequest, background_tasks: BackgroundTasks):
-#     """
-#     Process a question asynchronously and store the result
-#     """
-#     tasks_store[task_id] = {"status": "processing", "result": None}
-    
-#     def process_question():
-#         try:
-#             result = execute_with_retry(question_request.question)
-#             tasks_store[task_id] = {"status": "completed", "result": result}
-#         except Exception as e:
-#             tasks_store[task_id] = {"status": "failed", "result": str(e)}
-    
-#     background_tasks.add_task(process_question)
-#     return {"task_id": task_id, "status": "processing"}
-
-# @app.get("/result/{task_id}")
-# async def get_result(task_id: str):
-#     """
-#     Get the result of an asynchronous task
-#     """
-#     if task_id not in tasks_store:
-#         raise HTTPException(status_code=404, detail="Task not found")
-    
-#     return tasks_store[task_id]
-
-# @app.get("/health")
-# async def health_check():
-#     """
-#     Health check endpoint
-#     """
-#     return {"status": "healthy"}
+@app.get("/tools/stats")
+async def tool_stats():
+    """
+    Per-tool call counts, cache hit rates and latency of the calls that reached the tool
+    """
+    return tool_cache.stats()
+
+@app.post("/ask-async", status_code=202)
+async def ask_question_async(question_request: QuestionRequest):
+    """
+    Queue a question and return its task id at once; poll /result/{task_id} for the answer
+    """
+    try:
+        job = await job_queue.submit(question_request.question)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many questions queued, try again later", headers={"Retry-After": "30"})
+    return {"task_id": job.id, "status": job.status}
+
+@app.get("/result/{task_id}")
+async def get_result(task_id: str):
+    """
+    Get the status, and once finished the answer or error, of a queued question
+    """
+    job = job_queue.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    return job.report()
+
+@app.get("/jobs/metrics")
+async def job_metrics():
+    """
+    Throughput, queue wait and run time of queued questions, plus queue depth
+    """
+    return job_queue.stats()
+
+@app.get("/health")
+async def health_check():
+    """
+    Health check endpoint
+    """
+    return {"status": "healthy", "queued": job_queue.queued, "running": job_queue.running}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,253 @@
+import re
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivial variants share a key."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Args:
+        max_size (int): Maximum number of entries kept; the least recently used is evicted first
+        ttl (float): Seconds an entry stays valid after it is written
+        clock (callable, optional): Time source, mainly for tests
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SemanticCache:
+    """
+    Cache that returns a stored answer when a new query embedding is close to a cached one.
+
+    Vectors are stored unit-normalised so cosine similarity is a single matrix-vector product.
+
+    Args:
+        threshold (float): Minimum cosine similarity for a lookup to count as a hit
+        max_size (int): Maximum number of entries kept, evicted least recently used first
+        ttl (float): Seconds an entry stays valid after it is written
+        clock (callable, optional): Time source, mainly for tests
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_size: int = 512,
+        ttl: float = 3600,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._ids = count()
+        self._entries: "OrderedDict[int, Tuple[float, np.ndarray, Any]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _purge_expired(self) -> None:
+        now = self._clock()
+        expired = [entry_id for entry_id, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self.expirations += len(expired)
+            self._matrix = None
+
+    def lookup(self, vector: List[float]) -> Optional[Tuple[Any, float]]:
+        """
+        Find the closest cached entry.
+
+        Returns:
+            tuple: (value, similarity) when the best match reaches the threshold, otherwise None
+        """
+        self._purge_expired()
+        if not self._entries:
+            self.misses += 1
+            return None
+
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = np.stack([self._entries[entry_id][1] for entry_id in self._matrix_ids])
+
+        query = _unit(vector)
+        scores = self._matrix @ query
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+
+        entry_id = self._matrix_ids[best]
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        return self._entries[entry_id][2], similarity
+
+    def add(self, vector: List[float], value: Any) -> None:
+        self._entries[next(self._ids)] = (self._clock() + self.ttl, _unit(vector), value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._matrix = None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class ResponseCache:
+    """
+    Two-tier answer cache: an exact-match LRU on the normalised question, backed by
+    a semantic cache on the question embedding.
+
+    Args:
+        embed (callable): Async function returning the embedding of a question
+        exact (TTLCache, optional): Exact-match tier
+        semantic (SemanticCache, optional): Semantic tier
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Awaitable[List[float]]],
+        exact: Optional[TTLCache] = None,
+        semantic: Optional[SemanticCache] = None,
+    ):
+        self._embed = embed
+        self.exact = exact if exact is not None else TTLCache()
+        self.semantic = semantic if semantic is not None else SemanticCache()
+
+    async def lookup(self, question: str) -> Tuple[Optional[Any], Optional[List[float]]]:
+        """
+        Look `question` up in both tiers.
+
+        Returns:
+            tuple: (answer, vector). The answer is None on a miss. The vector is the
+                question embedding when the semantic tier was consulted, for `store`.
+        """
+        key = normalize_question(question)
+        answer = self.exact.get(key)
+        if answer is not None:
+            return answer, None
+
+        vector = await self._embed(key)
+        match = self.semantic.lookup(vector)
+        if match is not None:
+            self.exact.set(key, match[0])
+            return match[0], vector
+        return None, vector
+
+    async def store(self, question: str, answer: Any, vector: Optional[List[float]] = None) -> None:
+        """Cache a freshly computed answer in both tiers."""
+        key = normalize_question(question)
+        if vector is None:
+            vector = await self._embed(key)
+        self.exact.set(key, answer)
+        self.semantic.add(vector, answer)
+
+    async def get_or_compute(self, question: str, compute: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Return a cached answer for `question`, or compute and cache a new one.
+
+        Args:
+            question (str): The user question
+            compute (callable): Async function producing the answer on a cache miss
+
+        Returns:
+            The cached or freshly computed answer
+        """
+        answer, vector = await self.lookup(question)
+        if answer is not None:
+            return answer
+        answer = await compute(question)
+        await self.store(question, answer, vector)
+        return answer
+
+    def clear(self) -> None:
+        self.exact.clear()
+        self.semantic.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"exact": self.exact.stats(), "semantic": self.semantic.stats()}
@@ -1,22 +1,47 @@
+import asyncio
+import functools
+import json
 import os
-from io import BytesIO
-from typing import List
+import zipfile
+from typing import AsyncIterator, BinaryIO, Callable, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_google_genai import GoogleGenerativeAI
 from pydantic import BaseModel, Field
-from pypdf import PdfReader
+
+from async_utils import run_sync
+from pdf_extraction import extractor_from_env
+from rate_limiter import gemini_rate_limit, retry_throttled, single_attempt
+from streaming import sse_response
+from uploads import MULTIPART_OVERHEAD, UploadLimitMiddleware, upload_buffer
 
 app = FastAPI()
 load_dotenv()
-llm = GoogleGenerativeAI(
+llm = single_attempt(GoogleGenerativeAI(
     model='gemini-1.5-flash',
     temperature=0,
-    api_key=os.getenv('GEMINI_API_KEY')
+    api_key=os.getenv('GEMINI_API_KEY'),
+    # share the process-wide Gemini quota; retries go through it too (see retry_throttled)
+    callbacks=[gemini_rate_limit],
+))
+
+# refuse oversized uploads while they arrive instead of after they are buffered
+# (added before CORS so its 413 responses still carry CORS headers)
+MAX_PDF_UPLOAD_MB = int(os.getenv("MAX_PDF_UPLOAD_MB", "20"))
+# batch uploads carry many resumes (or a zip of them) in one request
+MAX_BATCH_UPLOAD_MB = int(os.getenv("MAX_BATCH_UPLOAD_MB", "200"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+# LLM calls in flight at once for one batch
+RESUME_CONCURRENCY = int(os.getenv("RESUME_CONCURRENCY", "8"))
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=MAX_PDF_UPLOAD_MB * 1_000_000 + MULTIPART_OVERHEAD,
+    path_limits={"/summarize_resume/batch": MAX_BATCH_UPLOAD_MB * 1_000_000 + MULTIPART_OVERHEAD},
 )
 
 # Add CORS middleware with specific origin
@@ -28,15 +53,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def read_pdf_file(file_contents: BytesIO):
+# Shared PDF text extraction (process pool for long documents, cached by file hash)
+pdf_extractor = extractor_from_env()
+
+async def extract_text(file_contents: BinaryIO) -> str:
     try:
-        pdf_reader = PdfReader(file_contents)
-        text = ''
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
+        return await pdf_extractor.aextract(file_contents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 class ResumeReport(BaseModel):
     name: str = Field(description="Name of the employee")
@@ -45,40 +69,164 @@ class ResumeReport(BaseModel):
     education: List[str] = Field(description="Education details of the employee")
     experience: List[str] = Field(description="Experience details of the employee")
 
+def build_resume_chain():
+    prompt = """
+    Extract information from the resume delimited by triple backquotes and return it as JSON with the following fields:
+    - name: The full name of the person
+    - address: Their current address
+    - skills: A list of their technical and professional skills
+    - education: A list of their educational qualifications
+    - experience: A list of their work experiences or internship and include all details without changing the original contexts.
+
+    ```{text}```
+    """
+
+    prompt_template = PromptTemplate(template=prompt, input_variables=["text"])
+    output_parser = JsonOutputParser(pydantic_object=ResumeReport)
+    
+    # Create the chain correctly
+    return (
+        prompt_template 
+        | retry_throttled(llm)
+        | output_parser
+    )
+
+# Prompt, parser and chain are built once, when the app starts
+resume_chain = build_resume_chain()
+
 @app.post("/summarize_resume")
 async def summarize_resume(file: UploadFile = File(...)):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
     try:
-        contents = await file.read()
-        file_contents = BytesIO(contents)
-        text = read_pdf_file(file_contents)
-
-        prompt = """
-        Extract information from the resume delimited by triple backquotes and return it as JSON with the following fields:
-        - name: The full name of the person
-        - address: Their current address
-        - skills: A list of their technical and professional skills
-        - education: A list of their educational qualifications
-        - experience: A list of their work experiences or internship and include all details without changing the original contexts.
-
-        ```{text}```
-        """
-
-        prompt_template = PromptTemplate(template=prompt, input_variables=["text"])
-        output_parser = JsonOutputParser(pydantic_object=ResumeReport)
-        
-        # Create the chain correctly
-        chain = (
-            prompt_template 
-            | llm 
-            | output_parser
-        )
-        
+        # parse the spooled upload in place rather than copying it into memory
+        with upload_buffer(file) as file_contents:
+            text = await extract_text(file_contents)
+
         # Invoke chain with the text
-        response = chain.invoke({"text": text})
+        response = await resume_chain.ainvoke({"text": text})
         return response
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing resume: {str(e)}")
+
+@app.post("/summarize_resume/stream")
+async def summarize_resume_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Stream the extracted fields as Server-Sent Events. Each `data: {"partial": {...}}`
+    event carries the JSON object parsed so far, so fields fill in as they are generated.
+    """
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    with upload_buffer(file) as file_contents:
+        text = await extract_text(file_contents)
+
+    return sse_response(request, resume_chain.astream({"text": text}), to_data=lambda partial: {"partial": partial})
+
+# (name, loader of the PDF bytes, error) for each resume in a batch
+BatchItem = Tuple[str, Optional[Callable[[], bytes]], Optional[str]]
+
+def read_upload(source: BinaryIO) -> bytes:
+    source.seek(0)
+    return source.read()
+
+def list_batch(files: List[UploadFile]) -> Tuple[List[BatchItem], List[zipfile.ZipFile]]:
+    """
+    Expand a batch upload into one item per resume, without reading any of them yet.
+
+    PDFs are read from their spooled uploads and zip members from the archive
+    when their turn comes, so only the resumes being processed are in memory.
+
+    Args:
+        files (List[UploadFile]): PDFs and/or zip archives of PDFs
+
+    Returns:
+        The resumes, and the opened archives (to close once the batch is done)
+    """
+    items: List[BatchItem] = []
+    archives: List[zipfile.ZipFile] = []
+    for file in files:
+        name = file.filename or "upload"
+        if name.lower().endswith(".pdf"):
+            items.append((name, functools.partial(read_upload, file.file), None))
+        elif name.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(file.file)
+            except zipfile.BadZipFile as e:
+                items.append((name, None, f"Invalid zip archive: {e}"))
+                continue
+            archives.append(archive)
+            for info in archive.infolist():
+                # skip folders and the resource forks macOS adds to archives
+                if info.is_dir() or not info.filename.lower().endswith(".pdf") or info.filename.startswith("__MACOSX/"):
+                    continue
+                member = f"{name}/{info.filename}"
+                if info.file_size > MAX_PDF_UPLOAD_MB * 1_000_000:
+                    items.append((member, None, f"File too large. Maximum size is {MAX_PDF_UPLOAD_MB}MB."))
+                else:
+                    items.append((member, functools.partial(archive.read, info), None))
+        else:
+            items.append((name, None, "Only PDF files and zip archives are supported"))
+    return items, archives
+
+async def analyze_batch(items: List[BatchItem], archives: List[zipfile.ZipFile]) -> AsyncIterator[str]:
+    """
+    Analyse every resume and yield one NDJSON line per resume, in completion order.
+
+    Text extraction runs in the PDF worker processes, a couple of documents per
+    worker at a time; each text goes to the LLM as soon as it is ready, with at
+    most RESUME_CONCURRENCY calls in flight. Lines are
+    `{"index", "filename", "result"}` or `{"index", "filename", "error"}`.
+    """
+    extract_slots = asyncio.Semaphore(pdf_extractor.workers * 2)
+    llm_slots = asyncio.Semaphore(RESUME_CONCURRENCY)
+
+    async def analyze(index: int, name: str, load: Optional[Callable[[], bytes]], error: Optional[str]) -> dict:
+        line = {"index": index, "filename": name}
+        if error is not None:
+            line["error"] = error
+            return line
+        try:
+            async with extract_slots:
+                text = await pdf_extractor.aextract_in_worker(await run_sync(load))
+            if not text.strip():
+                raise ValueError("No text found in PDF")
+            async with llm_slots:
+                line["result"] = await resume_chain.ainvoke({"text": text})
+        except Exception as e:
+            line["error"] = str(e)
+        return line
+
+    tasks = [asyncio.ensure_future(analyze(index, *item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # the client went away or the batch is done: stop outstanding work
+        for task in tasks:
+            task.cancel()
+        for archive in archives:
+            archive.close()
+
+@app.post("/summarize_resume/batch")
+async def summarize_resume_batch(files: List[UploadFile] = File(...)):
+    """
+    Analyse many resumes in one request: PDFs, zip archives of PDFs, or both.
+
+    The response is NDJSON, one line per resume as soon as it is analysed; a
+    file that cannot be read or analysed gets an `error` line and the rest of
+    the batch carries on.
+    """
+    items, archives = list_batch(files)
+    if len(items) > MAX_BATCH_FILES:
+        for archive in archives:
+            archive.close()
+        raise HTTPException(status_code=400, detail=f"Too many resumes. Maximum is {MAX_BATCH_FILES} per batch.")
+
+    return StreamingResponse(analyze_batch(items, archives), media_type="application/x-ndjson")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    pdf_extractor.close()
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableLambda
+
+T = TypeVar("T")
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of a call's prompt and parameters (anything JSON-serialisable, dict keys in any order)."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one upstream call.
+
+    The first caller for a key starts the call as a task; callers arriving with
+    the same key while it runs wait for that task instead of starting their own,
+    and all of them get its result (or its exception). Nothing is kept once the
+    call finishes, so this only merges calls that overlap in time; put a cache
+    in front for repeats. A caller that goes away (e.g. the client disconnects)
+    stops waiting without cancelling the call for the others; the call is
+    cancelled only when no one is waiting for it any more.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `func` once for all concurrent callers with the same key.
+
+        Args:
+            key (str): Identifies the call, e.g. from `request_key`
+            func (callable): Starts the upstream call; only the first caller's is used
+
+        Returns:
+            The result of the shared call
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            self.calls += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._calls.get(key) is task and self._waiters[key] == 1 and not task.done():
+                # the last waiter left: nobody needs the result. Forget the call now, not
+                # when it finishes cancelling, so a caller arriving meanwhile starts afresh
+                # instead of joining a dying call and getting its CancelledError
+                del self._calls[key]
+                del self._waiters[key]
+                task.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+        # mark the exception as retrieved even if every waiter has gone
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def wrap(self, runnable: Runnable, name: Optional[str] = None) -> Runnable:
+        """
+        Async-only runnable that coalesces `ainvoke` calls with equal inputs.
+
+        Args:
+            runnable (Runnable): The chain to wrap
+            name (str, optional): Part of the key, so different chains never share calls
+        """
+        name = name or runnable.get_name()
+
+        async def invoke(value: Any) -> Any:
+            return await self.do(request_key(name, value), lambda: runnable.ainvoke(value))
+
+        return RunnableLambda(invoke, name=f"single_flight_{name}")
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.calls + self.coalesced
+        return {
+            "requests": requests,
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / requests if requests else 0.0,
+            "errors": self.errors,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,68 @@
+import json
+from typing import Any, AsyncIterator, Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+def _event(data: Any, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def sse_events(
+    request: Request,
+    chunks: AsyncIterator[Any],
+    to_data: Callable[[Any], Any] = lambda chunk: {"token": chunk},
+) -> AsyncIterator[str]:
+    """
+    Turn an async stream of model chunks into Server-Sent Events.
+
+    Each chunk becomes a `data:` event; the stream ends with an `end` event, or an
+    `error` event if generation fails part-way. When the client disconnects the
+    upstream stream is closed, which cancels the in-flight model call.
+
+    Args:
+        request (Request): The incoming request, polled for disconnects
+        chunks (AsyncIterator): Stream of chunks, e.g. from `chain.astream(...)`
+        to_data (callable): Maps a chunk to the JSON payload of its event
+    """
+    try:
+        async for chunk in chunks:
+            if await request.is_disconnected():
+                break
+            yield _event(to_data(chunk))
+        else:
+            yield _event({}, event="end")
+    except Exception as e:
+        yield _event({"detail": str(e)}, event="error")
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_response(
+    request: Request,
+    chunks: AsyncIterator[Any],
+    to_data: Callable[[Any], Any] = lambda chunk: {"token": chunk},
+) -> StreamingResponse:
+    """Wrap `sse_events` in a text/event-stream response with proxy buffering disabled."""
+    return StreamingResponse(
+        sse_events(request, chunks, to_data),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def message_text(chunks: AsyncIterator[Any]) -> AsyncIterator[str]:
+    """Yield the text of each chat message chunk (plain strings pass through), skipping empty ones."""
+    try:
+        async for chunk in chunks:
+            text = getattr(chunk, "content", chunk)
+            if text:
+                yield text
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -1,58 +1,97 @@
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from dotenv import load_dotenv
 from langchain_google_genai import GoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
-from langchain.chains.summarize import load_summarize_chain
-from langchain_core.documents import Document
-from pypdf import PdfReader
-from io import BytesIO
+from typing import BinaryIO
+from document_summary import STRATEGIES, DocumentSummarizer
+from pdf_extraction import extractor_from_env
+from rate_limiter import gemini_rate_limit, retry_throttled, single_attempt
+from streaming import sse_response
+from uploads import MULTIPART_OVERHEAD, UploadLimitMiddleware, upload_buffer
 
 app = FastAPI()
 load_dotenv()
-llm = GoogleGenerativeAI(
+
+# refuse oversized uploads while they arrive instead of after they are buffered
+MAX_PDF_UPLOAD_MB = int(os.getenv("MAX_PDF_UPLOAD_MB", "20"))
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_PDF_UPLOAD_MB * 1_000_000 + MULTIPART_OVERHEAD)
+
+llm = single_attempt(GoogleGenerativeAI(
     model="gemini-1.5-flash",
     temperature=0,
-    api_key=os.getenv("GEMINI_API_KEY")
+    api_key=os.getenv("GEMINI_API_KEY"),
+    # share the process-wide Gemini quota; retries go through it too (see retry_throttled)
+    callbacks=[gemini_rate_limit],
+))
+
+prompt = """
+Write a concise summary of the following text delimited by triple backquotes
+Return your response in bullet points which covers the key points of the text
+'''{text}'''
+BULLET POINT SUMMARY:
+"""
+
+prompt_template = PromptTemplate(template=prompt, input_variables=["text"])
+
+# Documents over SUMMARY_TOKEN_BUDGET tokens are split into chunks of SUMMARY_CHUNK_TOKENS
+# and summarised map-reduce (SUMMARY_CONCURRENCY chunk calls at once) or, for a few chunks, refine.
+# SUMMARY_CONCURRENCY defaults to GEMINI_MAX_CONCURRENCY: the shared rate limiter is the real cap.
+summarizer = DocumentSummarizer(
+    retry_throttled(llm),
+    prompt=prompt_template,
+    token_budget=int(os.getenv("SUMMARY_TOKEN_BUDGET", "8000")),
+    chunk_tokens=int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000")),
+    max_concurrency=int(os.getenv("SUMMARY_CONCURRENCY", os.getenv("GEMINI_MAX_CONCURRENCY", "32"))),
 )
 
-def read_pdf_file(file_contents: BytesIO):
+def check_strategy(strategy: str) -> str:
+    if strategy not in STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"strategy must be one of {', '.join(STRATEGIES)}")
+    return strategy
+
+# Shared PDF text extraction (process pool for long documents, cached by file hash)
+pdf_extractor = extractor_from_env()
+
+async def extract_text(file_contents: BinaryIO) -> str:
     try:
-        pdf_reader = PdfReader(file_contents)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
+        return await pdf_extractor.aextract(file_contents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/summarize")
-async def summarize_pdf(file: UploadFile = File(...)):
+async def summarize_pdf(file: UploadFile = File(...), strategy: str = Query("auto")):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    check_strategy(strategy)
     
     try:
-        contents = await file.read()
-        file_contents = BytesIO(contents)
-        text = read_pdf_file(file_contents)
-        doc = [Document(page_content=text)]
-        
-        prompt = """
-        Write a concise summary of the following text delimited by triple backquotes
-        Return your response in bullet points which covers the key points of the text
-        '''{text}'''
-        BULLET POINT SUMMARY:
-        """
-        
-        prompt_template = PromptTemplate(template=prompt, input_variables=["text"])
-        
-        summary_chain = load_summarize_chain(
-            llm=llm,
-            chain_type='stuff',
-            prompt=prompt_template
-        )
-        
-        output = summary_chain.invoke(doc)
-        return {"summary": output['output_text']}
+        # parse the spooled upload in place rather than copying it into memory
+        with upload_buffer(file) as file_contents:
+            text = await extract_text(file_contents)
+
+        # "stuff" for short documents; chunked map-reduce or refine for long ones
+        return await summarizer.ainvoke(text, strategy)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+@app.post("/summarize/stream")
+async def summarize_pdf_stream(request: Request, file: UploadFile = File(...), strategy: str = Query("auto")):
+    """
+    Stream the summary as Server-Sent Events, one `data: {"token": ...}` event per chunk.
+
+    For long documents the chunk summaries are computed first; the tokens of the
+    final merge (or refinement) are streamed.
+    """
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    check_strategy(strategy)
+
+    with upload_buffer(file) as file_contents:
+        text = await extract_text(file_contents)
+
+    return sse_response(request, summarizer.astream(text, strategy))
+
+@app.on_event("shutdown")
+def shutdown_event():
+    pdf_extractor.close()
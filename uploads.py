@@ -0,0 +1,100 @@
+import io
+import mmap
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+# room for multipart boundaries and headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadLimitMiddleware:
+    """
+    Reject request bodies larger than `max_bytes` with 413, while they arrive.
+
+    A Content-Length over the limit is refused before any of the body is read.
+    Otherwise the body is counted chunk by chunk as the multipart parser consumes
+    it, and the request fails as soon as the limit is crossed, so an oversized
+    upload is never buffered or spooled in full. (Starlette's parser keeps each
+    file in memory up to 1 MB and spills the rest to a temporary file.)
+
+    Args:
+        app: The ASGI app to wrap
+        max_bytes (int): Largest request body accepted
+        path_limits (dict, optional): Different limits for specific paths, e.g. batch uploads
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.path_limits.get(scope["path"], self.max_bytes)
+        detail = f"Upload too large. Maximum size is {max_bytes // 1_000_000}MB."
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            response = JSONResponse({"detail": detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise HTTPException(413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _on_disk(source: BinaryIO) -> bool:
+    if isinstance(source, tempfile.SpooledTemporaryFile):
+        # calling fileno() would force an in-memory spool onto disk
+        return source._rolled
+    try:
+        source.fileno()
+        return True
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+
+
+@contextmanager
+def upload_buffer(file: UploadFile) -> Iterator[BinaryIO]:
+    """
+    Seekable, read-only view of an upload that doesn't copy it into memory.
+
+    Uploads Starlette has spilled to a temporary file are memory-mapped, so the
+    pages are read from the page cache on demand; small in-memory uploads are
+    returned as they are. Either can go straight to `PdfReader` or `Image.open`.
+
+    Args:
+        file (UploadFile): The upload, as received by the endpoint
+
+    Yields:
+        A binary file-like object positioned at the start of the upload
+    """
+    source = file.file
+    source.seek(0, io.SEEK_END)
+    size = source.tell()
+    source.seek(0)
+    if size == 0 or not _on_disk(source):
+        yield source
+        return
+
+    mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield mapped
+    finally:
+        mapped.close()
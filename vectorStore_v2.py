@@ -1,16 +1,23 @@
 import os
-from langchain_mongodb import MongoDBAtlasVectorSearch
+import sys
 from pymongo import MongoClient
 from langchain.document_loaders import TextLoader
 from langchain.text_splitter import CharacterTextSplitter
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+from embedding_cache import maybe_cached
 from dotenv import load_dotenv
+from ingestion import IngestionPipeline
+from local_vector_store import LocalVectorStore, local_store_path, use_local_store
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY)
+# opt in to the shared disk cache with EMBEDDING_CACHE_DIR
+embeddings = maybe_cached(
+    GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY),
+    "models/embedding-001",
+)
 
 client = MongoClient(os.getenv("MONGODB_ATLAS_CLUSTER_URI"))
 
@@ -20,16 +27,6 @@ ATLAS_VECTOR_SEARCH_INDEX_NAME = "test-index-1"
 
 MONGODB_COLLECTION = client[DB_NAME][COLLECTION_NAME]
 
-# clearing (deleting) previous documents
-MONGODB_COLLECTION.delete_many({})
-
-vector_store = MongoDBAtlasVectorSearch(
-    collection=MONGODB_COLLECTION,
-    embedding=embeddings,
-    index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
-    relevance_score_fn="cosine",
-)
-
 text_splitter = CharacterTextSplitter(
     separator="\n",
     chunk_size=200,
@@ -41,8 +38,26 @@ docs = loader.load_and_split(
     text_splitter=text_splitter
 )
 
-vector_store.add_documents(docs)
+if use_local_store():
+    # offline: write the chunks to a local store that vectorStore_v3 can load
+    vector_store = LocalVectorStore.from_documents(docs, embeddings)
+    vector_store.save(local_store_path(COLLECTION_NAME))
+    print(f"Saved {len(vector_store)} documents to {local_store_path(COLLECTION_NAME)}")
+    sys.exit(0)
+
+# embed in concurrent, rate-limited batches; a rerun after a crash resumes from the checkpoint
+pipeline = IngestionPipeline(
+    collection=MONGODB_COLLECTION,
+    embeddings=embeddings,
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "64")),
+    max_concurrency=int(os.getenv("INGEST_CONCURRENCY", "4")),
+    requests_per_minute=float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "600")),
+    checkpoint_path=f".ingest_{COLLECTION_NAME}.json",
+)
+
+# only embed new or changed chunks and delete stale ones; pass --dry-run to just count
+report = pipeline.reindex(docs, dry_run="--dry-run" in sys.argv)
 
-print("Documents Added")
+print(report.report())
 
-client.close()
\ No newline at end of file
+client.close()
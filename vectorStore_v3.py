@@ -3,15 +3,21 @@ from langchain_mongodb import MongoDBAtlasVectorSearch
 from pymongo import MongoClient
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
-from langchain.chains import RetrievalQA
+from embedding_cache import maybe_cached
+from adaptive_retrieval import AdaptiveRetriever, BudgetedRetrievalQA
 from dotenv import load_dotenv
+from local_vector_store import LocalVectorStore, local_store_path, use_local_store
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 llm_model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=GEMINI_API_KEY)
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY)
+# opt in to the shared disk cache with EMBEDDING_CACHE_DIR
+embeddings = maybe_cached(
+    GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY),
+    "models/embedding-001",
+)
 
 client = MongoClient(os.getenv("MONGODB_ATLAS_CLUSTER_URI"))
 
@@ -21,27 +27,36 @@ ATLAS_VECTOR_SEARCH_INDEX_NAME = "test-index-1"
 
 MONGODB_COLLECTION = client[DB_NAME][COLLECTION_NAME]
 
-vector_store = MongoDBAtlasVectorSearch(
-    collection=MONGODB_COLLECTION,
-    embedding=embeddings,
-    index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
-    relevance_score_fn="cosine",
-)
+# VECTOR_STORE_BACKEND=local reads the store saved by vectorStore_v2 instead of Atlas
+if use_local_store():
+    vector_store = LocalVectorStore.load(local_store_path(COLLECTION_NAME), embeddings)
+
+    # get total documents 
+    total_docs = len(vector_store)
+else:
+    vector_store = MongoDBAtlasVectorSearch(
+        collection=MONGODB_COLLECTION,
+        embedding=embeddings,
+        index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
+        relevance_score_fn="cosine",
+    )
 
-# get total documents 
-total_docs = MONGODB_COLLECTION.count_documents({})
+    # get total documents 
+    total_docs = MONGODB_COLLECTION.count_documents({})
 
-retriever = vector_store.as_retriever(
-    search_kwargs = {
-        "k": total_docs, 
-        "score_threshold": 0.0
-    }
+# pick k per query (score-gap or MMR cutoff) instead of pulling back the whole collection
+retriever = AdaptiveRetriever(
+    vectorstore=vector_store,
+    cutoff=os.getenv("RETRIEVAL_CUTOFF", "score_gap"),
+    fetch_k=max(1, min(total_docs, int(os.getenv("RETRIEVAL_FETCH_K", "50")))),
+    max_k=int(os.getenv("RETRIEVAL_MAX_K", "20")),
 )
 
-chain = RetrievalQA.from_chain_type(
+# stuff the context when it fits the token budget, map-reduce over it when it does not
+chain = BudgetedRetrievalQA(
     llm=llm_model,
     retriever=retriever,
-    chain_type="stuff"
+    token_budget=int(os.getenv("RAG_TOKEN_BUDGET", "4000")),
 )
 
 ai_response = chain.invoke("Tell me everything about elephants")
@@ -1,16 +1,21 @@
 import os
-from langchain_mongodb import MongoDBAtlasVectorSearch
 from pymongo import MongoClient
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+from embedding_cache import maybe_cached
 from langchain.docstore.document import Document
 from dotenv import load_dotenv
+from ingestion import IngestionPipeline
 import json
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY)
+# opt in to the shared disk cache with EMBEDDING_CACHE_DIR
+embeddings = maybe_cached(
+    GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY),
+    "models/embedding-001",
+)
 
 client = MongoClient(os.getenv("MONGODB_ATLAS_CLUSTER_URI"))
 
@@ -19,13 +24,15 @@ COLLECTION_NAME = "test_collection_json"
 ATLAS_VECTOR_SEARCH_INDEX_NAME = "test-index-json"
 
 MONGODB_COLLECTION = client[DB_NAME][COLLECTION_NAME]
-MONGODB_COLLECTION.delete_many({})
 
-vector_store = MongoDBAtlasVectorSearch(
+# embed in concurrent, rate-limited batches; a rerun after a crash resumes from the checkpoint
+pipeline = IngestionPipeline(
     collection=MONGODB_COLLECTION,
-    embedding=embeddings,
-    index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
-    relevance_score_fn="cosine",
+    embeddings=embeddings,
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "64")),
+    max_concurrency=int(os.getenv("INGEST_CONCURRENCY", "4")),
+    requests_per_minute=float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "600")),
+    checkpoint_path=f".ingest_{COLLECTION_NAME}.json",
 )
 
 def format_item_with_keys(item):
@@ -57,8 +64,9 @@ def load_json_as_documents(file_path):
 
 # Load and process the documents
 docs = load_json_as_documents('your_file.json')
-vector_store.add_documents(docs)
+stats = pipeline.ingest(docs, clear_collection=True)
 
 print("Documents Added!")
+print(stats.report())
 
 client.close()
\ No newline at end of file
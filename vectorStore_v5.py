@@ -3,15 +3,21 @@ from langchain_mongodb import MongoDBAtlasVectorSearch
 from pymongo import MongoClient
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+from embedding_cache import maybe_cached
 from langchain.chains import RetrievalQA
 from dotenv import load_dotenv
+from local_vector_store import LocalVectorStore, local_store_path, use_local_store
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 llm_model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=GEMINI_API_KEY)
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY)
+# opt in to the shared disk cache with EMBEDDING_CACHE_DIR
+embeddings = maybe_cached(
+    GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY),
+    "models/embedding-001",
+)
 
 client = MongoClient(os.getenv("MONGODB_ATLAS_CLUSTER_URI"))
 
@@ -21,12 +27,16 @@ ATLAS_VECTOR_SEARCH_INDEX_NAME = "test-index-pdf"
 
 MONGODB_COLLECTION = client[DB_NAME][COLLECTION_NAME]
 
-vector_store = MongoDBAtlasVectorSearch(
-    collection=MONGODB_COLLECTION,
-    embedding=embeddings,
-    index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
-    relevance_score_fn="cosine",
-)
+# VECTOR_STORE_BACKEND=local reads a store built with `python local_vector_store.py diabetes.pdf test_collection_pdf`
+if use_local_store():
+    vector_store = LocalVectorStore.load(local_store_path(COLLECTION_NAME), embeddings)
+else:
+    vector_store = MongoDBAtlasVectorSearch(
+        collection=MONGODB_COLLECTION,
+        embedding=embeddings,
+        index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
+        relevance_score_fn="cosine",
+    )
 
 retriever = vector_store.as_retriever()
 
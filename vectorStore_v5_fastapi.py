@@ -3,11 +3,20 @@ from langchain_mongodb import MongoDBAtlasVectorSearch
 from pymongo import MongoClient
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+from embedding_cache import maybe_cached
+from local_vector_store import LocalVectorStore, local_store_path, use_local_store
+from rate_limiter import gemini_rate_limit, rate_limited_embeddings, retry_throttled, single_attempt
 from langchain.chains import RetrievalQA
+from langchain_core.runnables import RunnablePassthrough
+from adaptive_retrieval import STUFF_PROMPT
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 import uvicorn
+from async_utils import install_default_executor
+from response_cache import ResponseCache, SemanticCache, TTLCache, normalize_question
+from single_flight import SingleFlight, request_key
+from streaming import message_text, sse_response
 
 # Load environment variables
 load_dotenv()
@@ -23,8 +32,13 @@ class Question(BaseModel):
 def initialize_chain():
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     
-    llm_model = ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=GEMINI_API_KEY)
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY)
+    # chat and embedding calls share the process-wide Gemini quota
+    llm_model = single_attempt(ChatGoogleGenerativeAI(model="gemini-1.5-flash", api_key=GEMINI_API_KEY, callbacks=[gemini_rate_limit]))
+    # opt in to the shared disk cache with EMBEDDING_CACHE_DIR (cache hits don't use quota)
+    embeddings = maybe_cached(
+        rate_limited_embeddings(GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY)),
+        "models/embedding-001",
+    )
     
     client = MongoClient(os.getenv("MONGODB_ATLAS_CLUSTER_URI"))
     
@@ -34,39 +48,110 @@ def initialize_chain():
     
     MONGODB_COLLECTION = client[DB_NAME][COLLECTION_NAME]
     
-    vector_store = MongoDBAtlasVectorSearch(
-        collection=MONGODB_COLLECTION,
-        embedding=embeddings,
-        index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
-        relevance_score_fn="cosine",
-    )
+    # VECTOR_STORE_BACKEND=local serves from an on-disk store instead of Atlas
+    if use_local_store():
+        vector_store = LocalVectorStore.load(local_store_path(COLLECTION_NAME), embeddings)
+    else:
+        vector_store = MongoDBAtlasVectorSearch(
+            collection=MONGODB_COLLECTION,
+            embedding=embeddings,
+            index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
+            relevance_score_fn="cosine",
+        )
     
     retriever = vector_store.as_retriever()
     
     chain = RetrievalQA.from_chain_type(
-        llm=llm_model,
+        llm=retry_throttled(llm_model),
         retriever=retriever,
         chain_type="stuff"
     )
     
-    return chain, client
+    # same retrieval and "stuff" prompt as the chain above, as an LCEL pipeline that can stream tokens
+    stream_chain = (
+        {
+            "context": retriever | (lambda docs: "\n\n".join(doc.page_content for doc in docs)),
+            "question": RunnablePassthrough(),
+        }
+        | STUFF_PROMPT
+        | retry_throttled(llm_model)
+    )
+    
+    return chain, stream_chain, client, embeddings
 
 # Initialize the chain and MongoDB client
-qa_chain, mongo_client = initialize_chain()
+qa_chain, qa_stream_chain, mongo_client, question_embeddings = initialize_chain()
+
+# Two-tier answer cache: exact match on the normalised question, then embedding similarity
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+response_cache = ResponseCache(
+    embed=question_embeddings.aembed_query,
+    exact=TTLCache(max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")), ttl=CACHE_TTL),
+    semantic=SemanticCache(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+        ttl=CACHE_TTL,
+    ),
+)
+
+# cache misses for the same question at the same time share one retrieval and Gemini call
+qa_flight = SingleFlight()
+
+async def answer_question(question: str) -> str:
+    async def run_chain():
+        response = await qa_chain.ainvoke(question)
+        return response["result"]
+
+    return await qa_flight.do(request_key("ask", normalize_question(question)), run_chain)
 
 # Create the endpoint
 @app.post("/ask")
 async def ask_question(question: Question):
     try:
-        # Get the response from the chain
-        response = qa_chain.invoke(question.question)
+        # Get the response from the cache, or from the chain without blocking the event loop
+        answer = await response_cache.get_or_compute(question.question, answer_question)
         
         # Return the response
-        return {"answer": response["result"]}
+        return {"answer": answer}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_answer(question: str):
+    # a cached answer is sent as a single chunk
+    answer, vector = await response_cache.lookup(question)
+    if answer is not None:
+        yield answer
+        return
+
+    parts = []
+    async for text in message_text(qa_stream_chain.astream(question)):
+        parts.append(text)
+        yield text
+    # only complete answers are cached; a disconnect closes this generator before here
+    await response_cache.store(question, "".join(parts), vector)
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: Request, question: Question):
+    """
+    Stream the answer as Server-Sent Events, one `data: {"token": ...}` event per chunk.
+    """
+    return sse_response(request, stream_answer(question.question))
+
+# Expose cache hit/miss counters
+@app.get("/cache/stats")
+async def cache_stats():
+    stats = response_cache.stats()
+    stats["single_flight"] = qa_flight.stats()
+    if hasattr(question_embeddings, "stats"):
+        stats["embeddings"] = question_embeddings.stats()
+    return stats
+
+# Route sync-only retriever calls through the bounded pool
+@app.on_event("startup")
+async def startup_event():
+    install_default_executor()
+
 # Cleanup when shutting down
 @app.on_event("shutdown")
 def shutdown_event():
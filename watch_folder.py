@@ -0,0 +1,456 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from batch_split_rotate import (
+    IMAGE_EXTENSIONS,
+    MANIFEST_NAME,
+    OutputOptions,
+    _load_manifest,
+    _process_image,
+    _save_manifest,
+    find_images,
+)
+
+# inotify event bits (see <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal inotify watch on one directory, through libc via ctypes (Linux only)."""
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # deletions and moves out are reported too, so their manifest entries can be dropped
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MOVED_FROM
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def read(self, timeout: float) -> Tuple[Set[str], bool]:
+        """
+        Wait up to `timeout` seconds for events.
+
+        Returns:
+            tuple: (names of touched files, whether the kernel dropped events or
+                removed the watch, in which case the caller should rescan)
+        """
+        names: Set[str] = set()
+        lost = False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return names, lost
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & (IN_Q_OVERFLOW | IN_IGNORED):
+                    lost = True
+                elif name:
+                    names.add(os.fsdecode(name))
+        return names, lost
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Long-running service that splits and rotates images as they land in a folder.
+
+    New files are found with inotify where available, falling back to polling the
+    folder. A file is only queued once its size and mtime have stayed the same for
+    `settle_seconds`, so files still being copied are left alone. Queued files are
+    processed by a pool of `workers` processes with at most `max_in_flight` images
+    submitted at once; the rest wait in the queue (backpressure rather than an
+    ever-growing backlog inside the pool). The queue holds at most `max_queued`
+    files; settled files beyond that stay where they are, re-checked, until
+    there is room.
+
+    A file that changes after it was queued (e.g. a copy that paused for longer
+    than `settle_seconds`) is checked again once its processing finishes, and
+    processed again when it has settled.
+
+    If a worker dies (e.g. killed for running out of memory) the pool is
+    replaced and the images that were in flight are queued again and retried
+    one at a time, so an image that kills its worker alone is recorded as
+    failed after `MAX_CRASHES` crashes and can't stop the service. Deleted
+    inputs are dropped from the manifest.
+
+    Finished images are recorded in the same manifest as
+    `process_folder(incremental=True)`, so files already processed by a batch run
+    or before a restart are skipped.
+
+    Args:
+        input_folder (str): Folder to watch (not recursive)
+        output_folder (str, optional): Directory for outputs. If None, an 'output' subfolder
+        workers (int, optional): Worker processes; None uses every CPU
+        options (OutputOptions, optional): Output format, encoder settings and scale
+        settle_seconds (float): How long a file's size must stay unchanged before it is queued
+        poll_interval (float): Seconds between settle checks, and between folder scans when polling
+        max_in_flight (int, optional): Images submitted to the pool at once; defaults to 2 per worker
+        use_inotify (bool): Try inotify before falling back to polling
+        max_queued (int): Files waiting for a worker before settled files are held back
+    """
+
+    # times an image may be in flight when a worker dies before it is recorded as failed
+    MAX_CRASHES = 2
+
+    def __init__(
+        self,
+        input_folder: str,
+        output_folder: Optional[str] = None,
+        workers: Optional[int] = None,
+        options: Optional[OutputOptions] = None,
+        settle_seconds: float = 2.0,
+        poll_interval: float = 1.0,
+        max_in_flight: Optional[int] = None,
+        use_inotify: bool = True,
+        max_queued: int = 10_000,
+    ):
+        self.input_folder = input_folder
+        self.output_folder = output_folder or os.path.join(input_folder, "output")
+        self.workers = workers or os.cpu_count() or 1
+        self.options = options or OutputOptions()
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.use_inotify = use_inotify
+        self.max_queued = max_queued
+        self.manifest_path = os.path.join(self.output_folder, MANIFEST_NAME)
+
+        self._stop = threading.Event()
+        self._inotify: Optional[_Inotify] = None
+        # path -> (size, mtime_ns, time that observation was first made)
+        self._settling: Dict[str, Tuple[int, int, float]] = {}
+        self._queue: Deque[str] = deque()
+        self._queued: Set[str] = set()
+        # queued or in-flight files touched again since they were queued
+        self._changed: Set[str] = set()
+        self._queue_full_warned = False
+        self._in_flight: Dict = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # path -> times a worker died while it was in flight
+        self._crashes: Dict[str, int] = {}
+        # (size, mtime_ns) of each file when it was last queued, so polling only picks up changes
+        self._handled: Dict[str, Tuple[int, int]] = {}
+        self._manifest: Dict = {}
+        self._dirty = 0
+        self._completed: Deque[float] = deque()
+        self._started = time.monotonic()
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify is not None else "polling"
+
+    def metrics(self, window: float = 60.0) -> Dict:
+        """
+        Current queue depths and throughput.
+
+        Args:
+            window (float): Seconds over which images/sec is measured
+
+        Returns:
+            dict: settling (waiting for their size to settle), queued, in_flight,
+                processed, skipped, failed, images_per_second and uptime_seconds
+        """
+        now = time.monotonic()
+        while self._completed and self._completed[0] < now - window:
+            self._completed.popleft()
+        span = min(window, now - self._started) or 1.0
+        return {
+            "mode": self.mode,
+            "settling": len(self._settling),
+            "queued": len(self._queue),
+            "in_flight": len(self._in_flight),
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "images_per_second": round(len(self._completed) / span, 2),
+            "uptime_seconds": round(now - self._started, 1),
+        }
+
+    def stop(self) -> None:
+        """Ask `run` to return after the images already submitted have finished."""
+        self._stop.set()
+
+    def _observe(self, path: str) -> None:
+        if path in self._queued:
+            # already waiting or being processed: look at it again once that is done
+            self._changed.add(path)
+            return
+        if path in self._settling:
+            # `_settle` re-checks its size and mtime anyway
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._forget(path)
+            return
+        self._settling[path] = (stat.st_size, stat.st_mtime_ns, time.monotonic())
+
+    def _forget(self, path: str) -> None:
+        # a deleted input: drop what is known about it so these tables don't grow without bound
+        self._handled.pop(path, None)
+        self._crashes.pop(path, None)
+        if self._manifest.pop(os.path.basename(path), None) is not None:
+            self._dirty += 1
+
+    def _scan(self) -> None:
+        paths = find_images(self.input_folder)
+        present = set(paths)
+        for path in [path for path in self._handled if path not in present]:
+            self._forget(path)
+        names = {os.path.basename(path) for path in paths}
+        for name in [name for name in self._manifest if name not in names]:
+            self._forget(os.path.join(self.input_folder, name))
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if self._handled.get(path) != (stat.st_size, stat.st_mtime_ns):
+                self._observe(path)
+
+    def _wait_for_files(self) -> None:
+        if self._inotify is None:
+            self._stop.wait(self.poll_interval)
+            self._scan()
+            return
+        names, lost = self._inotify.read(self.poll_interval)
+        if lost:
+            self._scan()
+        for name in names:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                self._observe(os.path.join(self.input_folder, name))
+
+    def _settle(self) -> None:
+        now = time.monotonic()
+        if not self._queue:
+            # warn about a full queue once per backlog, not each time a slot frees up
+            self._queue_full_warned = False
+        for path, (size, mtime_ns, since) in list(self._settling.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._settling[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                # still being written; restart the clock
+                self._settling[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= self.settle_seconds:
+                if len(self._queue) >= self.max_queued:
+                    # backpressure: leave settled files on disk until the queue drains
+                    if not self._queue_full_warned:
+                        print(f"Queue full ({self.max_queued} files), holding back new files", file=sys.stderr)
+                        self._queue_full_warned = True
+                    continue
+                del self._settling[path]
+                self._handled[path] = (size, mtime_ns)
+                self._queued.add(path)
+                self._queue.append(path)
+
+    def _dispatch(self) -> None:
+        while self._queue and len(self._in_flight) < self.max_in_flight:
+            # an image that was in flight when a worker died runs alone, so the next crash
+            # is pinned on the image that caused it
+            suspect = self._queue[0] in self._crashes
+            if suspect and self._in_flight:
+                return
+            path = self._queue.popleft()
+            known = self._manifest.get(os.path.basename(path))
+            future = self._pool.submit(_process_image, path, self.output_folder, self.options, True, known)
+            self._in_flight[future] = path
+            if suspect:
+                return
+
+    def _replace_pool(self, error: BaseException) -> None:
+        # every image in flight went down with the pool; which one killed the worker is
+        # unknown, so each is retried alone, and given up on after MAX_CRASHES
+        print(f"Worker pool broke ({error}), starting a new one", file=sys.stderr)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        for path in self._in_flight.values():
+            self._crashes[path] = self._crashes.get(path, 0) + 1
+            if self._crashes[path] < self.MAX_CRASHES:
+                self._queue.appendleft(path)
+                continue
+            self._crashes.pop(path)
+            self._queued.discard(path)
+            self._completed.append(time.monotonic())
+            self.failed += 1
+            print(f"Error processing {os.path.basename(path)}: worker died {self.MAX_CRASHES} times", file=sys.stderr)
+            self._recheck(path)
+        self._in_flight.clear()
+
+    def _collect(self, timeout: float) -> None:
+        if not self._in_flight:
+            return
+        done, _ = wait(list(self._in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                self._replace_pool(e)
+                break
+            path = self._in_flight.pop(future)
+            self._queued.discard(path)
+            self._crashes.pop(path, None)
+            self._completed.append(time.monotonic())
+            if not result.ok:
+                self.failed += 1
+                print(f"Error processing {os.path.basename(path)}: {result.error}", file=sys.stderr)
+            else:
+                if result.skipped:
+                    self.skipped += 1
+                else:
+                    self.processed += 1
+                self._manifest[os.path.basename(path)] = {**result.fingerprint, "outputs": list(result.outputs)}
+                self._dirty += 1
+            # after the manifest update, so a file deleted meanwhile loses its entry again
+            self._recheck(path)
+        if self._dirty >= 64 or (self._dirty and not self._in_flight):
+            self._save_manifest()
+
+    def _recheck(self, path: str) -> None:
+        # writes that landed after the file was queued must not be lost: an event was
+        # seen, or (polling, or a write before the watch saw it) its size or mtime moved
+        changed = path in self._changed
+        self._changed.discard(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._forget(path)
+            return
+        if changed or self._handled.get(path) != (stat.st_size, stat.st_mtime_ns):
+            self._observe(path)
+
+    def _save_manifest(self) -> None:
+        _save_manifest(self.manifest_path, self.options, self._manifest)
+        self._dirty = 0
+
+    def run(self, metrics_interval: Optional[float] = None, metrics_path: Optional[str] = None) -> None:
+        """
+        Watch and process until `stop` is called.
+
+        Files already in the folder are picked up first (skipped if the manifest
+        shows they are done).
+
+        Args:
+            metrics_interval (float, optional): Seconds between metrics reports; None disables them
+            metrics_path (str, optional): Also write each report as JSON to this file, for external monitoring
+        """
+        os.makedirs(self.output_folder, exist_ok=True)
+        self._manifest = _load_manifest(self.manifest_path, self.options)
+        if self.use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(self.input_folder)
+            except OSError as e:
+                print(f"inotify unavailable ({e}), polling every {self.poll_interval}s", file=sys.stderr)
+
+        next_report = time.monotonic() + (metrics_interval or 0)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            # the watch is in place before this scan, so nothing created in between is missed
+            self._scan()
+            while not self._stop.is_set():
+                # block on the pool when it is full, otherwise on the folder
+                if len(self._in_flight) >= self.max_in_flight:
+                    self._collect(self.poll_interval)
+                else:
+                    self._wait_for_files()
+                    self._collect(0)
+                self._settle()
+                self._dispatch()
+                if metrics_interval and time.monotonic() >= next_report:
+                    self._report(metrics_path)
+                    next_report = time.monotonic() + metrics_interval
+            while self._in_flight:
+                self._collect(None)
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            if self._dirty:
+                self._save_manifest()
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    def _report(self, metrics_path: Optional[str]) -> None:
+        metrics = self.metrics()
+        print(" ".join(f"{key}={value}" for key, value in metrics.items()), file=sys.stderr)
+        if metrics_path:
+            tmp_path = f"{metrics_path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(metrics, file)
+            os.replace(tmp_path, metrics_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="Watch a folder and split/rotate images as they arrive.")
+    parser.add_argument("input_folder")
+    parser.add_argument("output_folder", nargs="?", help="defaults to an 'output' subfolder of input_folder")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--format", default=None, help="output format, e.g. JPEG or PNG (default: keep the input's)")
+    parser.add_argument("--quality", type=int, default=75, help="quality for JPEG/WEBP output")
+    parser.add_argument("--scale", type=float, default=1.0, help="output size relative to the input, e.g. 0.5")
+    parser.add_argument("--low-memory", action="store_true", help="decode uncompressed TIFF/BMP/PPM inputs in strips")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds a file's size must be stable before processing")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between checks")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="images submitted to workers at once")
+    parser.add_argument("--max-queued", type=int, default=10_000, help="files waiting for a worker before new ones are held back")
+    parser.add_argument("--polling", action="store_true", help="poll the folder instead of using inotify")
+    parser.add_argument("--metrics-interval", type=float, default=60.0, help="seconds between metrics reports")
+    parser.add_argument("--metrics-file", default=None, help="also write metrics as JSON to this file")
+    args = parser.parse_args()
+
+    watcher = FolderWatcher(
+        args.input_folder,
+        args.output_folder,
+        workers=args.workers,
+        options=OutputOptions(format=args.format, quality=args.quality, scale=args.scale, low_memory=args.low_memory),
+        settle_seconds=args.settle,
+        poll_interval=args.poll_interval,
+        max_in_flight=args.max_in_flight,
+        use_inotify=not args.polling,
+        max_queued=args.max_queued,
+    )
+    # finish the images in flight and save the manifest on Ctrl-C / systemd stop
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    signal.signal(signal.SIGINT, lambda *_: watcher.stop())
+    print(f"Watching {args.input_folder}, writing to {watcher.output_folder}", file=sys.stderr)
+    watcher.run(metrics_interval=args.metrics_interval, metrics_path=args.metrics_file)
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_community.document_loaders import WikipediaLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from adaptive_retrieval import estimate_tokens
+from async_utils import run_sync
+from response_cache import TTLCache, normalize_question
+from single_flight import SingleFlight, request_key
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a handful of passages (one page's chunks).
+
+    Args:
+        passages (List[str]): The texts to rank
+        k1 (float): Term-frequency saturation
+        b (float): Length normalisation
+    """
+
+    def __init__(self, passages: List[str], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self._counts = [Counter(tokenize(passage)) for passage in passages]
+        self._lengths = [sum(counts.values()) for counts in self._counts]
+        self._average_length = sum(self._lengths) / len(passages) if passages else 0.0
+        document_frequency = Counter(term for counts in self._counts for term in counts)
+        total = len(passages)
+        self._idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        scores = []
+        for counts, length in zip(self._counts, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._average_length) if self._average_length else self.k1
+            scores.append(sum(
+                self._idf[term] * counts[term] * (self.k1 + 1) / (counts[term] + norm)
+                for term in terms if counts[term]
+            ))
+        return scores
+
+
+def wikipedia_page(topic: str, max_chars: int = 100_000) -> Optional[str]:
+    """Text of the best-matching Wikipedia page for `topic`, or None when there is none."""
+    docs = WikipediaLoader(query=topic, load_max_docs=1, doc_content_chars_max=max_chars).load()
+    return docs[0].page_content if docs else None
+
+
+class WikiPageCache:
+    """
+    Page texts on disk, one JSON file per topic, valid for `ttl` seconds after download.
+    An expired page's file is deleted when it is next looked up.
+
+    Args:
+        path (str): Directory holding the pages; created if missing
+        ttl (float): Seconds a page is served before it is downloaded again
+    """
+
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # get() runs on the sync pool, so the counters are updated from several threads
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, topic: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(topic.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, topic: str) -> Optional[str]:
+        path = self._file(topic)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and time.time() - entry["fetched_at"] > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry["content"]
+
+    def set(self, topic: str, content: str) -> None:
+        path = self._file(topic)
+        # write next to the target and rename, so a crash never leaves a truncated page
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"topic": topic, "fetched_at": time.time(), "content": content}, file)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "ttl_seconds": self.ttl,
+        }
+
+
+class WikiContext:
+    """
+    Question-specific context from Wikipedia pages.
+
+    A page is read from `page_cache` when it is there and fresh; otherwise it is
+    downloaded with `load_page` (on the bounded sync pool) and written back. The
+    page is then split into passages and indexed with BM25. Loading and indexing
+    a topic runs once, shared by concurrent requests for the same topic. Only passages that match the
+    question, scoring at least `min_relative_score` of the best one, are
+    returned, best first up to `max_tokens`, then put back in page order; the
+    budget is a cap, not a target. When nothing in the question matches, the
+    start of the page is used. Indexed pages are kept in memory for repeat
+    questions on the same topic, and topics with no page are remembered for
+    `missing_ttl` seconds so they aren't searched for on every request.
+
+    Args:
+        load_page (callable): Sync function returning a topic's page text, or None; `wikipedia_page` by default
+        page_cache (WikiPageCache, optional): Persistent page store; pages are always downloaded without one
+        max_tokens (int): Context budget per question
+        chunk_size (int): Passage size, in characters
+        index_cache_size (int): Indexed pages kept in memory
+        min_relative_score (float): Passages scoring below this fraction of the best are left out
+        missing_ttl (float): Seconds a topic without a page is answered from memory
+    """
+
+    def __init__(
+        self,
+        load_page: Callable[[str], Optional[str]] = wikipedia_page,
+        page_cache: Optional[WikiPageCache] = None,
+        max_tokens: int = 1500,
+        chunk_size: int = 800,
+        index_cache_size: int = 128,
+        min_relative_score: float = 0.25,
+        missing_ttl: float = 300,
+    ):
+        self.load_page = load_page
+        self.page_cache = page_cache
+        self.max_tokens = max_tokens
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+        self.indexes = TTLCache(max_size=index_cache_size, ttl=page_cache.ttl if page_cache else 3600)
+        self.min_relative_score = min_relative_score
+        # topics known to have no page; TTLCache can't hold None, so they map to True
+        self.missing = TTLCache(max_size=index_cache_size, ttl=missing_ttl)
+        self.flight = SingleFlight()
+        self.downloads = 0
+        self.page_tokens = 0
+        self.context_tokens = 0
+
+    async def _download(self, key: str, topic: str) -> Optional[str]:
+        self.downloads += 1
+        content = await run_sync(self.load_page, topic)
+        if content is not None and self.page_cache is not None:
+            await run_sync(self.page_cache.set, key, content)
+        return content
+
+    def _build_index(self, content: str) -> BM25Index:
+        return BM25Index(self.splitter.split_text(content) or [content])
+
+    async def _load(self, key: str, topic: str) -> Optional[BM25Index]:
+        content = await run_sync(self.page_cache.get, key) if self.page_cache is not None else None
+        if content is None:
+            content = await self._download(key, topic)
+        if content is None:
+            self.missing.set(key, True)
+            return None
+        # splitting and indexing a long page is CPU work: keep it off the event loop
+        index = await run_sync(self._build_index, content)
+        self.indexes.set(key, index)
+        return index
+
+    async def _index(self, topic: str) -> Optional[BM25Index]:
+        key = normalize_question(topic)
+        index = self.indexes.get(key)
+        if index is not None:
+            return index
+        if self.missing.get(key):
+            return None
+        return await self.flight.do(request_key("wikipedia", key), lambda: self._load(key, topic))
+
+    async def context(self, topic: str, question: str) -> Optional[str]:
+        """
+        The passages of the `topic` page most relevant to `question`.
+
+        Returns:
+            str: Passages joined by blank lines, or None when there is no page for the topic
+        """
+        index = await self._index(topic)
+        if index is None:
+            return None
+        scores = index.scores(question)
+        best = max(scores, default=0.0)
+        if best > 0:
+            cutoff = best * self.min_relative_score
+            order = sorted((i for i, score in enumerate(scores) if score > 0 and score >= cutoff),
+                           key=lambda i: scores[i], reverse=True)
+        else:
+            # nothing matches: the lead section is the best guess
+            order = list(range(len(scores)))
+
+        chosen, used = [], 0
+        for i in order:
+            tokens = estimate_tokens(index.passages[i])
+            if chosen and used + tokens > self.max_tokens:
+                if best > 0:
+                    continue
+                break
+            chosen.append(i)
+            used += tokens
+        self.page_tokens += sum(estimate_tokens(passage) for passage in index.passages)
+        self.context_tokens += used
+        return "\n\n".join(index.passages[i] for i in sorted(chosen))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "downloads": self.downloads,
+            "page_cache": self.page_cache.stats() if self.page_cache is not None else None,
+            "indexed_pages": self.indexes.stats(),
+            "missing_topics": self.missing.stats(),
+            "single_flight": self.flight.stats(),
+            # prompt tokens sent, against the whole pages they came from
+            "context_token_ratio": self.context_tokens / self.page_tokens if self.page_tokens else None,
+        }
@@ -4,16 +4,20 @@ import os
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.document_loaders import WikipediaLoader
+from rate_limiter import gemini_rate_limit, retry_throttled, single_attempt
+from single_flight import SingleFlight, request_key
+from wiki_context import WikiContext, WikiPageCache
 
 app = FastAPI()
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
+llm = single_attempt(ChatGoogleGenerativeAI(
     model="gemini-1.5-flash",
-    api_key=os.getenv("GEMINI_API_KEY")
-)
+    api_key=os.getenv("GEMINI_API_KEY"),
+    # share the process-wide Gemini quota; retries go through it too (see retry_throttled)
+    callbacks=[gemini_rate_limit],
+))
 
 
 prompt = ChatPromptTemplate.from_messages(
@@ -29,6 +33,21 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
+chain = prompt | retry_throttled(llm)
+
+# Pages are kept on disk in WIKI_CACHE_DIR for WIKI_CACHE_TTL seconds, and only the
+# passages relevant to the question (up to WIKI_CONTEXT_TOKENS) go into the prompt
+wiki_context = WikiContext(
+    page_cache=WikiPageCache(
+        os.getenv("WIKI_CACHE_DIR", ".wiki_cache"),
+        ttl=float(os.getenv("WIKI_CACHE_TTL", "86400")),
+    ),
+    max_tokens=int(os.getenv("WIKI_CONTEXT_TOKENS", "1500")),
+)
+
+# Concurrent requests for the same topic and question share one Gemini call
+answer_flight = SingleFlight()
+
 
 class WikiQuery(BaseModel):
     topic: str
@@ -73,22 +92,31 @@ async def ask_wiki(topic: str = Path(..., title="Wikipedia Topic"), question: st
     try:
         query_data = WikiQuery(topic=topic, question=question)  # Validate inputs
 
-        loader = WikipediaLoader(query=query_data.topic, load_max_docs=1)
-        try:
-            context_text = loader.load()[0].page_content
-        except IndexError:
+        # cached page (downloaded on a miss), trimmed to the passages that match the question
+        context_text = await wiki_context.context(query_data.topic, query_data.question)
+        if context_text is None:
             return f"Could not find Wikipedia page for topic: {query_data.topic}"
 
-        chain = prompt | llm
-
-        ai_msg = chain.invoke(
-            {
-                "question": query_data.question,
-                "context": context_text,
-            }
-        )
+        inputs = {
+            "question": query_data.question,
+            "context": context_text,
+        }
+        ai_msg = await answer_flight.do(request_key("answer", inputs), lambda: chain.ainvoke(inputs))
 
         return ai_msg.content
 
     except ValueError as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+@app.get("/single-flight/stats")
+async def single_flight_stats():
+    return {"wikipedia": wiki_context.flight.stats(), "answers": answer_flight.stats()}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Page cache hits, downloads, and the share of each page's tokens sent as context
+    """
+    return wiki_context.stats()